@@ -0,0 +1,88 @@
+"""
+比较 pandas.read_excel + to_dict(pandas) 与 逐行读取需要的列(stream) 读取图签信息的耗时和内存峰值
+
+生成 100000 行、60 个工作表、30 列的 excel, 图签信息只需要其中 5 列; 需要安装 openpyxl,
+pandas 和 python-calamine 未安装时跳过对应的读取方式
+
+tracemalloc 会使读取慢数倍, 默认只比较耗时, --memory 时另外运行一次记录内存峰值
+
+运行: python -m benchmark.bench_excel [--memory]
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src import excel_utils
+
+ROWS = 100000
+SHEETS = 60
+COLUMNS = ['file', 'layout', 'border_style', 'name', 'number'] + [f'extra{i}' for i in range(25)]
+NEEDED = COLUMNS[:5]
+
+
+def make_workbook(path: str):
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    per_sheet = ROWS // SHEETS
+    for s in range(SHEETS):
+        ws = wb.create_sheet(f'子项{s:02d}')
+        ws.append(COLUMNS)
+        for i in range(per_sheet):
+            ws.append([f'{s:02d}/{i // 20:03d}.dwg', f'L{i % 20}', 'A1', f'图名{i}', i] +
+                      [f'x{i}-{k}' for k in range(25)])
+    wb.save(path)
+
+
+def read_pandas(path: str):
+    import pandas as pd
+
+    res = []
+    for name, df in pd.read_excel(path, sheet_name=None, dtype=str).items():
+        df.dropna(subset=['file', 'layout'], how='any', inplace=True)
+        res.extend(df.to_dict(orient='index').values())
+    return len(res)
+
+
+def read_stream(path: str, engine: str):
+    return sum(1 for _ in excel_utils.read_records(path, columns=NEEDED, required=['file', 'layout'],
+                                                   lower=True, engine=engine))
+
+
+def measure(func, *args, memory=False):
+    if memory:
+        tracemalloc.start()
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    else:
+        peak = math.nan
+    start = time.perf_counter()
+    count = func(*args)
+    return count, time.perf_counter() - start, peak
+
+
+def main():
+    memory = '--memory' in sys.argv
+    methods = {f'stream({e})': (read_stream, e) for e in excel_utils.available_engines()}
+    try:
+        import pandas
+        methods = {'pandas': (read_pandas,), **methods}
+    except ImportError:
+        pass
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'signature.xlsx')
+        make_workbook(path)
+        print(f'{ROWS} rows, {SHEETS} sheets, {len(COLUMNS)} columns ({len(NEEDED)} needed), '
+              f'{os.path.getsize(path) / 2 ** 20:.1f} MB')
+        print(f'{"method":>18} {"rows":>8} {"seconds":>8} {"peak MB":>8}')
+        for name, (func, *args) in methods.items():
+            count, elapsed, peak = measure(func, path, *args, memory=memory)
+            print(f'{name:>18} {count:>8} {elapsed:>8.2f} {peak:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+比较 串行打开并处理(serial) 与 预先打开下一个文件(prefetch) 的总耗时
+
+使用实际等待的模拟应用: 打开文档耗时 open_cost, 修改和打印耗时 plot_cost; prefetch 使用两个应用实例轮流打开
+
+运行: python -m benchmark.bench_prefetch
+"""
+import time
+
+from src.pipeline_utils import PrefetchPipeline
+from test.fake_acad import FakeAcadApplication, WallClock
+
+FILES = [rf'C:\project\{i:02d}.dwg' for i in range(20)]
+SCENARIOS = {
+    # (open_cost, plot_cost)
+    'open < plot': (0.02, 0.05),
+    'open = plot': (0.05, 0.05),
+    'open > plot': (0.08, 0.03),
+}
+
+
+def _plot(doc, plot_cost):
+    time.sleep(plot_cost)
+    doc.Close(True)
+
+
+def serial(open_cost, plot_cost):
+    app = FakeAcadApplication(clock=WallClock(), open_cost=open_cost)
+    start = time.perf_counter()
+    for f in FILES:
+        _plot(app.Documents.Open(f), plot_cost)
+    return time.perf_counter() - start
+
+
+def prefetch(open_cost, plot_cost, depth=1):
+    apps = [FakeAcadApplication(worker=i, clock=WallClock(), open_cost=open_cost) for i in range(depth + 1)]
+    count = [0]
+
+    def open_stage(file):
+        app = apps[count[0] % len(apps)]
+        count[0] += 1
+        return app.Documents.Open(file)
+
+    report = PrefetchPipeline(open_stage, lambda file, data, doc: _plot(doc, plot_cost), depth=depth).run(
+        dict.fromkeys(FILES))
+    assert all(r.ok for r in report.results)
+    return report.elapsed
+
+
+def main():
+    print(f'{len(FILES)} files, end-to-end seconds')
+    print(f'{"scenario":>12} {"serial":>8} {"prefetch":>9} {"speedup":>8}')
+    for name, (open_cost, plot_cost) in SCENARIOS.items():
+        s = serial(open_cost, plot_cost)
+        p = prefetch(open_cost, plot_cost)
+        print(f'{name:>12} {s:>8.2f} {p:>9.2f} {s / p:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
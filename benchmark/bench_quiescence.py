@@ -0,0 +1,52 @@
+"""
+比较 重试(默认) 与 等待空闲(quiescent) 两种 COM 调用方式
+
+使用脚本化忙碌时段的模拟应用和虚拟时钟, 统计总耗时、COM 调用次数和被拒绝次数
+
+运行: python -m benchmark.bench_quiescence
+"""
+from src.com_utils import RETRY_POLICIES, ComContext, ComWrapper
+from test.fake_acad import FakeClock, FakeComError, SimulatedApplication
+
+SCENARIOS = {
+    # 每次重生成后忙碌 0.3s
+    'regen 0.3s': dict(busy_after={'Regen': 0.3}),
+    # 每次重生成后忙碌 1.5s (大图)
+    'regen 1.5s': dict(busy_after={'Regen': 1.5}),
+    # 外部打印占用
+    'plotting': dict(busy=[(0.5, 3.5), (6, 9)]),
+}
+
+
+def run(quiescent: bool, writes=300, regen_every=20, busy=(), busy_after=None):
+    clock = FakeClock()
+    raw = SimulatedApplication(clock, busy=busy, busy_after=busy_after, call_cost=0.01)
+    context = ComContext('SimApp',
+                         dispatch_types=(SimulatedApplication,),
+                         errors=(AttributeError, FakeComError),
+                         policies=RETRY_POLICIES,
+                         quiescent=quiescent,
+                         poll_interval=0.02,
+                         clock=clock,
+                         sleep=clock.sleep)
+    context.bind(raw)
+    app = ComWrapper(raw, context)
+    for i in range(writes):
+        app.Caption = str(i)
+        if i % regen_every == 0:
+            app.Regen(1)
+    return clock.now, raw, context.stats
+
+
+def main():
+    print(f'{"scenario":<12} {"mode":<10} {"elapsed":>8} {"calls":>6} {"rejected":>8} {"retries":>7} '
+          f'{"polls":>6}')
+    for name, kw in SCENARIOS.items():
+        for mode, quiescent in (('retry', False), ('quiescent', True)):
+            elapsed, raw, stats = run(quiescent, **kw)
+            print(f'{name:<12} {mode:<10} {elapsed:>8.2f} {raw.calls:>6} {raw.rejected:>8} '
+                  f'{stats.retries:>7} {stats.polls:>6}')
+
+
+if __name__ == '__main__':
+    main()
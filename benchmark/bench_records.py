@@ -0,0 +1,72 @@
+"""
+比较 每行一个字典(dicts) 与 按列保存(store) 的 excel 记录占用的内存
+
+模拟 100000 行、60 个工作表的图签信息: 子项名称、图框样式、文件路径等列大量重复;
+读取 excel 时每个单元格都是新的字符串对象, 这里同样为每个单元格创建新的字符串
+
+运行: python -m benchmark.bench_records
+"""
+import time
+import tracemalloc
+
+from src.record_utils import RecordStore
+
+ROWS = 100000
+SHEETS = 60
+EXTRA = 10
+
+
+def records():
+    per_sheet = ROWS // SHEETS
+    for s in range(SHEETS):
+        sheet = f'子项{s:02d}'
+        for i in range(per_sheet):
+            record = {
+                'file': ''.join([f'D:\\project\\{sheet}\\', f'{i // 20:03d}.dwg']),
+                'layout': ''.join(['L', str(i % 20)]),
+                'border_style': ''.join(['A', '1']),
+                'name': f'图名{s}-{i}',
+                'number': ''.join(['JS-', str(i % 20)]),
+                'designer': ''.join(['张', '三']),
+                'date': ''.join(['2022-', '01-02']),
+            }
+            record.update({f'extra{k}': ''.join(['x', str(k)]) for k in range(EXTRA)})
+            yield sheet, record
+
+
+def build_dicts():
+    res = {}
+    for sheet, record in records():
+        record['sub_project'] = sheet
+        res.setdefault(record['file'], []).append(record)
+    return res
+
+
+def build_store():
+    store = RecordStore()
+    for sheet, record in records():
+        store.append(record, sub_project=sheet)
+    return store, {k: store.rows(v) for k, v in store.group_by('file').items()}
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return current / 2 ** 20, elapsed
+
+
+def main():
+    print(f'{ROWS} rows, {SHEETS} sheets, {8 + EXTRA} columns')
+    print(f'{"method":>8} {"MB":>8} {"seconds":>8}')
+    for name, func in (('dicts', build_dicts), ('store', build_store)):
+        mb, elapsed = measure(func)
+        print(f'{name:>8} {mb:>8.1f} {elapsed:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+比较 遍历布局(scan) 与 选择集过滤器(filter) 查询图签图块的 COM 调用次数
+
+运行: python -m benchmark.bench_selection
+"""
+from src.com_utils import ComContext, ComWrapper
+from src.select_utils import SelectionQuery
+from test.fake_acad import CallCounter, FakeComError, FakeDispatch, sample_document
+
+LAYOUTS = 5
+ENTITIES = (50, 500, 5000)
+
+
+def _scan(ly, name):
+    return [obj for obj in ly.Block if obj.ObjectName == 'AcDbBlockReference' and obj.Name == name]
+
+
+def run(entities: int):
+    counter = CallCounter()
+    context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError))
+    doc = ComWrapper(sample_document(counter, layouts=LAYOUTS, entities=entities), context)
+    query = SelectionQuery()
+    layouts = [ly for ly in doc.Layouts]
+    names = [ly.Name for ly in layouts]
+
+    counter.reset()
+    for ly in layouts:
+        _scan(ly, 'signature')
+    scan = counter.total
+
+    counter.reset()
+    for name in names:
+        query.block_refs(doc, 'signature', name)
+    per_layout = counter.total
+
+    counter.reset()
+    query.block_refs(doc, 'signature')
+    whole = counter.total
+    return scan / LAYOUTS, per_layout / LAYOUTS, whole
+
+
+def main():
+    print(f'COM calls to find the signature block, {LAYOUTS} layouts')
+    print(f'{"entities":>9} {"scan/layout":>12} {"filter/layout":>14} {"filter/doc":>11} {"reduction":>10}')
+    for n in ENTITIES:
+        scan, per_layout, whole = run(n)
+        print(f'{n:>9} {scan:>12.1f} {per_layout:>14.1f} {whole:>11} {scan / per_layout:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
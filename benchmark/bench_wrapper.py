@@ -0,0 +1,110 @@
+"""
+ComWrapper 内存与分配测试: 每 10k 次图形访问的对象分配、GC 次数和内存占用
+
+    -- dict:      与原 ComWrapper 相同的 __dict__ 实现, 每次获取方法都创建新的包装对象
+    -- slots:     __slots__ + 方法缓存
+    -- identity:  __slots__ + 方法缓存 + 按句柄复用 ComWrapper
+
+运行: python -m benchmark.bench_wrapper
+"""
+import gc
+import sys
+import tracemalloc
+
+from src.com_utils import ComContext, ComWrapper
+from test.fake_acad import CallCounter, FakeComError, FakeDispatch, FakeDocument
+
+ENTITIES = 5000
+VISITS = 10000
+
+
+class DictComWrapper(object):
+    """原 ComWrapper 的实现, 仅用于对比"""
+
+    def __init__(self, wrapped_object):
+        self.__dict__['_wrapped_object'] = wrapped_object
+
+    def __getattr__(self, item):
+        result = self._wrapped_object.__getattr__(item)
+        if isinstance(result, FakeDispatch) or callable(result):
+            return DictComWrapper(result)
+        return result
+
+    def __getitem__(self, item):
+        result = self._wrapped_object.__getitem__(item)
+        if isinstance(result, FakeDispatch) or callable(result):
+            return DictComWrapper(result)
+        return result
+
+    def __call__(self, *args, **kwargs):
+        result = self._wrapped_object(*args, **kwargs)
+        if isinstance(result, FakeDispatch) or callable(result):
+            return DictComWrapper(result)
+        return result
+
+
+def _document():
+    doc = FakeDocument(r'C:\project\bench.dwg', CallCounter())
+    block = doc.add_layout('L0')._props['Block']
+    for i in range(ENTITIES):
+        block.add(doc.entity(Layer=f'layer{i % 10}'))
+    return doc
+
+
+def _visit(block, keep: list):
+    """按下标访问图形, 与 flatten_block_reference 相同"""
+    n = 0
+    while n < VISITS:
+        for j in range(ENTITIES):
+            obj = block.Item(j)
+            if obj.ObjectName == 'AcDbLine':
+                keep.append(obj)
+            n += 1
+            if n >= VISITS:
+                break
+
+
+def run(mode: str):
+    doc = _document()
+    if mode == 'dict':
+        app = DictComWrapper(FakeDispatch(doc._counter, ActiveDocument=doc))
+    else:
+        context = ComContext(mode,
+                             dispatch_types=(FakeDispatch,),
+                             errors=(AttributeError, FakeComError),
+                             identity_map=mode == 'identity')
+        app = ComWrapper(FakeDispatch(doc._counter, ActiveDocument=doc), context)
+    block = app.ActiveDocument.Layouts.Item('L0').Block
+
+    keep = []
+    gc.collect()
+    collections = gc.get_stats()[0]['collections']
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    _visit(block, keep)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    res = {
+        'gen0 gc': gc.get_stats()[0]['collections'] - collections,
+        'live blocks': sys.getallocatedblocks() - blocks,
+        'wrappers': len(set(map(id, keep))),
+        'KiB': current / 1024,
+        'peak KiB': peak / 1024,
+        'COM calls': doc._counter.total,
+    }
+    del keep
+    return res
+
+
+def main():
+    print(f'{VISITS} visits over {ENTITIES} entities')
+    print(f'{"mode":<10} {"gen0 gc":>8} {"live blocks":>12} {"wrappers":>9} {"KiB":>9} {"peak KiB":>9} '
+          f'{"COM calls":>10}')
+    for mode in ('dict', 'slots', 'identity'):
+        r = run(mode)
+        print(f'{mode:<10} {r["gen0 gc"]:>8} {r["live blocks"]:>12} {r["wrappers"]:>9} {r["KiB"]:>9.1f} '
+              f'{r["peak KiB"]:>9.1f} {r["COM calls"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import configparser
+import itertools
 import os
 import re
 import sys
@@ -12,12 +14,22 @@ from lib.acad_typing.acadApplication import AcadApplication
 from lib.acad_typing.acadEnums import *
 from functools import wraps
 from typing import *
+import pythoncom
 import win32com.client as win32
 from win32com.client import VARIANT
 
 import time
 import logging
 
+from . import com_utils
+from .com_utils import ComContext, ComWrapper, InstanceUnhealthyError
+from .attr_utils import SyncReport, sync_block_attr
+from .block_utils import BlockGraphCache, TagSchemaCache
+from .document_utils import DocumentCache, DocumentCacheStats, DocumentRegistry
+from .pipeline_utils import PrefetchPipeline
+from .publish_utils import OutputWatcher, PublishBatch
+from .select_utils import SelectionQuery
+from .snapshot_utils import DocumentSnapshot
 from .common_utils import get_config
 
 if TYPE_CHECKING:
@@ -25,8 +37,22 @@ if TYPE_CHECKING:
     from lib.acad_typing.acadApplication import *
     from lib.acad_typing.acadBlocks import *
 
-_DELAY = 0.2  # seconds
-_TIME = 10  # 重试次数
+_RETRY_ERRORS = (AttributeError, com_error)  # 需要重试的异常类型
+
+_DEFAULT_CONTEXT = ComContext(dispatch_types=(win32.CDispatch,), errors=_RETRY_ERRORS)
+_CONTEXTS: Dict[str, ComContext] = {}
+"""get_application 连接的已运行实例的调用上下文, key--ProgID"""
+_INSTANCE_CONTEXTS: List[ComContext] = []
+"""new_application 启动的应用实例的调用上下文, 每个实例一个, 实例关闭时移除"""
+_INSTANCE_IDS = itertools.count(1)
+_BLOCK_GRAPHS = BlockGraphCache()
+"""各文档的图块定义图"""
+_REGISTRIES: Dict[Hashable, DocumentRegistry] = {}
+"""已打开文档索引, key--应用实例, 见 _app_key"""
+_DOCUMENT_CACHES: Dict[Hashable, DocumentCache] = {}
+"""最近使用的已打开文档, key--应用实例, 见 _app_key"""
+_TAG_SCHEMAS: TagSchemaCache | None = None
+"""图块属性名称缓存, 配置 temp_path 后保存到 attr_tags.json"""
 
 ORIGIN_POINT = VARIANT(5 | 8192, (0, 0, 0))
 
@@ -41,57 +67,10 @@ def _com_call_wrapper(f, *args, **kwargs):
     """
     COMWrapper support function. 
     Repeats calls when AttributeError, com_error exception occurs.
+    Permanent errors (invalid argument, key not found, unknown member) are raised immediately,
+    see com_utils.RETRY_POLICIES.
     """
-    # Unwrap inputs
-    args = [arg._wrapped_object if isinstance(arg, ComWrapper) else arg for arg in args]
-    kwargs = dict([(key, value._wrapped_object) if isinstance(value, ComWrapper) else (key, value)
-                   for key, value in dict(kwargs).items()])
-    _retry = 0
-    while True:
-        try:
-            result = f(*args, **kwargs)
-        except (AttributeError, com_error) as e:
-            t, v, trace = sys.exc_info()
-            _retry += 1
-            if _retry >= _TIME:
-                raise
-            if _retry == 1:
-                logging.warning(f'{t} --> {v} --> retry...')
-            time.sleep(_DELAY)
-            continue
-        break
-
-    if isinstance(result, win32.CDispatch) or callable(result):
-        return ComWrapper(result)
-    return result
-
-
-class ComWrapper(object):
-    """
-    Class to wrap COM objects to repeat calls when 'Call was rejected by callee.' exception occurs.
-    """
-
-    def __init__(self, wrapped_object):
-        assert isinstance(wrapped_object, win32.CDispatch) or callable(wrapped_object)
-        self.__dict__['_wrapped_object'] = wrapped_object
-
-    def __getattr__(self, item):
-        return _com_call_wrapper(self._wrapped_object.__getattr__, item)
-
-    def __getitem__(self, item):
-        return _com_call_wrapper(self._wrapped_object.__getitem__, item)
-
-    def __setattr__(self, key, value):
-        _com_call_wrapper(self._wrapped_object.__setattr__, key, value)
-
-    def __setitem__(self, key, value):
-        _com_call_wrapper(self._wrapped_object.__setitem__, key, value)
-
-    def __call__(self, *args, **kwargs):
-        return _com_call_wrapper(self._wrapped_object.__call__, *args, **kwargs)
-
-    def __repr__(self):
-        return 'ComWrapper<{}>'.format(repr(self._wrapped_object))
+    return _DEFAULT_CONTEXT.call(f, *args, **kwargs)
 
 
 def com_call_wrapper(f):
@@ -104,11 +83,56 @@ def com_call_wrapper(f):
     return _
 
 
-@com_call_wrapper
+def _new_context(name: str) -> ComContext:
+    """
+    创建一个应用实例的调用上下文, 有独立的重试策略、熔断器和调用统计; 配置读取自 [com]
+
+    未配置 [com] 时使用默认值, 配置的值无效时记录警告并使用默认值
+    """
+    _policies, _breaker, _kw = None, {}, {}
+    try:
+        _sect = get_config()['com']
+    except KeyError:
+        _sect = None
+    if _sect is not None:
+        try:
+            _policies = com_utils.load_retry_policies(_sect)
+            _breaker = {'threshold': _sect.getint('breaker_threshold', 5),
+                        'reset_timeout': _sect.getfloat('breaker_reset_timeout', 30)}
+            _kw = {'quiescent': _sect.getboolean('wait_quiescent', False),
+                   'poll_interval': _sect.getfloat('quiescent_poll_interval', 0.05),
+                   'quiescent_timeout': _sect.getfloat('quiescent_timeout', 30),
+                   'identity_map': _sect.getboolean('identity_map', False)}
+            if _sect.getboolean('property_cache', False):
+                _props = _sect.get('cached_properties', None)
+                _kw['cache'] = com_utils.PropertyCache(
+                    [p.strip() for p in _props.split(',') if p.strip()] if _props else None)
+        except (ValueError, configparser.Error) as e:
+            logging.warning(f'读取 [com] 配置失败, 使用默认值: {e}')
+            _policies, _breaker, _kw = None, {}, {}
+    return ComContext(name,
+                      dispatch_types=(win32.CDispatch,),
+                      errors=_RETRY_ERRORS,
+                      policies=_policies,
+                      breaker=com_utils.CircuitBreaker(**_breaker),
+                      **_kw)
+
+
+def _get_context(version) -> ComContext:
+    """获取已运行实例的调用上下文, 同一版本连接的是同一个实例, 共享上下文"""
+    prog_id = f'AutoCAD.Application.{version}'
+    if prog_id not in _CONTEXTS:
+        _CONTEXTS[prog_id] = _new_context(prog_id)
+    return _CONTEXTS[prog_id]
+
+
 def get_application(version=24, visible=True) -> AcadApplication:
     """
     获取应用实例 acadApplication 对象
 
+    连接已运行的实例, 同一版本共享调用上下文(熔断器和调用统计), 实例熔断后调用将抛出 InstanceUnhealthyError;
+    配置 [com] wait_quiescent = True 时, 修改类调用前先等待应用空闲
+
     Args:
         visible (bool, optional): 控制可见性. Defaults to True.
         version (int, optional): cad 版本号. Defaults to 24.
@@ -121,13 +145,132 @@ def get_application(version=24, visible=True) -> AcadApplication:
         version = get_config().defaults().get('acad_version')
     except:
         ...
-
-    __app = win32.Dispatch(f'AutoCAD.Application.{version}')
+    context = _get_context(version)
+    __app = context.call(win32.Dispatch, context.name)
+    if context.gate is None:
+        # 只绑定一次, 应用状态的查询对象属于第一次调用所在的线程
+        context.bind(__app)
     __app.Visible = visible
 
     return __app
 
 
+def new_application(worker: int = 0, visible: bool = False) -> AcadApplication:
+    """
+    启动一个新的应用实例, 不连接已运行的实例, 用于 pool_utils.WorkerPool 的工作进程
+
+    每个启动的实例有独立的调用上下文(熔断器和调用统计), 一个实例熔断不影响同一进程中的其他实例
+
+    Args:
+        worker (int, optional): 工作进程序号. Defaults to 0.
+        visible (bool, optional): 控制可见性. Defaults to False.
+
+    Returns:
+        AcadApplication: 应用实例
+    """
+    version = 24
+    try:
+        version = get_config().defaults().get('acad_version')
+    except:
+        ...
+    context = _new_context(f'AutoCAD.Application.{version}#{next(_INSTANCE_IDS)}')
+    _INSTANCE_CONTEXTS.append(context)
+    __app = context.call(win32.DispatchEx, f'AutoCAD.Application.{version}')
+    context.bind(__app)
+    __app.Visible = visible
+    logging.info(f'实例 {worker} 已启动')
+    return __app
+
+
+def _forget_document(doc: AcadDocument):
+    """
+    文档关闭前清除该文档的图块定义图、属性名称和属性缓存
+
+    缓存按文件路径保存, 同一文件重新打开(或在重新创建的实例中打开)后不能使用已关闭文档的 COM 对象
+    """
+    try:
+        invalidate(doc)
+    except Exception as e:
+        logging.warning(f'清除文档缓存失败: {e}')
+
+
+def _drop_context(context: ComContext):
+    """应用实例关闭后移除其调用上下文, 不再保留属性缓存; 移除前记录调用统计"""
+    try:
+        _INSTANCE_CONTEXTS.remove(context)
+    except ValueError:
+        return
+    logging.info(f'{context.name} COM 调用统计: {context.stats.as_dict()}')
+
+
+def quit_application(app: AcadApplication):
+    """
+    关闭 new_application 启动的应用实例, 先保存并关闭 DocumentCache 中的文档, 其他未保存的文档不保存
+
+    Raises:
+        Exception: DocumentCache 中的文档保存失败, 应用实例仍然关闭
+    """
+    try:
+        close_documents(app)
+    finally:
+        _REGISTRIES.pop(_app_key(app), None)
+        _DOCUMENT_CACHES.pop(_app_key(app), None)
+        try:
+            for doc in list(app.Documents):
+                try:
+                    _forget_document(doc)
+                    doc.Close(False)
+                except Exception as e:
+                    logging.warning(e)
+            app.Quit()
+        finally:
+            _drop_context(app._context)
+
+
+def get_com_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    获取各应用实例的 COM 调用统计
+
+    Returns:
+        Dict[str, Dict[str, Any]]: key--上下文名称(ProgID, 启动的实例为 ProgID#序号), value--调用统计, 包括重试次数、等待时间、熔断次数,
+            开启属性缓存时包括各属性的缓存命中率
+    """
+    res = {}
+    for ctx in (*_CONTEXTS.values(), *_INSTANCE_CONTEXTS, _DEFAULT_CONTEXT):
+        res[ctx.name] = ctx.stats.as_dict()
+        if ctx.cache is not None:
+            res[ctx.name]['cache'] = ctx.cache.report()
+    return res
+
+
+def invalidate(doc: AcadDocument = None):
+    """
+    清空属性缓存和图块定义缓存, 在 AutoCAD 界面或其他程序修改文档后调用
+
+    Args:
+        doc (AcadDocument, optional): 文档, None 表示清空所有应用实例的缓存. Defaults to None.
+    """
+    if doc is None:
+        for ctx in (*_CONTEXTS.values(), *_INSTANCE_CONTEXTS):
+            ctx.invalidate()
+        _BLOCK_GRAPHS.invalidate()
+        _tag_schemas().invalidate()
+    else:
+        doc._context.invalidate(doc)
+        _BLOCK_GRAPHS.invalidate(doc)
+        _tag_schemas().invalidate(doc.FullName or doc.Name)
+
+
+def is_healthy(obj: ComWrapper) -> bool:
+    """
+    对象所属的应用实例是否健康(未熔断)
+
+    Args:
+        obj (ComWrapper): 应用实例或其返回的任意 COM 对象
+    """
+    return obj._context.healthy
+
+
 def get_color(*, color_index=7):
     version = "24"
     try:
@@ -138,56 +281,276 @@ def get_color(*, color_index=7):
     color.ColorIndex = color_index
 
 
+def _app_key(app: AcadApplication) -> Hashable:
+    """
+    应用实例的键: 每个应用实例有一个调用上下文(get_application 连接的同一实例共享), 使用上下文对象;
+    每次 Dispatch 返回的 CDispatch 不同, 不能作为键
+    """
+    return app._context if isinstance(app, ComWrapper) else id(app)
+
+
+def get_document_registry(app: AcadApplication) -> DocumentRegistry:
+    """
+    获取应用实例的已打开文档索引, 每个应用实例一个
+
+    Args:
+        app (AcadApplication): 应用实例
+    """
+    key = _app_key(app)
+    registry = _REGISTRIES.get(key)
+    if registry is None:
+        registry = _REGISTRIES[key] = DocumentRegistry(app, on_close=_forget_document)
+    return registry
+
+
 def open_file(app: AcadApplication, file: str) -> AcadDocument | None:
     """
-    _summary_
+    打开文件, 文件已打开(非只读)时激活并返回该文档
+
+    通过已打开文档索引查找, 见 document_utils.DocumentRegistry
+
+    Args:
+        app (AcadApplication): 应用实例
+        file (str): 文件路径
+
+    Returns:
+        AcadDocument | None: 文档
+    """
+    return get_document_registry(app).open(file)
+
+
+def get_document_cache(app: AcadApplication) -> DocumentCache:
+    """
+    获取应用实例的最近使用文档缓存, 文档数量和内存上限读取配置 [DEFAULT] document_cache_size, document_cache_memory
+
+    通过缓存打开的文档不需要立即关闭, 运行结束时调用 close_documents 保存并关闭
 
     Args:
-        app (AcadApplication): _description_
-        file (str): _description_
+        app (AcadApplication): 应用实例
+    """
+    key = _app_key(app)
+    cache = _DOCUMENT_CACHES.get(key)
+    if cache is None:
+        size, memory = 4, 0
+        try:
+            sect = get_config()['DEFAULT']
+            size = sect.getint('document_cache_size', size)
+            memory = sect.getfloat('document_cache_memory', memory)
+        except Exception:
+            ...
+        cache = _DOCUMENT_CACHES[key] = DocumentCache(get_document_registry(app), size, memory or None)
+    return cache
+
+
+def close_documents(app: AcadApplication) -> DocumentCacheStats:
+    """
+    保存并关闭最近使用文档缓存中的所有文档, 在一次运行结束时调用
+
+    Args:
+        app (AcadApplication): 应用实例
+
+    Returns:
+        DocumentCacheStats: 本次运行的命中统计, 包括已保存的文件(见 DocumentCacheStats.is_saved)
 
     Raises:
-        FileNotFoundError: _description_
-        Exception: _description_
+        Exception: 文档保存或关闭失败, 其他文档仍然保存并关闭
+    """
+    cache = _DOCUMENT_CACHES.get(_app_key(app))
+    if cache is None:
+        return DocumentCacheStats()
+    try:
+        cache.close_all()
+    finally:
+        stats = cache.reset_stats()
+    logging.info(f'文档缓存: {stats.as_dict()}')
+    return stats
+
+
+def close_file(doc: AcadDocument, save: bool = False):
+    """
+    关闭文档, 并从已打开文档索引中移除
+
+    Args:
+        doc (AcadDocument): 文档
+        save (bool, optional): 是否保存. Defaults to False.
+    """
+    get_document_registry(doc.Application).close(doc, save)
+
+
+def prefetch_pipeline(process: Callable[[str, Any, AcadDocument], Any],
+                      depth: int = 1,
+                      instances: int = 2,
+                      save: bool = True) -> PrefetchPipeline:
+    """
+    创建预先打开文档的流水线, 主线程处理当前文档时, 打开线程在后台应用实例中打开下一个文件
+
+    同一应用实例的 COM 调用是串行的, 打开线程启动 instances 个后台实例并轮流使用, 打开下一个文件的实例与
+    正在打印的实例不同; 文档通过 CoMarshalInterThreadInterfaceInStream 传递到主线程.
+    处理完成后(或取消后)文档在主线程中关闭, 所有文档处理完成后打开线程关闭后台实例
+
+    COM 对象只能在所属的线程中调用, 每个后台实例在打开线程和主线程中各有一个调用上下文:
+    主线程的上下文绑定封送到主线程的应用实例, 用于查询应用状态, 两个线程不共享熔断器和调用统计
+
+    Args:
+        process (Callable[[str, Any, AcadDocument], Any]): 处理文档, 参数为 (文件, 任务, 文档)
+        depth (int, optional): 已打开未处理的最大文档数量. Defaults to 1.
+        instances (int, optional): 后台应用实例数量, 不少于 depth + 1 时打开与处理不使用同一实例. Defaults to 2.
+        save (bool, optional): 处理完成后是否保存文档. Defaults to True.
 
     Returns:
-        AcadDocument | None: _description_
+        PrefetchPipeline: 流水线, 调用 run(jobs) 处理所有文件
     """
+    apps: List[AcadApplication] = []
+    app_streams: List[Any] = []
+    main_contexts: Dict[int, ComContext] = {}
+    """主线程中各后台实例的调用上下文, key--后台实例序号"""
+    opened = [0]
+
+    def thread_init():
+        pythoncom.CoInitialize()
+        for i in range(max(1, instances)):
+            app = new_application(worker=i)
+            apps.append(app)
+            app_streams.append(pythoncom.CoMarshalInterThreadInterfaceInStream(pythoncom.IID_IDispatch,
+                                                                               app._wrapped_object._oleobj_))
+
+    def thread_exit():
+        # 不使用 quit_application, 同一进程中的前台实例与后台实例共享文档缓存
+        for app in apps:
+            try:
+                for doc in list(app.Documents):
+                    _forget_document(doc)
+                    doc.Close(False)
+                app.Quit()
+            except Exception as e:
+                logging.warning(e)
+            _drop_context(app._context)
+        # 主线程中的上下文对应同一实例, 实例关闭后一并移除
+        for context in list(main_contexts.values()):
+            _drop_context(context)
+        pythoncom.CoUninitialize()
+
+    def open_stage(file: str):
+        k = opened[0] % len(apps)
+        opened[0] += 1
+        doc = apps[k].Documents.Open(os.path.abspath(file))
+        return k, pythoncom.CoMarshalInterThreadInterfaceInStream(pythoncom.IID_IDispatch,
+                                                                  doc._wrapped_object._oleobj_)
+
+    def main_context(k: int) -> ComContext:
+        """第 k 个后台实例在主线程中的调用上下文, 第一次使用时取出封送的应用实例并绑定"""
+        context = main_contexts.get(k)
+        if context is None:
+            app = win32.Dispatch(pythoncom.CoGetInterfaceAndReleaseStream(app_streams[k], pythoncom.IID_IDispatch))
+            context = main_contexts[k] = _new_context(f'{apps[k]._context.name}@main')
+            _INSTANCE_CONTEXTS.append(context)
+            context.bind(app)
+        return context
+
+    def receive(data) -> AcadDocument:
+        k, stream = data
+        obj = win32.Dispatch(pythoncom.CoGetInterfaceAndReleaseStream(stream, pythoncom.IID_IDispatch))
+        return main_context(k).wrap(obj)
+
+    def process_stage(file: str, data, doc: AcadDocument):
+        try:
+            return process(file, data, doc)
+        finally:
+            _forget_document(doc)
+            doc.Close(save)
+
+    def discard(file: str, doc: AcadDocument):
+        _forget_document(doc)
+        doc.Close(False)
+
+    return PrefetchPipeline(open_stage,
+                            process_stage,
+                            depth=depth,
+                            receive=receive,
+                            discard=discard,
+                            thread_init=thread_init,
+                            thread_exit=thread_exit)
+
+
+def _dxf_filter(codes: Tuple[int, ...], values: Tuple[Any, ...]) -> Tuple[VARIANT, VARIANT]:
+    """选择集过滤条件: FilterType 为 short 数组, FilterData 为 VARIANT 数组"""
+    return VARIANT(2 | 8192, codes), VARIANT(12 | 8192, values)
+
 
-    # 遍历查找 doc
-    file = os.path.abspath(file)
-    for doc in app.Documents:
-        if file == os.path.abspath(doc.FullName) and not doc.ReadOnly:
-            doc.Activate()
-            return doc
+_QUERY = SelectionQuery(encode=_dxf_filter, point=ORIGIN_POINT)
 
-    # 没有找到则打开文件
+
+def _use_selection_filter() -> bool:
+    """配置 [com] selection_filter, 查询图块时是否使用选择集过滤器"""
     try:
-        return app.Documents.Open(file)
+        return get_config()['com'].getboolean('selection_filter', True)
     except:
-        raise
+        return True
+
+
+def _scan_block_ref(ly: AcadLayout, block_ref_name: str) -> List[AcadBlockReference]:
+    """遍历布局中的所有图形, 选择指定的图块实例"""
+    res = []
+    for obj in ly.Block:
+        if obj.ObjectName == 'AcDbBlockReference' and obj.Name == block_ref_name:
+            res.append(obj)
+
+    return res  # type: ignore
 
 
 def get_block_ref_from_layout(ly: AcadLayout, block_ref_name: str) -> List[AcadBlockReference]:
     """
     从布局中选择指定的图块实例
 
+    默认使用选择集过滤器由 AutoCAD 筛选, 查询失败时遍历布局中的所有图形
+
     Args:
         ly (AcadLayout): 布局对象
         block_ref_name (str): 图块名称
     """
-    res = []
-    for obj in ly.Block:
-        if obj.ObjectName == 'AcDbBlockReference' and obj.Name == block_ref_name:
-            res.append(obj)
+    if _use_selection_filter():
+        try:
+            return _QUERY.block_refs(ly.Document, block_ref_name, ly.Name)
+        except InstanceUnhealthyError:
+            raise
+        except Exception as e:
+            logging.warning(f'选择集查询失败, 遍历布局图形: {e}')
+    return _scan_block_ref(ly, block_ref_name)
+
+
+def _layout_block_refs(doc: AcadDocument, layout_name: str, block_ref_name: str) -> List[AcadBlockReference]:
+    """按布局名称查询图块实例, 不获取布局对象; 查询失败时遍历布局中的所有图形"""
+    if _use_selection_filter():
+        try:
+            return _QUERY.block_refs(doc, block_ref_name, layout_name)
+        except InstanceUnhealthyError:
+            raise
+        except Exception as e:
+            logging.warning(f'选择集查询失败, 遍历布局图形: {e}')
+    return _scan_block_ref(doc.Layouts.Item(layout_name), block_ref_name)
 
-    return res  # type: ignore
+
+def document_snapshot(doc: AcadDocument) -> DocumentSnapshot:
+    """
+    文档的图块快照, 每个 (布局, 图块名称) 只查询一次, 布局名称只读取一次, 见 snapshot_utils.DocumentSnapshot
+
+    Args:
+        doc (AcadDocument): 文档
+
+    Returns:
+        DocumentSnapshot: 快照, 通过 sync_snapshot_row 修改属性, 插入或删除图块后调用 invalidate
+    """
+    return DocumentSnapshot(doc,
+                            lambda layout_name, block_name: _layout_block_refs(doc, layout_name, block_name),
+                            lambda: [ly.Name for ly in doc.Layouts])
 
 
 def get_block_ref_from_doc(doc: AcadDocument, block_ref_name: str) -> List[AcadBlockReference]:
     """
     从文档中获取指定图块
 
+    默认使用一个选择集查询所有布局(包括模型空间), 查询失败时逐个遍历布局
+
     Args:
         doc (AcadDocument): 文档
         block_ref_name (str): 图块名
@@ -195,9 +558,16 @@ def get_block_ref_from_doc(doc: AcadDocument, block_ref_name: str) -> List[AcadB
     Returns:
         List[AcadBlockReference]: 图块实例集合
     """
+    if _use_selection_filter():
+        try:
+            return _QUERY.block_refs(doc, block_ref_name)
+        except InstanceUnhealthyError:
+            raise
+        except Exception as e:
+            logging.warning(f'选择集查询失败, 遍历布局图形: {e}')
     res = []
     for ly in doc.Layouts:
-        res.extend(get_block_ref_from_layout(ly, block_ref_name))
+        res.extend(_scan_block_ref(ly, block_ref_name))
     return res
 
 
@@ -224,6 +594,7 @@ def del_block_from_doc(doc: AcadDocument, block_name: str):
     for b in get_block_ref_from_doc(doc, block_name):
         b.Delete()
     doc.Blocks.Item(block_name).Delete()
+    _BLOCK_GRAPHS.invalidate(doc)
 
 
 def flatten_block_reference(doc: AcadDocument,
@@ -231,6 +602,8 @@ def flatten_block_reference(doc: AcadDocument,
     """
     获取嵌套图块内部所有图块
 
+    每个图块定义只遍历一次, 结果按文档缓存, 见 block_utils.BlockGraph
+
     Args:
         doc (AcadApplication): 图块所在的 AcadDocument 文档
         block_obj (str): 最外层的图块对象
@@ -241,26 +614,43 @@ def flatten_block_reference(doc: AcadDocument,
 
     if block_obj.ObjectName != 'AcDbBlockReference':
         return []
-    else:
-        res = [block_obj]
-        i = 0
-        # 遍历集合，获取块对象的嵌套块
-        while i < len(res):
-            # 从 cad 文档获取图块定义
-            b = doc.Blocks.Item(res[i].Name)
-            # 遍历图块内部的图形
-            for j in range(b.Count):
-                # 将内部图块添加的 res 集合
-                if b.item(j).ObjectName == 'AcDbBlockReference':
-                    res.append(b.item(j))
-            i += 1
-        return res
+    return _BLOCK_GRAPHS.get(doc).flatten(block_obj)
+
+
+def count_nested_block_reference(doc: AcadDocument, block_name: str) -> int:
+    """
+    统计图块展开后的图块实例数量(包括最外层图块), 不展开图块
+
+    Args:
+        doc (AcadDocument): 文档
+        block_name (str): 图块名称
+
+    Returns:
+        int: 图块实例数量
+    """
+    return _BLOCK_GRAPHS.get(doc).expanded_count(block_name)
+
+
+def _tag_schemas() -> TagSchemaCache:
+    global _TAG_SCHEMAS
+    if _TAG_SCHEMAS is None:
+        file = None
+        try:
+            temp_path = get_config().defaults().get('temp_path')
+            if temp_path:
+                file = os.path.join(temp_path, 'attr_tags.json')
+        except:
+            ...
+        _TAG_SCHEMAS = TagSchemaCache(file)
+    return _TAG_SCHEMAS
 
 
 def get_bloct_attr_tags(doc: AcadDocument, block_name: str) -> List[str]:
     """
     获取指定图块的属性名称
 
+    结果按图块定义的指纹缓存, 并按 DWG 文件路径和修改时间保存到临时文件夹, 见 block_utils.TagSchemaCache
+
     Args:
         doc (AcadDocument): 文档
         block_name (str): 图块名称
@@ -268,38 +658,56 @@ def get_bloct_attr_tags(doc: AcadDocument, block_name: str) -> List[str]:
     Returns:
         List[str]: 属性名称数组
     """
+    return _tag_schemas().get(doc, block_name)
 
-    res = []
-    block = doc.Blocks.Item(block_name)
-    for itm in [block.Item(i) for i in range(block.Count)]:
-        if itm.ObjectName == 'AcDbAttributeDefinition':
-            res.append(itm.TagString)
-    return res
 
+def get_file_attr_tags(app: AcadApplication, file: str, block_name: str) -> List[str]:
+    """
+    获取 dwg 文件中图块的属性名称, 用于不在当前应用实例中修改文档的情况, 例如并行处理前在主进程中读取
+
+    优先读取属性名称缓存文件, 未缓存时只读打开文件, 读取后关闭; 文件已打开时使用已打开的文档
 
-def modify_block_attr(block: 'AcadBlockReference', kv_pair: Dict[str, str] = None):
+    Args:
+        app (AcadApplication | Callable[[], AcadApplication]): 应用实例, 或获取应用实例的函数(只在需要打开文件时调用)
+        file (str): dwg 文件
+        block_name (str): 图块名称
+
+    Returns:
+        List[str]: 属性名称数组
+    """
+    tags = _tag_schemas().peek(file, block_name)
+    if tags is not None:
+        return tags
+    if not isinstance(app, ComWrapper) and callable(app):
+        app = app()
+    doc = get_document_registry(app).find(file, writable=False)
+    if doc is not None:
+        return get_bloct_attr_tags(doc, block_name)
+    # 只读打开, 不锁定文件, 工作进程中的实例仍然可以修改
+    doc = app.Documents.Open(os.path.abspath(file), True)
+    try:
+        return get_bloct_attr_tags(doc, block_name)
+    finally:
+        _forget_document(doc)
+        doc.Close(False)
+
+
+def modify_block_attr(block: 'AcadBlockReference', kv_pair: Dict[str, str] = None) -> SyncReport | None:
     """
-    修改图块内部属性值
+    修改图块内部属性值, 只修改值不同的属性, 见 attr_utils.sync_block_attr
 
     Args:
         block (AcadBlock): 被修改的属性块对象
         kv_pair (Dict[str, str]): 属性名称(忽略大小写) ：修改为指定值
             当 kv_pair 为 None 时，清空属性值
+
+    Returns:
+        SyncReport | None: 修改结果, 图块没有属性时返回 None
     """
 
     if block.HasAttributes:
-        if kv_pair is None:
-            for attr in block.GetAttributes():
-                attr.TextString = ''
-        else:
-            KV = {}
-            for k, v in kv_pair.items():
-                KV[k.upper()] = v
-            # 筛选出需要改名的属性
-            attrs = [a for a in block.GetAttributes() if a.TagString.upper() in KV.keys()]
-            # 遍历属性
-            for attr in attrs:
-                attr.TextString = KV.get(attr.TagString.upper())
+        return sync_block_attr(block, kv_pair, blank_missing=kv_pair is None)
+    return None
 
 
 def insert_block_to_layout(*,
@@ -328,6 +736,8 @@ def insert_block_to_layout(*,
     ly = doc.Layouts.Item(layout_name)
     if ly:
         bi = ly.Block.InsertBlock(point, block_name, scale[0], scale[1], scale[2], rotation.value)
+        if os.path.isfile(block_name):
+            _BLOCK_GRAPHS.invalidate(doc)  # 插入外部文件可能重定义同名图块
         if layer_name is not None:
             try:
                 doc.Layers.Add(layer_name)
@@ -399,6 +809,68 @@ def print_layout(doc: AcadDocument, layout_name: str, target_file: str, **kw) ->
         return False
 
 
+def plot_layout_background(doc: AcadDocument, layout_name: str, target_file: str) -> bool:
+    """
+    后台打印布局, 提交后立即返回, 用于 plot_utils.PlotQueue
+
+    Args:
+        doc (AcadDocument): 文档
+        layout_name (str): 布局名称
+        target_file (str): 输出文件
+
+    Returns:
+        bool: 是否提交成功
+    """
+    path = os.path.split(target_file)[0]
+    if not os.path.exists(path):
+        os.makedirs(path)
+    ly = doc.Layouts.Item(layout_name)
+    doc.ActiveLayout = ly
+    # 后台打印
+    doc.SetVariable("BACKGROUNDPLOT", 1)
+    return bool(doc.Plot.PlotToFile(target_file))
+
+
+def publish_executor(app: AcadApplication, timeout: float = 600) -> Callable[[str, PublishBatch], bool]:
+    """
+    通过 -PUBLISH 命令执行 DSD 文件, 用于 publish_utils.Publisher
+
+    发布期间关闭 FILEDIA 和后台打印; SendCommand 异步执行, 发送命令后等待所有输出文件生成且应用空闲,
+    见 publish_utils.OutputWatcher. 完成后恢复系统变量; 超时时发布可能仍在进行, 不恢复系统变量并抛出异常
+
+    Args:
+        app (AcadApplication): 应用实例
+        timeout (float, optional): 等待一次发布完成的最长秒数. Defaults to 600.
+
+    Returns:
+        Callable[[str, PublishBatch], bool]: 参数为 (DSD 文件, 图纸), 完成时返回 True, 超时抛出 TimeoutError
+    """
+
+    def execute(dsd: str, batch: PublishBatch) -> bool:
+        doc = app.ActiveDocument if app.Documents.Count else app.Documents.Add()
+        old = {name: doc.GetVariable(name) for name in ('FILEDIA', 'BACKGROUNDPLOT')}
+        gate = com_utils.QuiescenceGate(app._wrapped_object, errors=_RETRY_ERRORS)
+        # 发送命令前记录输出文件的状态, 已存在的旧文件不作为发布完成的信号
+        watcher = OutputWatcher(batch.outputs)
+        try:
+            doc.SetVariable('FILEDIA', 0)
+            doc.SetVariable('BACKGROUNDPLOT', 0)
+            doc.SendCommand(f'_-PUBLISH "{dsd}"\n')
+        except Exception:
+            # 命令未发送, 发布没有开始
+            for name, value in old.items():
+                doc.SetVariable(name, value)
+            raise
+        if not watcher.wait(gate.is_quiescent, timeout=timeout):
+            raise TimeoutError(f'发布 {dsd} 超过 {timeout}s 未完成, 未生成: {watcher.pending()}; '
+                               f'FILEDIA, BACKGROUNDPLOT 未恢复: {old}')
+        for name, value in old.items():
+            doc.SetVariable(name, value)
+        return True
+
+    return execute
+
+
 def select_by_rectangle(doc: AcadDocument, mode: int | AcSelect = 0) -> AcadSelectionSet:
     p1 = doc.Utility.GetPoint()
     p2 = doc.Utility.GetCorner(point(p1), '指定对角点:')
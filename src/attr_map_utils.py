@@ -0,0 +1,188 @@
+"""
+图签属性与 excel 表头的映射
+
+映射按签名保存: 签名由图块属性名称集合和 excel 表头集合生成, 二者都未变化时直接使用保存的映射,
+变化时才需要重新确认; 映射的值是 excel 表头, 读取行数据时区分大小写, 因此表头在签名中区分大小写
+
+AttrMapResolver 的模式:
+    - prompt: 签名已保存时使用保存的映射, 否则打开窗口确认(初始值为自动匹配的结果), 确认后保存
+    - auto: 不打开窗口, 签名已保存时使用保存的映射, 否则自动匹配, 用于无人值守的批量运行
+    - always: 每次都打开窗口确认
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import *
+
+PROMPT = 'prompt'
+AUTO = 'auto'
+ALWAYS = 'always'
+MODES = (PROMPT, AUTO, ALWAYS)
+
+_NON_WORD = re.compile(r'[\s_\-.]+')
+
+
+def signature(tags: Iterable[str], headers: Iterable[str]) -> str:
+    """
+    图块属性名称集合和 excel 表头集合的签名, 忽略顺序和属性名称的大小写, 表头区分大小写
+
+    Args:
+        tags (Iterable[str]): 图块属性名称
+        headers (Iterable[str]): excel 表头
+
+    Returns:
+        str: sha256
+    """
+    text = json.dumps([sorted({t.lower() for t in tags}), sorted({str(h) for h in headers})],
+                      ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def auto_match(tags: Iterable[str], headers: Iterable[str]) -> Dict[str, str]:
+    """
+    自动匹配: 名称相同(忽略大小写), 或去除空格、下划线、横线和点后相同
+
+    Args:
+        tags (Iterable[str]): 图块属性名称
+        headers (Iterable[str]): excel 表头
+
+    Returns:
+        Dict[str, str]: key--属性名称(小写), value--excel 表头; 未匹配的属性不包含
+    """
+    headers = [str(h) for h in headers]
+    exact = {h.lower(): h for h in reversed(headers)}
+    loose = {_NON_WORD.sub('', h.lower()): h for h in reversed(headers)}
+    res = {}
+    for tag in dict.fromkeys(t.lower() for t in tags):
+        header = exact.get(tag) or loose.get(_NON_WORD.sub('', tag))
+        if header is not None:
+            res[tag] = header
+    return res
+
+
+class AttrMapStore:
+    """按签名保存的映射, json 文件"""
+
+    def __init__(self, file: str = None):
+        """
+        Args:
+            file (str, optional): 保存的文件, None 表示不保存. Defaults to None.
+        """
+        self.file = file
+        self._data: Dict[str, Dict[str, Any]] | None = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is None:
+            self._data = {}
+            if self.file and os.path.isfile(self.file):
+                try:
+                    with open(self.file, encoding='utf-8') as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError) as e:
+                    logging.warning(f'读取属性映射失败: {e}')
+        return self._data
+
+    def get(self, tags: Iterable[str], headers: Iterable[str]) -> Dict[str, str] | None:
+        """签名对应的映射, 未保存时返回 None"""
+        entry = self._load().get(signature(tags, headers))
+        return None if entry is None else dict(entry['map'])
+
+    def latest(self, tags: Iterable[str]) -> Dict[str, str] | None:
+        """属性名称集合相同的最近保存的映射, 用于表头变化后确认时的初始值"""
+        key = sorted({t.lower() for t in tags})
+        for entry in reversed(list(self._load().values())):
+            if entry['tags'] == key:
+                return dict(entry['map'])
+        return None
+
+    def put(self, tags: Iterable[str], headers: Iterable[str], mapping: Dict[str, str]):
+        """保存映射"""
+        tags, headers = list(tags), [str(h) for h in headers]
+        data = self._load()
+        key = signature(tags, headers)
+        data.pop(key, None)
+        data[key] = {'tags': sorted({t.lower() for t in tags}),
+                     'headers': sorted(set(headers)),
+                     'map': mapping}
+        self.save()
+
+    def save(self):
+        if not self.file:
+            return
+        _dir = os.path.dirname(self.file)
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir)
+        tmp = self.file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._load(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.file)
+
+
+class AttrMapResolver:
+    """获取图签属性与 excel 表头的映射"""
+
+    def __init__(self,
+                 store: AttrMapStore,
+                 mode: str = PROMPT,
+                 prompt: Callable[[List[str], List[str], Dict[str, str]], Dict[str, str]] = None):
+        """
+        Args:
+            store (AttrMapStore): 保存的映射
+            mode (str, optional): prompt/auto/always. Defaults to PROMPT.
+            prompt (Callable[[List[str], List[str], Dict[str, str]], Dict[str, str]], optional):
+                确认映射, 参数为 (属性名称, excel 表头, 初始映射). Defaults to None, 使用 view_utils.make_dwg_excel_attr_map.
+
+        Raises:
+            ValueError: 模式不存在
+        """
+        if mode not in MODES:
+            raise ValueError(f'属性映射模式 {mode} 不存在, 可选 {"/".join(MODES)}')
+        self.store = store
+        self.mode = mode
+        self._prompt = prompt
+
+    def __getstate__(self):
+        # 交互窗口的函数不传递给工作进程; 并行处理时映射由主进程生成, 见 commands._SignatureTask.resolve_attr_maps
+        state = self.__dict__.copy()
+        state['_prompt'] = None
+        return state
+
+    def prompt(self, tags: List[str], headers: List[str], initial: Dict[str, str]) -> Dict[str, str]:
+        if self._prompt is not None:
+            return self._prompt(tags, headers, initial)
+        from .view_utils import make_dwg_excel_attr_map
+
+        return make_dwg_excel_attr_map(tags, headers, initial)
+
+    def resolve(self, tags: Iterable[str], headers: Iterable[str]) -> Dict[str, str]:
+        """
+        获取映射
+
+        Args:
+            tags (Iterable[str]): 图块属性名称
+            headers (Iterable[str]): excel 表头
+
+        Returns:
+            Dict[str, str]: key--属性名称(小写), value--excel 表头
+        """
+        tags, headers = list(tags), [str(h) for h in headers]
+        if self.mode != ALWAYS:
+            mapping = self.store.get(tags, headers)
+            if mapping is not None:
+                return mapping
+        initial = auto_match(tags, headers)
+        if self.mode == AUTO:
+            unmatched = sorted({t.lower() for t in tags} - set(initial))
+            logging.info(f'自动匹配图签属性: {initial}' + (f', 未匹配: {unmatched}' if unmatched else ''))
+            return initial
+        # 保留上一次确认的映射中仍然有效的表头, 表头只有大小写变化时使用当前的表头
+        latest = self.store.latest(tags) or {}
+        valid = {h.lower(): h for h in reversed(headers)}
+        initial.update({k: valid[v.lower()] for k, v in latest.items() if v.lower() in valid})
+        mapping = self.prompt(tags, headers, initial)
+        self.store.put(tags, headers, mapping)
+        return mapping
@@ -0,0 +1,155 @@
+"""
+图块属性同步
+
+sync_block_attr 一次读取图块所有属性的当前值, 只修改与目标值不同的属性, 未指定的属性在同一次遍历中清空;
+每次修改属性都是一次 COM 调用, 并可能引起重生成和文档修改标记, 属性值未变化的图块不产生任何修改
+
+图块已经读取到 LayoutSnapshot 中时使用 sync_snapshot_row, 直接与快照中的属性值比较,
+只有需要修改时才通过 HandleToObject 获取图块
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import *
+
+from .snapshot_utils import SnapshotRow
+
+if TYPE_CHECKING:
+    from lib.acad_typing.acadObjects import *
+
+
+@dataclass
+class AttrChange:
+    """一个属性的修改"""
+    tag: str
+    old: str
+    new: str
+
+
+@dataclass
+class SyncReport:
+    """
+    一个图块的属性同步结果
+
+    Attributes:
+        handle (str): 图块句柄
+        changes (List[AttrChange]): 修改的属性
+        unchanged (int): 未修改的属性数量
+        unknown (List[str]): 目标值中图块没有的属性名称
+        error (str): 修改失败的原因, 为空表示成功; 失败的布局没有图块句柄
+    """
+    handle: str = ''
+    changes: List[AttrChange] = field(default_factory=list)
+    unchanged: int = 0
+    unknown: List[str] = field(default_factory=list)
+    error: str = ''
+
+    @property
+    def writes(self) -> int:
+        return len(self.changes)
+
+    @property
+    def changed(self) -> bool:
+        return len(self.changes) > 0
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.error)
+
+    def __str__(self):
+        if self.error:
+            return f'{self.handle}: 失败 {self.error}'
+        if not self.changes:
+            return f'{self.handle}: 未修改'
+        return f'{self.handle}: ' + ', '.join(f'{c.tag} {c.old!r} -> {c.new!r}' for c in self.changes)
+
+
+def normalize(value) -> str:
+    """属性值转换为字符串, None 和 NaN(excel 空单元格) 转换为空字符串"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value)
+
+
+def plan(current: Sequence[Tuple[str, str]],
+         values: Dict[str, Any],
+         blank_missing: bool = True) -> Tuple[List[Tuple[int, AttrChange]], int, List[str]]:
+    """
+    比较属性的当前值与目标值
+
+    Args:
+        current (Sequence[Tuple[str, str]]): 按图块属性顺序的 (属性名称, 当前值)
+        values (Dict[str, Any]): 属性名称(忽略大小写): 目标值
+        blank_missing (bool, optional): 是否清空 values 中没有的属性. Defaults to True.
+
+    Returns:
+        Tuple[List[Tuple[int, AttrChange]], int, List[str]]: ([(属性序号, 修改), ...], 未修改的属性数量, 图块没有的属性名称)
+    """
+    target = {k.upper(): normalize(v) for k, v in values.items()}
+    changes, unchanged, seen = [], 0, set()
+    for i, (tag, old) in enumerate(current):
+        key = tag.upper()
+        seen.add(key)
+        if key in target:
+            new = target[key]
+        elif blank_missing:
+            new = ''
+        else:
+            unchanged += 1
+            continue
+        old = normalize(old)
+        if old == new:
+            unchanged += 1
+        else:
+            changes.append((i, AttrChange(tag, old, new)))
+    unknown = [k for k in values if k.upper() not in seen]
+    return changes, unchanged, unknown
+
+
+def sync_block_attr(block: AcadBlockReference,
+                    values: Dict[str, Any] = None,
+                    blank_missing: bool = True) -> SyncReport:
+    """
+    同步图块属性, 只修改值不同的属性
+
+    Args:
+        block (AcadBlockReference): 图块实例
+        values (Dict[str, Any], optional): 属性名称(忽略大小写): 目标值, None 表示清空所有属性. Defaults to None.
+        blank_missing (bool, optional): 是否清空 values 中没有的属性. Defaults to True.
+
+    Returns:
+        SyncReport: 同步结果
+    """
+    attrs = block.GetAttributes()
+    current = [(a.TagString, a.TextString) for a in attrs]
+    changes, unchanged, unknown = plan(current, values or {}, blank_missing or values is None)
+    for i, change in changes:
+        attrs[i].TextString = change.new
+    return SyncReport(block.Handle, [c for _, c in changes], unchanged, unknown)
+
+
+def sync_snapshot_row(row: SnapshotRow,
+                      values: Dict[str, Any] = None,
+                      blank_missing: bool = True) -> SyncReport:
+    """
+    按快照中的属性值同步图块属性, 属性值相同时不调用 COM, 修改后同步更新快照
+
+    Args:
+        row (SnapshotRow): 快照中的图块实例
+        values (Dict[str, Any], optional): 属性名称(忽略大小写): 目标值, None 表示清空所有属性. Defaults to None.
+        blank_missing (bool, optional): 是否清空 values 中没有的属性. Defaults to True.
+
+    Returns:
+        SyncReport: 同步结果
+    """
+    snapshot = row.snapshot
+    current = list(snapshot.attributes(row.index))
+    changes, unchanged, unknown = plan(current, values or {}, blank_missing or values is None)
+    if changes:
+        # GetAttributes 与快照读取时的属性顺序一致
+        attrs = row.resolve().GetAttributes()
+        for i, change in changes:
+            attrs[i].TextString = change.new
+            snapshot.set_attribute(row, change.tag, change.new)
+    return SyncReport(row.handle, [c for _, c in changes], unchanged, unknown)
@@ -0,0 +1,340 @@
+"""
+图块定义缓存
+
+图块定义中可以嵌套其他图块的实例, 所有定义构成有向无环图(DAG). BlockGraph 按需遍历图块定义,
+每个定义只读取一次其中的图块实例, 之后展开嵌套图块和统计数量都不再调用 COM
+
+BlockGraphCache 按文档保存 BlockGraph, 以 Blocks.Count 作为指纹, 图块定义数量变化时重新遍历;
+重定义图块(插入同名的外部文件)或删除图块定义后需要调用 invalidate
+
+TagSchemaCache 缓存图块定义的属性名称, 以图形数量和首尾图形句柄作为图块定义的指纹;
+指定缓存文件后按 DWG 文件路径和修改时间保存, 文件未修改时不再读取图块定义
+"""
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import os
+from typing import *
+
+if TYPE_CHECKING:
+    from lib.acad_typing.acadObjects import *
+    from lib.acad_typing.acadDocuments import *
+
+BLOCK_REFERENCE = 'AcDbBlockReference'
+ATTRIBUTE_DEFINITION = 'AcDbAttributeDefinition'
+
+
+class BlockGraph:
+    """一个文档的图块定义图"""
+
+    def __init__(self, doc: AcadDocument, fingerprint: Hashable = None):
+        """
+        Args:
+            doc (AcadDocument): 文档
+            fingerprint (Hashable, optional): 创建时的文档指纹. Defaults to None.
+        """
+        self.doc = doc
+        self.fingerprint = fingerprint
+        self._children: Dict[str, List[Tuple[str, Any]]] = {}
+        """key--图块定义名称, value--[(嵌套图块名称, 嵌套图块实例), ...]"""
+        self._counts: Dict[str, int] = {}
+        self.visits = 0
+        """已遍历的图块定义数量"""
+
+    def children(self, name: str) -> List[Tuple[str, Any]]:
+        """
+        图块定义中直接嵌套的图块实例, 每个定义只遍历一次
+
+        Args:
+            name (str): 图块定义名称
+
+        Returns:
+            List[Tuple[str, Any]]: [(图块名称, 图块实例), ...]
+        """
+        res = self._children.get(name)
+        if res is None:
+            res = []
+            block = self.doc.Blocks.Item(name)
+            for j in range(block.Count):
+                obj = block.Item(j)
+                if obj.ObjectName == BLOCK_REFERENCE:
+                    res.append((obj.Name, obj))
+            self._children[name] = res
+            self.visits += 1
+        return res
+
+    def flatten(self, block_obj: AcadBlockReference, name: str = None) -> List[AcadBlockReference]:
+        """
+        按广度优先展开嵌套图块, 结果与逐层遍历图块定义相同
+
+        Args:
+            block_obj (AcadBlockReference): 最外层的图块实例
+            name (str, optional): 图块名称, None 时读取 block_obj.Name. Defaults to None.
+
+        Returns:
+            List[AcadBlockReference]: block_obj 及其展开后的所有嵌套图块实例
+        """
+        queue = [(name if name is not None else block_obj.Name, block_obj)]
+        i = 0
+        while i < len(queue):
+            queue.extend(self.children(queue[i][0]))
+            i += 1
+        return [obj for _, obj in queue]
+
+    def expanded_count(self, name: str) -> int:
+        """
+        展开后的图块实例数量, 包括最外层图块, 按定义记忆不重复遍历
+
+        Args:
+            name (str): 图块定义名称
+
+        Raises:
+            ValueError: 图块定义循环引用
+        """
+        if name in self._counts:
+            return self._counts[name]
+        # 后序遍历, 避免深层嵌套时递归过深
+        stack, visiting = [(name, False)], set()
+        while stack:
+            n, done = stack.pop()
+            if n in self._counts:
+                continue
+            if done:
+                visiting.discard(n)
+                self._counts[n] = 1 + sum(self._counts[c] for c, _ in self.children(n))
+                continue
+            if n in visiting:
+                raise ValueError(f'图块 {n} 循环引用')
+            visiting.add(n)
+            stack.append((n, True))
+            stack.extend((c, False) for c, _ in self.children(n) if c not in self._counts)
+        return self._counts[name]
+
+    def definitions(self, name: str) -> Set[str]:
+        """图块及其嵌套的所有图块定义名称"""
+        res, queue = {name}, collections.deque([name])
+        while queue:
+            for c, _ in self.children(queue.popleft()):
+                if c not in res:
+                    res.add(c)
+                    queue.append(c)
+        return res
+
+
+class BlockGraphCache:
+    """
+    按文档缓存 BlockGraph
+
+    图块定义图保存文档的 COM 对象, 文档关闭后需要调用 invalidate(见 acad_utils._forget_document);
+    键包括文档所属应用实例的调用上下文, 重新创建的实例中打开同一文件时不使用原实例的对象
+    """
+
+    def __init__(self):
+        self._graphs: Dict[Tuple[Any, str], BlockGraph] = {}
+        """key--(调用上下文, 文档完整路径), 未保存的文档为文档名称"""
+
+    @staticmethod
+    def _key(doc: AcadDocument) -> Tuple[Any, str]:
+        return getattr(doc, '_context', None), doc.FullName or doc.Name
+
+    @staticmethod
+    def fingerprint(doc: AcadDocument) -> Hashable:
+        """图块定义数量"""
+        return doc.Blocks.Count
+
+    def get(self, doc: AcadDocument) -> BlockGraph:
+        """
+        获取文档的图块定义图, 指纹变化时重新创建
+
+        Args:
+            doc (AcadDocument): 文档
+        """
+        key = self._key(doc)
+        fingerprint = self.fingerprint(doc)
+        graph = self._graphs.get(key)
+        if graph is None or graph.fingerprint != fingerprint:
+            graph = self._graphs[key] = BlockGraph(doc, fingerprint)
+        return graph
+
+    def invalidate(self, doc: AcadDocument | str = None):
+        """
+        清除缓存
+
+        Args:
+            doc (AcadDocument | str, optional): 文档或文档完整路径, None 表示所有文档. Defaults to None.
+        """
+        if doc is None:
+            self._graphs.clear()
+        elif isinstance(doc, str):
+            for key in [k for k in self._graphs if k[1] == doc]:
+                del self._graphs[key]
+        else:
+            self._graphs.pop(self._key(doc), None)
+
+
+def definition_fingerprint(block: AcadBlock) -> Tuple[int, str, str]:
+    """
+    图块定义的指纹: (图形数量, 第一个图形句柄, 最后一个图形句柄)
+
+    新增、删除图形或重定义图块时句柄会变化, 只需要读取 3 个图形属性
+    """
+    count = block.Count
+    if count == 0:
+        return 0, '', ''
+    return count, block.Item(0).Handle, block.Item(count - 1).Handle
+
+
+def read_attr_tags(block: AcadBlock) -> List[str]:
+    """遍历图块定义, 读取属性名称"""
+    res = []
+    for i in range(block.Count):
+        itm = block.Item(i)
+        if itm.ObjectName == ATTRIBUTE_DEFINITION:
+            res.append(itm.TagString)
+    return res
+
+
+class TagSchemaCache:
+    """
+    图块属性名称缓存
+
+    内存中按 (文档, 图块名称) 保存指纹和属性名称, 指纹一致时不遍历图块定义;
+    缓存文件中按 DWG 文件路径保存文件修改时间、指纹和属性名称, 文档已保存且文件修改时间一致时直接使用
+    """
+
+    def __init__(self, file: str = None):
+        """
+        Args:
+            file (str, optional): 缓存文件路径(json), None 表示不保存到文件. Defaults to None.
+        """
+        self.file = file
+        self._memory: Dict[Tuple[str, str], Tuple[tuple, List[str]]] = {}
+        """key--(文档, 图块名称), value--(指纹, 属性名称)"""
+        self._store: Dict[str, Dict[str, Any]] | None = None
+        """缓存文件内容, key--DWG 文件路径, value--{'mtime': 修改时间, 'blocks': {图块名称: {'fingerprint', 'tags'}}}"""
+        self.hits = 0
+        self.file_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _path_key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def _mtime(path: str) -> float | None:
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._store is None:
+            self._store = {}
+            if self.file and os.path.isfile(self.file):
+                try:
+                    with open(self.file, encoding='utf-8') as f:
+                        self._store = json.load(f)
+                except (OSError, ValueError) as e:
+                    logging.warning(f'读取属性名称缓存失败: {e}')
+        return self._store
+
+    def _save(self):
+        _dir = os.path.dirname(self.file)
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir)
+        tmp = self.file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._store, f, ensure_ascii=False)
+        os.replace(tmp, self.file)
+
+    def _from_file(self, path: str, block_name: str) -> Dict[str, Any] | None:
+        """文件修改时间一致时返回缓存文件中的记录"""
+        entry = self._load().get(self._path_key(path))
+        if entry is None or entry.get('mtime') != self._mtime(path):
+            return None
+        return entry['blocks'].get(block_name)
+
+    def _to_file(self, path: str, block_name: str, fingerprint: tuple, tags: List[str]):
+        mtime = self._mtime(path)
+        if mtime is None:
+            return
+        store = self._load()
+        key = self._path_key(path)
+        entry = store.get(key)
+        if entry is None or entry.get('mtime') != mtime:
+            entry = store[key] = {'mtime': mtime, 'blocks': {}}
+        record = {'fingerprint': list(fingerprint), 'tags': tags}
+        if entry['blocks'].get(block_name) != record:
+            entry['blocks'][block_name] = record
+            try:
+                self._save()
+            except OSError as e:
+                logging.warning(f'保存属性名称缓存失败: {e}')
+
+    def peek(self, path: str, block_name: str) -> List[str] | None:
+        """
+        从缓存文件中读取图块的属性名称, 不打开文档
+
+        Args:
+            path (str): DWG 文件路径
+            block_name (str): 图块名称
+
+        Returns:
+            List[str] | None: 属性名称, 未缓存或文件已修改时返回 None
+        """
+        if not self.file:
+            return None
+        record = self._from_file(path, block_name)
+        return None if record is None else list(record['tags'])
+
+    def get(self, doc: AcadDocument, block_name: str) -> List[str]:
+        """
+        获取图块的属性名称
+
+        Args:
+            doc (AcadDocument): 文档
+            block_name (str): 图块名称
+
+        Returns:
+            List[str]: 属性名称
+        """
+        path = doc.FullName
+        persist = bool(self.file and path)
+        if persist:
+            record = self._from_file(path, block_name)
+            if record is not None and doc.Saved:
+                self.file_hits += 1
+                return list(record['tags'])
+
+        key = (path or doc.Name, block_name)
+        block = doc.Blocks.Item(block_name)
+        fingerprint = definition_fingerprint(block)
+        cached = self._memory.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            self.hits += 1
+            tags = cached[1]
+        else:
+            self.misses += 1
+            tags = read_attr_tags(block)
+            self._memory[key] = (fingerprint, tags)
+        if persist and doc.Saved:
+            self._to_file(path, block_name, fingerprint, tags)
+        return list(tags)
+
+    def invalidate(self, doc: str = None):
+        """
+        清除内存中的缓存, 缓存文件按修改时间自动失效
+
+        Args:
+            doc (str, optional): 文档完整路径, None 表示所有文档. Defaults to None.
+        """
+        if doc is None:
+            self._memory.clear()
+        else:
+            for key in [k for k in self._memory if k[0] == doc]:
+                del self._memory[key]
+
+    def report(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'file_hits': self.file_hits, 'misses': self.misses}
@@ -0,0 +1,239 @@
+"""
+增量生成
+
+BuildGraph 记录每个生成目标(修改的图签、插入的图框、目录布局)的输入指纹: excel 行、模板文件内容、配置节、
+DWG 文件内容等. 再次运行时只重新生成输入发生变化、输出文件不存在或依赖的目标需要重新生成的目标,
+explain 列出每个目标需要重新生成的原因
+
+输入可以是值(按 json 计算 sha256)或返回值的函数; 文件输入使用 file_input(path), 在 plan 和 record 时读取,
+record 在目标生成并保存后调用, 记录的是生成后的文件内容
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import *
+
+from .plot_utils import file_digest
+
+
+def value_digest(value: Any) -> str:
+    """值的 sha256, 字典按键排序"""
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class _Target:
+    name: str
+    inputs: Dict[str, Any]
+    deps: List[str]
+    outputs: List[str]
+
+
+@dataclass
+class Decision:
+    """
+    一个目标是否需要重新生成
+
+    Attributes:
+        target (str): 目标名称
+        rebuild (bool): 是否需要重新生成
+        reasons (List[str]): 需要重新生成的原因
+    """
+    target: str
+    rebuild: bool
+    reasons: List[str] = field(default_factory=list)
+
+
+class BuildGraph:
+    """生成目标的依赖图"""
+
+    def __init__(self,
+                 file: str = None,
+                 *,
+                 digest: Callable[[str], str | None] = file_digest,
+                 exists: Callable[[str], bool] = os.path.exists):
+        """
+        Args:
+            file (str, optional): 保存上一次生成记录的文件(json), None 表示不保存. Defaults to None.
+            digest (Callable[[str], str | None], optional): 文件内容的指纹. Defaults to file_digest.
+            exists (Callable[[str], bool], optional): 检查输出文件是否存在. Defaults to os.path.exists.
+        """
+        self.file = file
+        self.digest = digest
+        self.exists = exists
+        self._targets: Dict[str, _Target] = {}
+        self._state: Dict[str, Any] | None = None
+        """生成记录, {'clock': 记录次数, 'targets': {目标: {'inputs': {输入: 指纹}, 'deps': {依赖: 序号}, 'stamp': 序号}}}"""
+        self._digests: Dict[Tuple[str, int, float], str | None] = {}
+        """文件指纹, key--(路径, 大小, 修改时间)"""
+
+    def _load(self) -> Dict[str, Any]:
+        if self._state is None:
+            self._state = {'clock': 0, 'targets': {}}
+            if self.file and os.path.isfile(self.file):
+                try:
+                    with open(self.file, encoding='utf-8') as f:
+                        self._state = json.load(f)
+                except (OSError, ValueError) as e:
+                    logging.warning(f'读取生成记录失败: {e}')
+        return self._state
+
+    def save(self):
+        """保存生成记录"""
+        if not self.file:
+            return
+        _dir = os.path.dirname(self.file)
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir)
+        tmp = self.file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._load(), f, ensure_ascii=False)
+        os.replace(tmp, self.file)
+
+    def file_input(self, path: str) -> Callable[[], str | None]:
+        """
+        文件内容输入, 按文件大小和修改时间缓存指纹
+
+        Args:
+            path (str): 文件路径
+
+        Returns:
+            Callable[[], str | None]: 返回文件指纹, 文件不存在时返回 None
+        """
+
+        def _():
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            key = (os.path.normcase(os.path.abspath(path)), st.st_size, st.st_mtime)
+            if key not in self._digests:
+                self._digests[key] = self.digest(path)
+            return self._digests[key]
+
+        return _
+
+    def add(self,
+            name: str,
+            inputs: Dict[str, Any],
+            deps: Iterable[str] = (),
+            outputs: Iterable[str] = ()):
+        """
+        添加目标
+
+        Args:
+            name (str): 目标名称
+            inputs (Dict[str, Any]): 输入名称: 值或返回值的函数
+            deps (Iterable[str], optional): 依赖的其他目标. Defaults to ().
+            outputs (Iterable[str], optional): 目标生成的文件, 不存在时需要重新生成. Defaults to ().
+        """
+        self._targets[name] = _Target(name, dict(inputs), list(deps), list(outputs))
+
+    def __contains__(self, name: str):
+        return name in self._targets
+
+    def _fingerprints(self, target: _Target) -> Dict[str, str]:
+        res = {}
+        for k, v in target.inputs.items():
+            v = v() if callable(v) else v
+            res[k] = v if isinstance(v, str) and callable(target.inputs[k]) else value_digest(v)
+        return res
+
+    def _order(self) -> List[_Target]:
+        """按依赖关系排序, 依赖的目标在前"""
+        order, state = [], {}
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f'目标循环依赖: {" -> ".join(path + (name,))}')
+            state[name] = 1
+            for dep in self._targets[name].deps:
+                if dep in self._targets:
+                    visit(dep, path + (name,))
+            state[name] = 2
+            order.append(self._targets[name])
+
+        for name in self._targets:
+            visit(name, ())
+        return order
+
+    def plan(self) -> Dict[str, Decision]:
+        """
+        判断每个目标是否需要重新生成
+
+        Returns:
+            Dict[str, Decision]: key--目标名称, 依赖的目标在前
+        """
+        records = self._load()['targets']
+        res: Dict[str, Decision] = {}
+        for target in self._order():
+            decision = res[target.name] = Decision(target.name, False)
+            reasons = decision.reasons
+            record = records.get(target.name)
+            if record is None:
+                reasons.append('新目标')
+            else:
+                old = record['inputs']
+                for k, v in self._fingerprints(target).items():
+                    if k not in old:
+                        reasons.append(f'新增输入 {k}')
+                    elif old[k] != v:
+                        reasons.append(f'输入 {k} 已修改')
+                reasons += [f'输入 {k} 已删除' for k in old if k not in target.inputs]
+            for dep in target.deps:
+                if dep in res and res[dep].rebuild:
+                    reasons.append(f'依赖 {dep} 需要重新生成')
+                elif record is not None:
+                    dep_record = records.get(dep)
+                    if dep_record is not None and dep_record['stamp'] != record['deps'].get(dep):
+                        reasons.append(f'依赖 {dep} 已更新')
+            reasons += [f'输出 {f} 不存在' for f in target.outputs if not self.exists(f)]
+            decision.rebuild = bool(reasons)
+        return res
+
+    def stale(self) -> List[str]:
+        """需要重新生成的目标"""
+        return [k for k, d in self.plan().items() if d.rebuild]
+
+    def explain(self, plan: Dict[str, Decision] = None) -> str:
+        """
+        每个目标是否需要重新生成及原因
+
+        Args:
+            plan (Dict[str, Decision], optional): plan 的结果. Defaults to None, 重新调用 plan.
+        """
+        plan = self.plan() if plan is None else plan
+        lines = [f'{sum(d.rebuild for d in plan.values())}/{len(plan)} 个目标需要重新生成']
+        for d in plan.values():
+            lines.append(f'    {d.target}: ' + ('; '.join(d.reasons) if d.rebuild else '已是最新'))
+        return '\n'.join(lines)
+
+    def record(self, *names: str):
+        """
+        记录目标已生成, 在目标生成并保存后调用; 重新读取输入指纹
+
+        Args:
+            *names (str): 目标名称
+        """
+        state = self._load()
+        for name in names:
+            target = self._targets[name]
+            state['clock'] += 1
+            state['targets'][name] = {
+                'inputs': self._fingerprints(target),
+                'deps': {d: state['targets'].get(d, {}).get('stamp') for d in target.deps},
+                'stamp': state['clock']
+            }
+
+    def forget(self, *names: str):
+        """删除目标的生成记录, 下一次运行时重新生成"""
+        targets = self._load()['targets']
+        for name in names:
+            targets.pop(name, None)
@@ -0,0 +1,1009 @@
+"""
+COM 调用辅助工具
+
+对 COM 调用异常进行分类, 并按错误类型采用不同的重试策略:
+    -- transient: 临时错误(调用被拒绝、应用程序忙), 等待后重试
+    -- permanent: 永久错误(参数错误、键不存在、成员不存在), 立即抛出
+    -- unknown:   无法识别的错误, 沿用原有的重试方式
+
+重试间隔按指数退避并加入随机抖动; 每个 AutoCAD 应用实例对应一个 ComContext,
+连续失败达到阈值后熔断, 在恢复前直接抛出 InstanceUnhealthyError
+
+开启 quiescent 模式后, 修改类调用前先通过 GetAcadState().IsQuiescent 等待应用空闲,
+避免在重生成、打印期间反复调用失败
+
+开启属性缓存(PropertyCache)后, 指定属性按 (文档, 句柄, 属性名) 缓存读取结果,
+通过 ComWrapper 修改文档时该文档的缓存失效
+"""
+from __future__ import annotations
+
+import collections
+import dataclasses
+import logging
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import *
+
+# 临时错误
+RPC_E_CALL_REJECTED = -2147418111  # 0x80010001 Call was rejected by callee.
+RPC_E_SERVERCALL_RETRYLATER = -2147417846  # 0x8001010A The application is busy.
+RPC_E_SERVERCALL_REJECTED = -2147417845  # 0x8001010B
+RPC_E_CANTCALLOUT_ININPUTSYNCCALL = -2147417843  # 0x8001010D
+
+# 永久错误
+E_NOTIMPL = -2147467263  # 0x80004001
+E_INVALIDARG = -2147024809  # 0x80070057
+DISP_E_MEMBERNOTFOUND = -2147352573  # 0x80020003
+DISP_E_PARAMNOTFOUND = -2147352572  # 0x80020004
+DISP_E_TYPEMISMATCH = -2147352571  # 0x80020005
+DISP_E_UNKNOWNNAME = -2147352570  # 0x80020006
+DISP_E_BADPARAMCOUNT = -2147352562  # 0x8002000E
+ACAD_E_KEY_NOT_FOUND = -2145386476  # 0x80200014 AutoCAD: Key not found
+
+# 应用实例已退出或崩溃, 需要重新创建应用实例
+RPC_S_SERVER_UNAVAILABLE = -2147023174  # 0x800706BA The RPC server is unavailable.
+RPC_E_DISCONNECTED = -2147417848  # 0x80010108 The object invoked has disconnected from its clients.
+CO_E_SERVER_EXEC_FAILURE = -2146959355  # 0x80080005 Server execution failed.
+
+# 由被调用方抛出的异常, 具体错误码保存在 excepinfo 中
+DISP_E_EXCEPTION = -2147352567  # 0x80020009
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+UNKNOWN = 'unknown'
+
+TRANSIENT_HRESULTS: Set[int] = {
+    RPC_E_CALL_REJECTED,
+    RPC_E_SERVERCALL_RETRYLATER,
+    RPC_E_SERVERCALL_REJECTED,
+    RPC_E_CANTCALLOUT_ININPUTSYNCCALL,
+}
+PERMANENT_HRESULTS: Set[int] = {
+    E_NOTIMPL,
+    E_INVALIDARG,
+    DISP_E_MEMBERNOTFOUND,
+    DISP_E_PARAMNOTFOUND,
+    DISP_E_TYPEMISMATCH,
+    DISP_E_UNKNOWNNAME,
+    DISP_E_BADPARAMCOUNT,
+    ACAD_E_KEY_NOT_FOUND,
+}
+
+DISCONNECTED_HRESULTS: Set[int] = {
+    RPC_S_SERVER_UNAVAILABLE,
+    RPC_E_DISCONNECTED,
+    CO_E_SERVER_EXEC_FAILURE,
+}
+
+READ_ONLY_METHODS: Set[str] = {
+    'Item',
+    'GetAcadState',
+    'GetAttributes',
+    'GetConstantAttributes',
+    'GetBoundingBox',
+    'GetDynamicBlockProperties',
+    'GetInterfaceObject',
+    'GetVariable',
+    'GetXData',
+    'HandleToObject',
+    'ObjectIdToObject',
+}
+"""不修改文档的方法, quiescent 模式下调用前无需等待应用空闲, 调用后属性缓存不失效;
+选择集的 Select、Clear 会修改选择集, 不属于只读方法"""
+
+CACHEABLE_PROPERTIES: Set[str] = {
+    'ObjectName',
+    'Name',
+    'EffectiveName',
+    'InsertionPoint',
+    'Layer',
+    'TagString',
+    'HasAttributes',
+}
+"""默认缓存的属性"""
+
+DOCUMENT_PROPERTIES: Set[str] = {'ActiveDocument', 'Document'}
+"""返回值为 AcadDocument 的属性"""
+
+
+@dataclass
+class RetryPolicy:
+    """
+    重试策略
+
+        retries: int   最多调用次数(包含首次调用), 小于等于 1 时不重试
+
+        delay: float   首次重试前等待的秒数
+
+        factor: float   每次重试等待时间的增长倍数
+
+        max_delay: float   单次等待时间上限
+
+        jitter: float   随机抖动比例, 实际等待时间在 [1 - jitter, 1] 倍之间
+    """
+    retries: int = 10
+    delay: float = 0.2
+    factor: float = 2.0
+    max_delay: float = 2.0
+    jitter: float = 0.5
+
+    def backoff(self, attempt: int) -> float:
+        """
+        第 attempt 次重试前的等待时间
+
+        Args:
+            attempt (int): 重试次数, 从 1 开始
+
+        Returns:
+            float: 等待秒数
+        """
+        _delay = min(self.max_delay, self.delay * self.factor ** (attempt - 1))
+        return _delay * (1 - self.jitter * random.random())
+
+
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    TRANSIENT: RetryPolicy(retries=10, delay=0.05, factor=2, max_delay=2.0),
+    PERMANENT: RetryPolicy(retries=1, delay=0),
+    UNKNOWN: RetryPolicy(retries=10, delay=0.2, factor=1, max_delay=0.2),
+}
+"""默认重试策略, key--错误类型, value--重试策略"""
+
+
+def _signed(hresult: int) -> int:
+    """将 HRESULT 统一转换为 32 位有符号整数"""
+    hresult &= 0xFFFFFFFF
+    return hresult - 0x100000000 if hresult & 0x80000000 else hresult
+
+
+def get_hresult(e: BaseException) -> int | None:
+    """
+    获取 COM 异常的错误码
+
+    com_error.args 的结构为 (hresult, strerror, excepinfo, argerror),
+    当 hresult 为 DISP_E_EXCEPTION 时, 取 excepinfo 中的 scode 作为错误码
+
+    Args:
+        e (BaseException): 异常对象
+
+    Returns:
+        int | None: 错误码, 不是 COM 异常时返回 None
+    """
+    hresult = getattr(e, 'hresult', None)
+    if hresult is None and len(e.args) > 0 and isinstance(e.args[0], int):
+        hresult = e.args[0]
+    if not isinstance(hresult, int):
+        return None
+    hresult = _signed(hresult)
+    if hresult == DISP_E_EXCEPTION and len(e.args) > 2:
+        excepinfo = e.args[2]
+        if excepinfo and len(excepinfo) > 5 and excepinfo[5]:
+            return _signed(excepinfo[5])
+    return hresult
+
+
+def classify(e: BaseException) -> str:
+    """
+    对 COM 调用异常进行分类
+
+    win32com 在获取属性失败时会将 com_error 转换为 AttributeError,
+    此时根据原始的 com_error 判断; 没有原始 com_error 的 AttributeError 视为属性名称错误
+
+    Args:
+        e (BaseException): 异常对象
+
+    Returns:
+        str: TRANSIENT | PERMANENT | UNKNOWN
+    """
+    if isinstance(e, AttributeError):
+        cause = e.__cause__ or e.__context__
+        if cause is None or cause is e:
+            return PERMANENT
+        return classify(cause)
+
+    hresult = get_hresult(e)
+    if hresult in TRANSIENT_HRESULTS:
+        return TRANSIENT
+    if hresult in PERMANENT_HRESULTS:
+        return PERMANENT
+    return UNKNOWN
+
+
+def is_disconnected(e: BaseException) -> bool:
+    """
+    应用实例是否已不可用(已熔断、已退出或崩溃), 需要重新创建应用实例
+
+    Args:
+        e (BaseException): 异常对象
+    """
+    if isinstance(e, InstanceUnhealthyError):
+        return True
+    if isinstance(e, AttributeError):
+        cause = e.__cause__ or e.__context__
+        return cause is not None and cause is not e and is_disconnected(cause)
+    return get_hresult(e) in DISCONNECTED_HRESULTS
+
+
+def set_retry_policy(kind: str, **kw):
+    """
+    修改指定错误类型的重试策略
+
+    Args:
+        kind (str): 错误类型 TRANSIENT | PERMANENT | UNKNOWN
+        **kw: RetryPolicy 的属性, 值为 None 时不修改
+    """
+    policy = RETRY_POLICIES[kind]
+    for k, v in kw.items():
+        if v is not None and hasattr(policy, k):
+            setattr(policy, k, v)
+
+
+def load_retry_policies(section, base: Dict[str, RetryPolicy] = None) -> Dict[str, RetryPolicy]:
+    """
+    从配置文件读取重试策略, 返回新的策略表, 不修改 RETRY_POLICIES; 每个 ComContext 使用各自的策略表
+
+    Args:
+        section (SectionProxy): 配置节, 选项名称为 {kind}_retries, {kind}_delay, {kind}_factor,
+            {kind}_max_delay, {kind}_jitter
+        base (Dict[str, RetryPolicy], optional): 未配置的选项使用的策略. Defaults to RETRY_POLICIES.
+
+    Raises:
+        ValueError: 选项的值不是数字
+
+    Returns:
+        Dict[str, RetryPolicy]: key--错误类型, value--重试策略
+    """
+    res = {}
+    for kind, policy in (base or RETRY_POLICIES).items():
+        policy = res[kind] = dataclasses.replace(policy)
+        for k, v in {'retries': section.getint(f'{kind}_retries', None),
+                     'delay': section.getfloat(f'{kind}_delay', None),
+                     'factor': section.getfloat(f'{kind}_factor', None),
+                     'max_delay': section.getfloat(f'{kind}_max_delay', None),
+                     'jitter': section.getfloat(f'{kind}_jitter', None)}.items():
+            if v is not None:
+                setattr(policy, k, v)
+    return res
+
+
+class InstanceUnhealthyError(RuntimeError):
+    """应用实例已熔断, 在恢复前不再接受调用"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f'{name} is unhealthy, retry after {retry_after:.1f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续 threshold 次调用在重试后仍然失败时熔断(open), 熔断期间的调用直接抛出 InstanceUnhealthyError;
+    经过 reset_timeout 秒后进入半开状态(half_open), 只允许一个调用试探, 试探结束前其他调用仍然被拒绝;
+    试探成功则恢复(closed), 失败则再次熔断
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30, clock: Callable[[], float] = None):
+        """
+        Args:
+            threshold (int, optional): 连续失败次数阈值. Defaults to 5.
+            reset_timeout (float, optional): 熔断持续秒数. Defaults to 30.
+            clock (Callable[[], float], optional): 时钟函数. Defaults to time.monotonic.
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock or time.monotonic
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial: int | None = None
+        """半开状态下正在试探的线程"""
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def healthy(self) -> bool:
+        """应用实例是否可以接受调用, 半开状态下已有调用在试探时为 False"""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and self._trial is None)
+
+    def allow(self) -> bool:
+        """
+        是否允许一次调用, 半开状态下第一个调用成为试探调用
+
+        Returns:
+            bool: 允许调用时为 True, 调用结束后需要调用 record_success / record_failure 或 release
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        with self._lock:
+            if self._trial is not None:
+                return False
+            self._trial = threading.get_ident()
+            return True
+
+    def release(self):
+        """当前线程的试探调用未得出结果(例如抛出未处理的异常)时结束试探, 下一个调用重新试探"""
+        with self._lock:
+            if self._trial == threading.get_ident():
+                self._trial = None
+
+    def retry_after(self) -> float:
+        """距离半开状态的剩余秒数"""
+        if self._opened_at is None:
+            return 0
+        return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial = None
+
+    def record_failure(self) -> bool:
+        """
+        记录一次失败
+
+        Returns:
+            bool: 本次失败是否导致熔断
+        """
+        self._failures += 1
+        if self.state == self.HALF_OPEN or (self._opened_at is None and self._failures >= self.threshold):
+            self._opened_at = self._clock()
+            self._trial = None
+            return True
+        return False
+
+
+@dataclass
+class RetryStats:
+    """
+    COM 调用统计
+
+        calls: int   调用次数
+
+        retries: int   重试次数
+
+        sleep_time: float   重试等待的总秒数
+
+        failures: int   重试后仍然失败的次数
+
+        breaker_trips: int   熔断次数
+
+        rejected: int   熔断期间被拒绝的调用次数
+
+        errors: Counter   按错误类型统计的异常次数
+
+        waits: int   quiescent 模式下等待应用空闲的次数(应用忙时才计数)
+
+        wait_time: float   等待应用空闲的总秒数
+
+        polls: int   查询应用状态的次数
+    """
+    calls: int = 0
+    retries: int = 0
+    sleep_time: float = 0
+    failures: int = 0
+    breaker_trips: int = 0
+    rejected: int = 0
+    errors: collections.Counter = field(default_factory=collections.Counter)
+    waits: int = 0
+    wait_time: float = 0
+    polls: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'sleep_time': round(self.sleep_time, 3),
+            'failures': self.failures,
+            'breaker_trips': self.breaker_trips,
+            'rejected': self.rejected,
+            'errors': dict(self.errors),
+            'waits': self.waits,
+            'wait_time': round(self.wait_time, 3),
+            'polls': self.polls,
+        }
+
+    def reset(self):
+        self.__init__()
+
+
+def call_with_retry(f: Callable,
+                    *args,
+                    errors: Tuple[Type[BaseException], ...] = (AttributeError,),
+                    policies: Dict[str, RetryPolicy] = None,
+                    breaker: CircuitBreaker = None,
+                    stats: RetryStats = None,
+                    sleep: Callable[[float], Any] = time.sleep,
+                    gate: QuiescenceGate = None,
+                    name: str = 'COM',
+                    **kwargs):
+    """
+    调用函数, 出现 errors 中的异常时根据异常类型重试
+
+    Args:
+        f (Callable): 被调用的函数
+        errors (Tuple[Type[BaseException], ...], optional): 需要处理的异常类型.
+            Defaults to (AttributeError,).
+        policies (Dict[str, RetryPolicy], optional): 重试策略. Defaults to RETRY_POLICIES.
+        breaker (CircuitBreaker, optional): 熔断器. Defaults to None.
+        stats (RetryStats, optional): 调用统计. Defaults to None.
+        sleep (Callable[[float], Any], optional): 等待函数. Defaults to time.sleep.
+        gate (QuiescenceGate, optional): 出现临时错误时等待应用空闲, 而不是按退避时间等待.
+            Defaults to None.
+        name (str, optional): 应用实例名称, 用于异常信息. Defaults to 'COM'.
+
+    Raises:
+        InstanceUnhealthyError: 熔断期间的调用
+
+    Returns:
+        函数返回值
+    """
+    if policies is None:
+        policies = RETRY_POLICIES
+    if stats is None:
+        stats = RetryStats()
+    if breaker is not None and not breaker.allow():
+        stats.rejected += 1
+        raise InstanceUnhealthyError(name, breaker.retry_after())
+
+    stats.calls += 1
+    _retry = 0
+    try:
+        while True:
+            try:
+                result = f(*args, **kwargs)
+            except errors as e:
+                kind = classify(e)
+                stats.errors[kind] += 1
+                policy = policies[kind]
+                _retry += 1
+                if _retry >= policy.retries:
+                    if kind == PERMANENT:
+                        # 应用实例正常响应, 只是调用本身有误
+                        if breaker is not None:
+                            breaker.record_success()
+                    else:
+                        stats.failures += 1
+                        if breaker is not None and breaker.record_failure():
+                            stats.breaker_trips += 1
+                            logging.error(f'{name} --> circuit breaker open')
+                    raise
+                if _retry == 1:
+                    logging.warning(f'{type(e)} --> {e} --> {kind} --> retry...')
+                stats.retries += 1
+                if kind == TRANSIENT and gate is not None:
+                    gate.invalidate()
+                    if gate.wait(stats):
+                        continue
+                _delay = policy.backoff(_retry)
+                stats.sleep_time += _delay
+                sleep(_delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+    finally:
+        if breaker is not None:
+            # 半开状态下试探调用抛出未处理的异常时结束试探
+            breaker.release()
+
+
+class QuiescenceGate:
+    """
+    等待应用空闲
+
+    轮询 AcadApplication.GetAcadState().IsQuiescent, 直到应用空闲或超时;
+    查询状态本身被拒绝时视为应用忙。
+    确认空闲后 recheck_interval 秒内不再查询, 调用可能引起重生成的方法后需调用 invalidate 重新查询
+    """
+
+    def __init__(self,
+                 application,
+                 *,
+                 poll_interval: float = 0.05,
+                 timeout: float = 30,
+                 recheck_interval: float = None,
+                 errors: Tuple[Type[BaseException], ...] = (AttributeError,),
+                 clock: Callable[[], float] = None,
+                 sleep: Callable[[float], Any] = time.sleep):
+        """
+        Args:
+            application: 未包装的 AcadApplication 对象
+            poll_interval (float, optional): 轮询间隔秒数. Defaults to 0.05.
+            timeout (float, optional): 最长等待秒数, 超时后不再等待直接调用. Defaults to 30.
+            recheck_interval (float, optional): 确认空闲后多少秒内不再查询. Defaults to poll_interval.
+            errors (Tuple[Type[BaseException], ...], optional): 查询状态时忽略的异常类型.
+                Defaults to (AttributeError,).
+            clock (Callable[[], float], optional): 时钟函数. Defaults to time.monotonic.
+            sleep (Callable[[float], Any], optional): 等待函数. Defaults to time.sleep.
+        """
+        self.application = application
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.recheck_interval = poll_interval if recheck_interval is None else recheck_interval
+        self.errors = errors
+        self._clock = clock or time.monotonic
+        self._sleep = sleep
+        self._confirmed_at: float | None = None
+
+    def invalidate(self):
+        """下一次 wait 时重新查询应用状态"""
+        self._confirmed_at = None
+
+    def is_quiescent(self) -> bool:
+        try:
+            return bool(self.application.GetAcadState().IsQuiescent)
+        except self.errors:
+            return False
+
+    def wait(self, stats: RetryStats = None) -> bool:
+        """
+        等待应用空闲
+
+        Args:
+            stats (RetryStats, optional): 调用统计. Defaults to None.
+
+        Returns:
+            bool: 应用是否空闲, 超时返回 False
+        """
+        if stats is None:
+            stats = RetryStats()
+        start = self._clock()
+        if self._confirmed_at is not None and start - self._confirmed_at < self.recheck_interval:
+            return True
+        waited = False
+        while True:
+            stats.polls += 1
+            if self.is_quiescent():
+                res = True
+                break
+            if self._clock() - start >= self.timeout:
+                logging.warning(f'wait quiescent timeout --> {self.timeout}s')
+                res = False
+                break
+            waited = True
+            self._sleep(self.poll_interval)
+        if waited:
+            stats.waits += 1
+            stats.wait_time += self._clock() - start
+        self._confirmed_at = self._clock() if res else None
+        return res
+
+
+class PropertyCache:
+    """
+    属性缓存
+
+    按 (文档, 句柄, 属性名) 缓存属性值。每个文档有一个 epoch, 通过 ComWrapper 修改文档
+    (设置属性、调用非只读方法)时 epoch 加一并清空该文档的缓存;
+    在 AutoCAD 界面或其他程序中修改文档后, 需要调用 invalidate 手动清空
+    """
+
+    def __init__(self, properties: Iterable[str] = None):
+        """
+        Args:
+            properties (Iterable[str], optional): 需要缓存的属性名称. Defaults to CACHEABLE_PROPERTIES.
+        """
+        self.properties: Set[str] = set(CACHEABLE_PROPERTIES if properties is None else properties)
+        self._values: Dict[Hashable, Dict[Tuple[str, str], Any]] = collections.defaultdict(dict)
+        self._epochs: Dict[Hashable, int] = collections.defaultdict(int)
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+    def epoch(self, doc: Hashable) -> int:
+        return self._epochs[doc]
+
+    def get(self, doc: Hashable, handle: str, prop: str) -> Tuple[bool, Any]:
+        """
+        Returns:
+            Tuple[bool, Any]: (是否命中, 属性值)
+        """
+        values = self._values.get(doc)
+        if values is not None and (handle, prop) in values:
+            self.hits[prop] += 1
+            return True, values[(handle, prop)]
+        self.misses[prop] += 1
+        return False, None
+
+    def put(self, doc: Hashable, handle: str, prop: str, value):
+        self._values[doc][(handle, prop)] = value
+
+    def bump(self, doc: Hashable):
+        """文档被修改, epoch 加一并清空该文档的缓存"""
+        self._epochs[doc] += 1
+        self._values.pop(doc, None)
+
+    def invalidate(self, doc: Hashable = None):
+        """
+        清空缓存
+
+        Args:
+            doc (Hashable, optional): 文档, None 表示所有文档. Defaults to None.
+        """
+        if doc is None:
+            for k in list(self._values.keys()):
+                self.bump(k)
+        else:
+            self.bump(doc)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各属性的缓存命中情况
+
+        Returns:
+            Dict[str, Dict[str, Any]]: key--属性名称, value--hits, misses, hit_rate
+        """
+        res = {}
+        for prop in sorted(set(self.hits.keys()) | set(self.misses.keys())):
+            hits, misses = self.hits[prop], self.misses[prop]
+            res[prop] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 3)}
+        return res
+
+
+_DOCUMENTS = object()
+"""标记 Documents 集合及其方法, 其返回值为文档"""
+_NO_HANDLE = object()
+"""标记没有 Handle 属性的对象"""
+
+_set = object.__setattr__
+
+
+def _com_type(raw) -> Hashable | None:
+    """
+    对象的 COM 接口, 同一接口的对象方法名称相同
+
+    late-bound 对象(CDispatch)的 Python 类型都相同, 使用类型信息中的接口 IID(_olerepr_.clsid);
+    没有类型信息时返回 None, 不记录方法名称; 其他对象使用 Python 类型
+    """
+    olerepr = getattr(raw, '__dict__', {}).get('_olerepr_')
+    if olerepr is not None:
+        return getattr(olerepr, 'clsid', None)
+    return type(raw)
+
+
+class ComContext:
+    """
+    COM 调用上下文, 每个应用实例对应一个上下文
+
+    同一应用实例返回的所有 ComWrapper 共享上下文中的重试策略、熔断器和调用统计;
+    绑定应用实例并设置 quiescent = True 后, 修改类调用前先等待应用空闲;
+    开启 identity_map 后, 同一文档中句柄相同的图形返回同一个 ComWrapper
+    """
+
+    def __init__(self,
+                 name: str = 'COM',
+                 *,
+                 dispatch_types: Tuple[type, ...] = (),
+                 errors: Tuple[Type[BaseException], ...] = (AttributeError,),
+                 policies: Dict[str, RetryPolicy] = None,
+                 breaker: CircuitBreaker = None,
+                 quiescent: bool = False,
+                 poll_interval: float = 0.05,
+                 quiescent_timeout: float = 30,
+                 cache: PropertyCache = None,
+                 identity_map: bool = False,
+                 clock: Callable[[], float] = None,
+                 sleep: Callable[[float], Any] = time.sleep):
+        """
+        Args:
+            name (str, optional): 应用实例名称. Defaults to 'COM'.
+            dispatch_types (Tuple[type, ...], optional): 返回值为这些类型时包装为 ComWrapper.
+                Defaults to ().
+            errors (Tuple[Type[BaseException], ...], optional): 需要处理的异常类型.
+                Defaults to (AttributeError,).
+            policies (Dict[str, RetryPolicy], optional): 重试策略. Defaults to RETRY_POLICIES.
+            breaker (CircuitBreaker, optional): 熔断器. Defaults to CircuitBreaker().
+            quiescent (bool, optional): 修改类调用前是否等待应用空闲. Defaults to False.
+            poll_interval (float, optional): 查询应用状态的间隔秒数. Defaults to 0.05.
+            quiescent_timeout (float, optional): 等待应用空闲的最长秒数. Defaults to 30.
+            cache (PropertyCache, optional): 属性缓存, None 表示不缓存. Defaults to None.
+            identity_map (bool, optional): 句柄相同的图形是否返回同一个 ComWrapper,
+                每个新获取的图形需要多读取一次 Handle. Defaults to False.
+            clock (Callable[[], float], optional): 时钟函数. Defaults to time.monotonic.
+            sleep (Callable[[float], Any], optional): 等待函数. Defaults to time.sleep.
+        """
+        self.name = name
+        self.dispatch_types = dispatch_types
+        self.errors = errors
+        self.policies = policies
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.stats = RetryStats()
+        self.quiescent = quiescent
+        self.poll_interval = poll_interval
+        self.quiescent_timeout = quiescent_timeout
+        self.cache = cache
+        self.identity: Dict[Hashable, weakref.WeakValueDictionary] | None = \
+            collections.defaultdict(weakref.WeakValueDictionary) if identity_map else None
+        """key--文档, value--(key--句柄, value--ComWrapper)"""
+        self.clock = clock
+        self.sleep = sleep
+        self.gate: QuiescenceGate | None = None
+        self._type_methods: Dict[Hashable, Set[str]] = collections.defaultdict(set)
+        """按被包装对象的 COM 接口记录已解析的方法名称, 见 _com_type"""
+
+    def bind(self, application):
+        """
+        绑定应用实例, 用于查询应用状态
+
+        Args:
+            application: 未包装的 AcadApplication 对象
+        """
+        if isinstance(application, ComWrapper):
+            application = application._wrapped_object
+        self.gate = QuiescenceGate(application,
+                                   poll_interval=self.poll_interval,
+                                   timeout=self.quiescent_timeout,
+                                   errors=self.errors,
+                                   clock=self.clock,
+                                   sleep=self.sleep)
+
+    @property
+    def healthy(self) -> bool:
+        """应用实例是否可以接受调用"""
+        return self.breaker.healthy
+
+    @property
+    def track_documents(self) -> bool:
+        """是否需要记录对象所在文档"""
+        return self.cache is not None or self.identity is not None
+
+    def before_write(self, wrapper: ComWrapper, name: str = None):
+        """
+        修改类调用前的处理, quiescent 模式下等待应用空闲
+
+        Args:
+            wrapper (ComWrapper): 被修改的对象
+            name (str, optional): 属性或方法名称. Defaults to None.
+        """
+        if self.quiescent and self.gate is not None and self.breaker.healthy:
+            self.gate.wait(self.stats)
+
+    def after_write(self, wrapper: ComWrapper):
+        """修改属性后的处理, 对象所在文档的属性缓存失效"""
+        if self.cache is not None and wrapper._doc is not None:
+            self.cache.bump(wrapper._doc)
+
+    def after_method(self, wrapper: ComWrapper, name: str = None):
+        """
+        调用方法后的处理
+
+        方法可能引起重生成或打印, 下一次修改前重新查询应用状态; 非只读方法使文档的属性缓存失效
+
+        Args:
+            wrapper (ComWrapper): 方法所属对象
+            name (str, optional): 方法名称. Defaults to None.
+        """
+        if name in READ_ONLY_METHODS:
+            return
+        if self.gate is not None:
+            self.gate.invalidate()
+        self.after_write(wrapper)
+
+    def invalidate(self, doc=None):
+        """
+        清空属性缓存
+
+        Args:
+            doc (ComWrapper | Hashable, optional): 文档, None 表示所有文档. Defaults to None.
+        """
+        if self.cache is None:
+            return
+        if isinstance(doc, ComWrapper):
+            doc = doc._doc
+            if doc is None or doc is _DOCUMENTS:
+                return
+        self.cache.invalidate(doc)
+
+    def adopt(self, child, parent: ComWrapper, name: str = None):
+        """
+        设置子对象的名称和所在文档, 开启 identity_map 时返回已有的同一图形的 ComWrapper
+
+        Args:
+            child: 调用返回值
+            parent (ComWrapper): 返回 child 的对象
+            name (str, optional): 获取 child 的属性名称. Defaults to None.
+        """
+        if not isinstance(child, ComWrapper):
+            return child
+        _set(child, '_name', name)
+        if not self.track_documents:
+            return child
+        doc = parent._doc
+        is_document = False
+        if name == 'Documents':
+            doc = _DOCUMENTS
+        elif doc is _DOCUMENTS or name in DOCUMENT_PROPERTIES:
+            if isinstance(child._wrapped_object, self.dispatch_types):
+                doc = self._document_key(child)
+                is_document = True
+            else:
+                doc = _DOCUMENTS  # Documents.Open / Documents.Item 等方法
+        _set(child, '_doc', doc)
+        if self.identity is not None and not is_document and doc is not None and doc is not _DOCUMENTS:
+            handle = self._handle(child)
+            if handle is not _NO_HANDLE:
+                objects = self.identity[doc]
+                existing = objects.get(handle)
+                if existing is not None:
+                    return existing
+                objects[handle] = child
+        return child
+
+    def _document_key(self, doc: ComWrapper) -> str:
+        """文档的缓存键: 完整路径, 未保存的文档使用文档名称"""
+        raw = doc._wrapped_object
+        return self.invoke(raw.__getattr__, 'FullName') or self.invoke(raw.__getattr__, 'Name')
+
+    def _handle(self, wrapper: ComWrapper):
+        handle = wrapper._handle
+        if handle is None:
+            try:
+                handle = self.invoke(wrapper._wrapped_object.__getattr__, 'Handle')
+            except self.errors:
+                handle = _NO_HANDLE
+            _set(wrapper, '_handle', handle)
+        return handle
+
+    def _method(self, wrapper: ComWrapper, item: str, raw_method=None) -> ComMethod:
+        """获取对象的方法, 同一对象的同名方法只创建一次"""
+        methods = wrapper._methods
+        if methods is None:
+            methods = {}
+            _set(wrapper, '_methods', methods)
+        method = methods.get(item)
+        if method is None:
+            method = methods[item] = ComMethod(wrapper, item, raw_method)
+        return method
+
+    def get_property(self, wrapper: ComWrapper, item: str):
+        """
+        读取属性或方法, 开启属性缓存时优先从缓存读取
+        """
+        raw = wrapper._wrapped_object
+        com_type = _com_type(raw)
+        if com_type is not None and item in self._type_methods.get(com_type, ()):
+            return self._method(wrapper, item)
+
+        cache = self.cache
+        doc = wrapper._doc
+        handle = _NO_HANDLE
+        if cache is not None and item in cache.properties and doc is not None and doc is not _DOCUMENTS:
+            handle = self._handle(wrapper)
+            if handle is not _NO_HANDLE:
+                found, value = cache.get(doc, handle, item)
+                if found:
+                    return value
+
+        value = self.invoke(raw.__getattr__, item)
+        if callable(value) and not isinstance(value, self.dispatch_types):
+            if com_type is not None:
+                self._type_methods[com_type].add(item)
+            return self._method(wrapper, item, value)
+        value = self.adopt(self.wrap(value), wrapper, item)
+        if handle is not _NO_HANDLE and not isinstance(value, ComWrapper):
+            cache.put(doc, handle, item, value)
+        return value
+
+    def invoke(self, f, *args, **kwargs):
+        """
+        调用 COM 对象方法, 解包参数中的 ComWrapper, 返回值不包装
+        """
+        # Unwrap inputs
+        args = [arg._wrapped_object if isinstance(arg, ComWrapper) else arg for arg in args]
+        kwargs = dict([(key, value._wrapped_object) if isinstance(value, ComWrapper) else (key, value)
+                       for key, value in dict(kwargs).items()])
+        return call_with_retry(f,
+                               *args,
+                               errors=self.errors,
+                               policies=self.policies,
+                               breaker=self.breaker,
+                               stats=self.stats,
+                               sleep=self.sleep,
+                               gate=self.gate if self.quiescent else None,
+                               name=self.name,
+                               **kwargs)
+
+    def call(self, f, *args, **kwargs):
+        """
+        调用 COM 对象方法, 解包参数中的 ComWrapper 并包装返回值
+        """
+        return self.wrap(self.invoke(f, *args, **kwargs))
+
+    def wrap(self, result):
+        if isinstance(result, self.dispatch_types) or callable(result):
+            return ComWrapper(result, self)
+        return result
+
+
+class ComWrapper(object):
+    """
+    Class to wrap COM objects to repeat calls when 'Call was rejected by callee.' exception occurs.
+    """
+    __slots__ = ('_wrapped_object', '_context', '_name', '_doc', '_handle', '_methods', '__weakref__')
+
+    def __init__(self, wrapped_object, context: ComContext = None, name: str = None):
+        if context is None:
+            context = ComContext()
+        assert isinstance(wrapped_object, context.dispatch_types) or callable(wrapped_object)
+        _set(self, '_wrapped_object', wrapped_object)
+        _set(self, '_context', context)
+        _set(self, '_name', name)  # 通过属性获取时的名称, 用于判断方法是否只读
+        _set(self, '_doc', None)  # 所在文档的缓存键
+        _set(self, '_handle', None)
+        _set(self, '_methods', None)  # 已获取的方法, key--方法名称
+
+    def __getattr__(self, item):
+        return self._context.get_property(self, item)
+
+    def __getitem__(self, item):
+        return self._context.adopt(self._context.call(self._wrapped_object.__getitem__, item), self)
+
+    def __setattr__(self, key, value):
+        self._context.before_write(self, key)
+        self._context.invoke(self._wrapped_object.__setattr__, key, value)
+        self._context.after_write(self)
+
+    def __setitem__(self, key, value):
+        self._context.before_write(self, key)
+        self._context.invoke(self._wrapped_object.__setitem__, key, value)
+        self._context.after_write(self)
+
+    def __call__(self, *args, **kwargs):
+        if self._name not in READ_ONLY_METHODS:
+            self._context.before_write(self, self._name)
+        try:
+            return self._context.adopt(self._context.call(self._wrapped_object.__call__, *args, **kwargs),
+                                       self)
+        finally:
+            self._context.after_method(self, self._name)
+
+    def __repr__(self):
+        return 'ComWrapper<{}>'.format(repr(self._wrapped_object))
+
+
+class ComMethod(object):
+    """
+    COM 对象的方法, 由 ComWrapper 创建并缓存, 调用时按上下文重试并包装返回值
+    """
+    __slots__ = ('_owner', '_name', '_raw')
+
+    def __init__(self, owner: ComWrapper, name: str, raw=None):
+        _set(self, '_owner', owner)
+        _set(self, '_name', name)
+        _set(self, '_raw', raw)
+
+    def __call__(self, *args, **kwargs):
+        owner, name = self._owner, self._name
+        context = owner._context
+        raw = self._raw
+        if raw is None:
+            raw = context.invoke(owner._wrapped_object.__getattr__, name)
+            _set(self, '_raw', raw)
+        if name not in READ_ONLY_METHODS:
+            context.before_write(owner, name)
+        try:
+            return context.adopt(context.call(raw, *args, **kwargs), owner)
+        finally:
+            context.after_method(owner, name)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(key)
+
+    def __repr__(self):
+        return 'ComMethod<{}.{}>'.format(repr(self._owner._wrapped_object), self._name)
@@ -3,16 +3,27 @@ import collections
 import logging
 import os
 import re
-from copy import deepcopy
 
-import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from lib.acad_typing.acadDocuments import *
 from lib.acad_typing.acadEntities import *
 from lib.acad_typing.acadEnums import *
-from . import acad_utils, common_utils
+from . import acad_utils, common_utils, excel_utils
 from .abstract import Command
+from .attr_map_utils import AUTO, AttrMapResolver, AttrMapStore
+from .attr_utils import SyncReport, normalize, sync_snapshot_row
+from .build_utils import BuildGraph, Decision
+from .document_utils import DocumentCacheStats
+from .naming_utils import NameTemplate
+from .pipeline_utils import PipelineReport
+from .plot_utils import MISS, PlotCache, PlotCacheReport, PlotQueue, PlotReport
+from .pool_utils import PoolReport, WorkerPool
+from .preflight_utils import PreflightReport, existing_files, preflight
+from .publish_utils import Publisher, PublishReport, SheetJob
+from .record_utils import RecordStore, RecordView
+from .snapshot_utils import LayoutSnapshot, SnapshotRow
+from .variant_utils import VariantReport, group_variants, plan_variants
 
 
 
@@ -74,6 +85,33 @@ def _create_catalog_style():
         raise
 
 
+def _build_graph() -> Optional[BuildGraph]:
+    """增量生成的依赖图, 配置 [DEFAULT] incremental 未启用时返回 None"""
+    _sect = common_utils.get_config()['DEFAULT']
+    if not _sect.getboolean('incremental', False):
+        return None
+    temp_path = _sect.get('temp_path')
+    return BuildGraph(os.path.join(temp_path, 'build_graph.json') if temp_path else None)
+
+
+def _config_input(section: str) -> Dict[str, str]:
+    """配置节中的配置项(不含 DEFAULT), 作为增量生成的输入"""
+    conf = common_utils.get_config()
+    if not conf.has_section(section):
+        return {}
+    return {k: v for k, v in conf.items(section, raw=True) if k not in conf.defaults()}
+
+
+def _plan_build(graph: BuildGraph) -> Dict[str, Decision]:
+    """判断需要重新生成的目标, 配置 [DEFAULT] explain 启用时记录每个目标的原因"""
+    plan = graph.plan()
+    if common_utils.get_config()['DEFAULT'].getboolean('explain', False):
+        logging.info(graph.explain(plan))
+    else:
+        logging.info(f'{sum(d.rebuild for d in plan.values())}/{len(plan)} 个目标需要重新生成')
+    return plan
+
+
 class CreateCatalog(Command):
 
     def __init__(self, **kwargs) -> None:
@@ -97,24 +135,53 @@ class CreateCatalog(Command):
         _prefix = sect.get('prefix')
         _excel_file = sect.get('excel_file')
         self.__data: Dict[str, List[Dict]] = {}
-        _: Dict[str, pd.DataFrame] = pd.read_excel(_excel_file, sheet_name=None, dtype=str)
         # 创建目录表格数据
-        for k, v in _.items():
-            self.__data[_prefix + k + _suffix] = [i for i in v.to_dict(orient='index').values()]
+        sheets = _load_excel(_excel_file, {'reader': 'catalog'},
+                             lambda: {k: list(v) for k, v in excel_utils.read_sheets(_excel_file,
+                                                                                    engine=_excel_engine())})
+        for k, v in sheets.items():
+            self.__data[_prefix + k + _suffix] = v
 
         self.__app = acad_utils.get_application()
         self.__catalog_style = _create_catalog_style()
         self.__target = sect.get('target_file')
         self.__update = sect.getboolean('update')
         self.__close = sect.getboolean('close')
+        # 增量生成时各目录布局是否需要重新生成
+        self.build_plan: Dict[str, Decision] | None = None
 
         super().__init__(**kwargs)
 
+    def __build_target(self, ly_name: str) -> str:
+        return f'catalog:{os.path.abspath(self.__target)}:{ly_name}'
+
     def execute(self):
+        # 增量生成: 每个目录布局一个目标, 输入为子项目录、目录模板、目录样式配置和目标文件
+        graph = _build_graph()
+        stale = set(self.__data.keys())
+        if graph is not None:
+            style_sect = 'catalog_style.' + common_utils.get_config()['catalog']['catalog_style']
+            for ly_name, cell_list in self.__data.items():
+                graph.add(self.__build_target(ly_name), {
+                    'dwg': graph.file_input(self.__target),
+                    'rows': cell_list,
+                    'template': graph.file_input(self.__catalog_style.template_file),
+                    f'config:{style_sect}': _config_input(style_sect)
+                })
+            self.build_plan = _plan_build(graph)
+            stale = {k for k in self.__data.keys() if self.build_plan[self.__build_target(k)].rebuild}
+            if not stale:
+                logging.info(f'{self.__target} 目录已是最新')
+                return super().execute()
+            if not self.__update:
+                # 重新插入表格时所有目录都需要重新填写
+                stale = set(self.__data.keys())
+
         # 检查目标文件并获取文档对象
         if not os.path.exists(self.__target):
             doc = self.__app.Documents.Add(self.__target)
             doc.SaveAs(self.__target)
+            acad_utils.get_document_registry(self.__app).register(doc, self.__target)
         else:
             doc = acad_utils.open_file(self.__app, self.__target)
 
@@ -144,29 +211,35 @@ class CreateCatalog(Command):
 
         # 更新表格数据
         for _ly_name, cell_list in self.__data.items():
+            if _ly_name not in stale:
+                continue
             ly_name = _ly_name.replace('建筑物', '目录')
-            cells: List[AcadBlockReference] = []
-            for lb in doc.Layouts.Item(ly_name).Block:
-                if lb.ObjectName == 'AcDbBlockReference' and lb.Name == self.__catalog_style.cell_block_name:
-                    cells.append(lb)
+            # 一次读取所有单元格的插入点, 排序时不再调用 COM
+            ly = doc.Layouts.Item(ly_name)
+            cell_name = self.__catalog_style.cell_block_name
+            snapshot = LayoutSnapshot.capture(ly, acad_utils.get_block_ref_from_layout(ly, cell_name))
+            cells: List[SnapshotRow] = snapshot.block_refs(cell_name)
             # 单元格排序
-            cells.sort(key=lambda _: _.InsertionPoint[0])
+            cells.sort(key=lambda _: _.insertion_point[0])
             mid = len(cells) // 2
             left = cells[:mid]
-            left.sort(key=lambda _: _.InsertionPoint[1], reverse=True)
+            left.sort(key=lambda _: _.insertion_point[1], reverse=True)
             right = cells[mid:]
-            right.sort(key=lambda _: _.InsertionPoint[1], reverse=True)
+            right.sort(key=lambda _: _.insertion_point[1], reverse=True)
             cells = left + right
-            # 依次修改单元格
-            print(cells)
+            # 依次修改单元格, 与快照中的属性值比较, 未变化的单元格不调用 COM
             for k, c in enumerate(cells):
                 if k < len(cell_list):
-                    acad_utils.modify_block_attr(c, cell_list[k])
+                    sync_snapshot_row(c, cell_list[k], blank_missing=False)
                 else:
-                    acad_utils.modify_block_attr(c, None)
+                    sync_snapshot_row(c, None)
         doc.Save()
+        if graph is not None:
+            # 记录保存后的目标文件, 未重新生成的目录输入未变化, 一并记录
+            graph.record(*[self.__build_target(k) for k in self.__data.keys()])
+            graph.save()
         if self.__close:
-            doc.Close()
+            acad_utils.close_file(doc)
         return super().execute()
 
 
@@ -190,53 +263,83 @@ class InsertBorder(Command):
 
         # 从配置文件读取上一次的配置
         sect = common_utils.modify_border_config()
-        _: Dict[str, pd.DataFrame] = pd.read_excel(sect.get('excel_file'),
-                                                   dtype=str,
-                                                   sheet_name=None)
+        # 只读取需要的列
+        _columns = ['border_style', 'layout', 'file']
+        _records = _load_excel(sect.get('excel_file'), {'reader': 'border'},
+                               lambda: list(excel_utils.read_records(sect.get('excel_file'),
+                                                                     columns=_columns,
+                                                                     required=_columns,
+                                                                     engine=_excel_engine())))
         self._close = sect.getboolean('close')
+        # 增量生成时各文件是否需要重新生成
+        self.build_plan: Dict[str, Decision] | None = None
 
         styles_dict = {}
         _dir = sect['target_path']
-        for ignor, tb_data in _.items():
-            tb_data.dropna(inplace=True,
-                           axis='index',
-                           subset=['border_style', 'layout', 'file'],
-                           how='any')
-            for dic in tb_data.to_dict(orient='records'):
-                style_name = dic.get('border_style')
-                if style_name not in styles_dict.keys():
-                    _file = _create_temp_file(template_file=sect.get('border_template_file'),
-                                              style_name=style_name,
-                                              temp_path=sect.get('temp_path'))
-                    _size = common_utils.get_config()['border_style.' + style_name]['size']
-                    styles_dict[style_name] = BorderStyle(template_file=_file, size=_size)
-                self.__data.append(
-                    (os.path.join(_dir,
-                                  dic.get('file')), dic.get('layout'), styles_dict[style_name]))
+        for ignor, dic in _records:
+            style_name = dic.get('border_style')
+            if style_name not in styles_dict.keys():
+                _file = _create_temp_file(template_file=sect.get('border_template_file'),
+                                          style_name=style_name,
+                                          temp_path=sect.get('temp_path'))
+                _size = common_utils.get_config()['border_style.' + style_name]['size']
+                styles_dict[style_name] = BorderStyle(template_file=_file, size=_size)
+            self.__data.append(
+                (os.path.join(_dir,
+                              dic.get('file')), dic.get('layout'), styles_dict[style_name]))
 
     def execute(self):
         tmp = collections.defaultdict(list)
         # 按文件分类
         for (f, ly_name, border_style) in self.__data:
             tmp[f].append((ly_name, border_style))
-        # 遍历文件
-        for f, arr in tmp.items():
-            doc = acad_utils.open_file(self._app, f)
-            for ly_name, border_style in arr:
-                try:
-                    ly = doc.Layouts.Item(ly_name)
-                    _, _n = os.path.split(border_style.template_file)
-                    name, _ = os.path.splitext(_n)
-                    acad_utils.del_block_ref_from_layout(ly, name)
-                    bi = ly.Block.InsertBlock(acad_utils.ORIGIN_POINT, border_style.template_file,
-                                              1, 1, 1, 0)
-                    bi.Layer = '0'
-                except Exception as e:
-                    logging.error(f'InsertBorder Error --> {f} --> {ly_name} --> {e.args}')
-                    raise
-            if self._close:
-                doc.Save()
-                doc.Close()
+        # 增量生成: 每个文件一个目标, 输入为各布局的图框样式、图框模板、图框样式配置和 dwg 文件
+        graph = _build_graph()
+        if graph is not None:
+            for f, arr in tmp.items():
+                inputs = {'dwg': graph.file_input(f)}
+                for ly_name, border_style in arr:
+                    style_name = os.path.splitext(os.path.basename(border_style.template_file))[0]
+                    inputs[f'layout:{ly_name}'] = style_name
+                    inputs[f'template:{style_name}'] = graph.file_input(border_style.template_file)
+                    inputs[f'config:border_style.{style_name}'] = _config_input(f'border_style.{style_name}')
+                graph.add(f'border:{os.path.abspath(f)}', inputs)
+            self.build_plan = _plan_build(graph)
+            tmp = {f: arr for f, arr in tmp.items() if self.build_plan[f'border:{os.path.abspath(f)}'].rebuild}
+        done = []
+        # 需要关闭时通过缓存打开, 运行结束时统一保存并关闭
+        cache = acad_utils.get_document_cache(self._app) if self._close else None
+        try:
+            # 遍历文件
+            for f, arr in tmp.items():
+                doc = cache.open(f) if cache else acad_utils.open_file(self._app, f)
+                # 文档的图块快照, 原有图框从快照中查找
+                snapshot = acad_utils.document_snapshot(doc)
+                for ly_name, border_style in arr:
+                    try:
+                        _, _n = os.path.split(border_style.template_file)
+                        name, _ = os.path.splitext(_n)
+                        for row in snapshot.block_refs(ly_name, name):
+                            row.resolve().Delete()
+                        # 插入外部文件可能重定义同名图块, 由 insert_block_to_layout 使图块定义图失效
+                        acad_utils.insert_block_to_layout(doc=doc,
+                                                          layout_name=ly_name,
+                                                          block_name=border_style.template_file,
+                                                          point=acad_utils.ORIGIN_POINT,
+                                                          layer_name='0')
+                        snapshot.invalidate(ly_name)
+                    except Exception as e:
+                        logging.error(f'InsertBorder Error --> {f} --> {ly_name} --> {e.args}')
+                        raise
+                done.append(f)
+        finally:
+            if cache:
+                # 保存失败时抛出异常, 不记录任何文件
+                stats = acad_utils.close_documents(self._app)
+                if graph is not None:
+                    # 文档在关闭时保存, 只记录已保存的文件; 不关闭的文档未保存, 下一次运行时重新生成
+                    graph.record(*[f'border:{os.path.abspath(f)}' for f in done if stats.is_saved(f)])
+                    graph.save()
 
         return super().execute()
 
@@ -245,36 +348,80 @@ def _read_excel(excel_file: str,
                 dtype=str,
                 check_na: List[str] = None,
                 how_drop='any',
-                result_key='file') -> Dict[str, List[Dict]]:
+                result_key='file',
+                columns: List[str] = None) -> Dict[str, List[RecordView]]:
     """
     读取 excel 配置文件
     首行作为 dict 的键，忽略大小写，全部转化为小写
 
     Args:
         excel_file (str): excel 路径
-        dtype (_type_, optional): excel 单元格数据格式. Defaults to str.
+        dtype (_type_, optional): excel 单元格数据格式, None 表示保留原始值. Defaults to str.
         check_na (List[str], optional): 检查非空的列. Defaults to None.
         how_drop (str, optional): 删除空单元方式. Defaults to 'any'.
-        result_key (str, optional): 作为返回字典的键的 excel 表头. Defaults to 'file'.        
+        result_key (str, optional): 作为返回字典的键的 excel 表头. Defaults to 'file'.
+        columns (List[str], optional): 只读取指定的列, None 表示所有列. Defaults to None.
 
     Returns:
-        Dict[str, List[Dict]]: 
+        Dict[str, List[RecordView]]: 
             键 --> 文件名
-            值 --> 每一行数据形成的 Dict, 并新增 sub_project = sheet_name 项
+            值 --> 每一行数据的视图(可以像 Dict 一样使用), 并新增 sub_project = sheet_name 项
     """
-    # 读取图签信息
-    _: Dict[str, pd.DataFrame] = pd.read_excel(excel_file, sheet_name=None, dtype=dtype)
+    check_na = [*(check_na or []), result_key]
+    columns = columns and [*columns, result_key]
+
+    def parse():
+        # 逐行读取图签信息, 按列保存
+        store = RecordStore()
+        for sheet, record in excel_utils.read_records(excel_file,
+                                                      columns=columns,
+                                                      required=check_na,
+                                                      how=how_drop,
+                                                      dtype=dtype,
+                                                      lower=True,
+                                                      engine=_excel_engine()):
+            store.append(record, sub_project=sheet)
+        return store
+
+    options = {
+        'reader': '_read_excel',
+        'dtype': getattr(dtype, '__name__', repr(dtype)),
+        'check_na': tuple(check_na),
+        'how_drop': how_drop,
+        'result_key': result_key,
+        'columns': columns and tuple(columns)
+    }
+    store: RecordStore = _load_excel(excel_file, options, parse)
     # 按文件分类
     # 文件路径作为键，该文件对应的图纸列表作为值
-    file_infos_dict: Dict[str, List[Dict]] = collections.defaultdict(list)
-    check_na.append(result_key)
-    for sub_name, df in _.items():
-        df.dropna(subset=check_na, how=how_drop, inplace=True)
-        df.columns = [col.lower() for col in df.columns]  # 列名转为小写
-        for info in df.to_dict(orient='index').values():
-            info['sub_project'] = sub_name  # 添加子项名称
-            file_infos_dict[info.get(result_key)].append(info)
-    return file_infos_dict
+    return {k: store.rows(v) for k, v in store.group_by(result_key).items()}
+
+
+def _excel_engine() -> str:
+    """excel 读取引擎, 配置 [DEFAULT] excel_engine"""
+    return common_utils.get_config()['DEFAULT'].get('excel_engine', 'auto')
+
+
+def _load_excel(excel_file: str, options: Dict, parse):
+    """
+    读取 excel, 配置 [DEFAULT] excel_cache 启用时使用 temp_path 中的缓存, 见 excel_utils.WorkbookCache
+
+    Args:
+        excel_file (str): excel 路径
+        options (Dict): 读取参数
+        parse (Callable): 读取 excel
+
+    Returns:
+        读取结果
+    """
+    _sect = common_utils.get_config()['DEFAULT']
+    temp_path = _sect.get('temp_path')
+    if not temp_path or not _sect.getboolean('excel_cache', True):
+        return parse()
+    cache = excel_utils.WorkbookCache(os.path.join(temp_path, 'excel_cache'))
+    res = cache.load(excel_file, {**options, 'engine': _excel_engine()}, parse)
+    logging.info(f'读取 {excel_file}: {"缓存" if cache.hits else "重新读取"}')
+    return res
 
 
 class FreezeLayer(Command):
@@ -445,88 +592,497 @@ class InsertSignatureAndPlot(Command):
         ly = doc.Layouts.Item('F09门窗表')
 
 
+class _SignatureTask:
+    """
+    修改一个文件的图签并打印
+
+    只保存配置数据, 可以被 pickle 后在 pool_utils.WorkerPool 的工作进程中执行
+    """
+
+    def __init__(self,
+                 *,
+                 plot=True,
+                 close=True,
+                 publish=False,
+                 plot_queue: PlotQueue = None,
+                 plot_cache: PlotCache = None,
+                 named_template: str = None,
+                 print_path: str = None,
+                 plot_device: str = '',
+                 plot_style: str = '',
+                 attr_map: AttrMapResolver = None) -> None:
+        self.plot = plot
+        self.close = close
+        # 发布模式只修改图签, 所有文件处理完成后由 ModifySignatureAndPlot 批量发布
+        self.publish = publish
+        # 后台打印队列, 见 plot_utils.PlotQueue
+        self.background = plot_queue is not None
+        self.plot_queue = plot_queue
+        # 为 True 时处理完一个文件后不等待打印完成, 由调用者在关闭文档前调用 plot_queue.drain
+        self.keep_plotting = False
+        # 为 True 时处理完一个文件后立即保存并关闭文档, 返回结果表示修改已保存;
+        # 并行处理时工作进程的实例崩溃后重新创建, 缓存中未保存的文档会丢失修改
+        self.save_each = False
+        # 打印缓存, 跳过未修改的图纸, 见 plot_utils.PlotCache
+        self.plot_cache = plot_cache
+        self.plot_device = plot_device
+        self.plot_style = plot_style
+        self.named_template = named_template
+        # 命名模板只解析一次
+        self.name_template = NameTemplate(named_template) if named_template else None
+        self.print_path = print_path
+        # 打印前生成的所有输出文件, key--(dwg 文件, 布局, 子项), 见 render_outputs
+        self.outputs: Dict[Tuple[str, str, str], str] = {}
+        # 获取图签属性与 excel 表头的映射, 按签名保存, 见 attr_map_utils
+        self.attr_map = attr_map or AttrMapResolver(AttrMapStore())
+        # 各图块与 excel 表头的映射, key--见 attr_key, 由第一个使用该图块的文档的图签属性生成;
+        # 并行处理时由主进程在启动工作进程前生成, 见 ModifySignatureAndPlot
+        self.attr_maps: Dict[Tuple[str, Tuple[str, ...]], Dict[str, str]] = {}
+        # 一图多用时各布局变体的属性写入次数
+        self.variant_reports: List[VariantReport] = []
+
+    def __call__(self, app, file: str, info_list: List[Dict]) -> List[SyncReport]:
+        """
+        Args:
+            app (AcadApplication): 应用实例
+            file (str): dwg 文件
+            info_list (List[Dict]): 该文件中各布局的图签信息
+
+        Returns:
+            List[SyncReport]: 每个图签的修改结果
+        """
+        # 打开文件
+        # 需要关闭时通过缓存打开, 超出缓存上限或运行结束(close_documents / quit_application)时保存并关闭
+        file = os.path.abspath(file)
+        cache = acad_utils.get_document_cache(app) if self.close else None
+        doc = cache.open(file) if cache else acad_utils.open_file(app, file)
+        reports = self.process(file, info_list, doc)
+        if cache is not None and self.save_each:
+            # 保存失败时抛出异常, 该文件记为失败
+            cache.close(file)
+        return reports
+
+    def process(self, file: str, info_list: List[Dict], doc) -> List[SyncReport]:
+        """
+        修改已打开文档的图签并打印, 用于 acad_utils.prefetch_pipeline
+
+        Args:
+            file (str): dwg 文件
+            info_list (List[Dict]): 该文件中各布局的图签信息
+            doc (AcadDocument): 文档
+
+        Returns:
+            List[SyncReport]: 每个图签的修改结果, 修改失败的布局为 error 不为空的结果
+        """
+        reports = []
+        # 文档的图块快照, 每个布局的图签只查询一次, 属性值与快照比较, 只有需要修改时才获取图块
+        snapshot = acad_utils.document_snapshot(doc)
+        # 按布局分组, 同一布局的多行为一图多用的变体, 见 variant_utils
+        for layout_name, variants in group_variants(info_list).items():
+            if layout_name is None: continue
+            values = [self._attr_values(doc, info) for info in variants]
+            order, variant_report = range(len(variants)), None
+            if len(variants) > 1:
+                # 从图签的当前值开始, 相邻变体差异最少的顺序, 每个变体只写入与上一个变体不同的属性
+                try:
+                    rows = snapshot.block_refs(layout_name, variants[0]['block_name'])
+                except Exception as e:
+                    logging.warning(e)
+                    rows = []
+                order, variant_report = plan_variants(file, layout_name, values,
+                                                      [normalize(i.get('sub_project')) for i in variants],
+                                                      start=rows[0].attributes if rows else None)
+            for n, i in enumerate(order):
+                info = variants[i]
+                if n > 0 and self.background:
+                    # 修改下一个变体前等待上一个变体打印完成
+                    self.plot_queue.drain()
+                logging.info(f'正在修改 {file} 文件的 {layout_name} 布局' +
+                             (f' ({info.get("sub_project")})' if variant_report else ''))
+                try:
+                    for row in snapshot.block_refs(layout_name, info['block_name']):
+                        # 只修改值不同的属性, 未对应 excel 列的属性清空
+                        report = sync_snapshot_row(row, values[i])
+                        reports.append(report)
+                        if variant_report is not None:
+                            variant_report.writes += report.writes
+                        logging.info(f'{file} 文件的 {layout_name} 布局图签 {report}')
+                    # 发布时只能发布文档的最终状态, 变体在修改后逐个打印
+                    if self.plot and (not self.publish or variant_report is not None):
+                        self._plot(doc, file, info)
+                except Exception as e:
+                    logging.warning(e)
+                    # 记录失败的布局, 该文件不记录到增量生成的依赖图中
+                    reports.append(SyncReport(error=f'{layout_name}: {e}'))
+            if variant_report is not None:
+                self.variant_reports.append(variant_report)
+                logging.info(variant_report.summary())
+
+        if self.background and not self.keep_plotting:
+            # 关闭文档前等待该文件的图纸打印完成
+            self.plot_queue.drain()
+
+        if self.publish and not self.close:
+            # 发布时读取 dwg 文件, 不关闭的文档需要先保存
+            doc.Save()
+        return reports
+
+    @staticmethod
+    def attr_key(info: Dict) -> Tuple[str, Tuple[str, ...]]:
+        """attr_maps 的键, (图块名称, excel 表头)"""
+        return info['block_name'], tuple(info.keys())
+
+    def _attr_values(self, doc, info: Dict) -> Dict[str, Any]:
+        """布局的图签属性值, 布局中的图签使用相同的属性值"""
+        key = self.attr_key(info)
+        attr_map = self.attr_maps.get(key)
+        if attr_map is None:
+            attr_map = self.attr_maps[key] = self.attr_map.resolve(
+                acad_utils.get_bloct_attr_tags(doc, info['block_name']), key[1])
+        return {k: info.get(v) for k, v in attr_map.items()}
+
+    def resolve_attr_maps(self, jobs: Dict[str, List[Dict]], app) -> None:
+        """
+        生成所有 (图块, excel 表头) 的映射, 并行处理前在主进程中调用; 需要确认时只在主进程中打开窗口,
+        映射只由主进程保存
+
+        Args:
+            jobs (Dict[str, List[Dict]]): key--dwg 文件, value--该文件中各布局的图签信息
+            app (AcadApplication | Callable[[], AcadApplication]): 属性名称未缓存时读取 dwg 文件的应用实例,
+                见 acad_utils.get_file_attr_tags
+        """
+        files: Dict[Tuple[str, Tuple[str, ...]], str] = {}
+        for file, info_list in jobs.items():
+            for info in info_list:
+                files.setdefault(self.attr_key(info), file)
+        tags: Dict[str, List[str]] = {}
+        for key, file in files.items():
+            if key in self.attr_maps:
+                continue
+            block_name, headers = key
+            if block_name not in tags:
+                tags[block_name] = acad_utils.get_file_attr_tags(app, file, block_name)
+            self.attr_maps[key] = self.attr_map.resolve(tags[block_name], headers)
+        # 工作进程只使用已生成的映射, 未生成时自动匹配, 不打开窗口也不保存
+        self.attr_map = AttrMapResolver(AttrMapStore(), AUTO)
+
+    def _plot(self, doc, file: str, info: Dict):
+        """打印一个布局, 后台打印时提交后返回"""
+        layout_name = info['layout']
+        print_file = self.print_file(file, info)
+        if not self._need_plot(file, info, print_file, bool(doc.Saved)):
+            logging.info(f'{file} 文件的 {layout_name} 布局未修改, 跳过打印')
+        elif self.background:
+            # 提交后台打印后继续修改下一个布局
+            self.plot_queue.submit(doc, layout_name, print_file)
+        elif not acad_utils.print_layout(doc, layout_name, print_file):
+            logging.warning(f'{file} 文件的 {layout_name} 布局打印失败')
+
+    def print_file(self, file: str, info: Dict) -> str:
+        """
+        根据模板获取打印文件名, 默认为 dwg 文件名_布局名
+
+        Args:
+            file (str): dwg 文件
+            info (Dict): 布局的图签信息
+
+        Returns:
+            str: 打印文件路径
+        """
+        print_file = self.outputs.get(self.output_key(file, info))
+        if print_file is not None:
+            return print_file
+        return os.path.join(self.print_path, self._print_names([(file, info)])[0])
+
+    @staticmethod
+    def output_key(file: str, info: Dict) -> Tuple[str, str, str]:
+        """outputs 的键, (dwg 文件绝对路径, 布局, 子项), 一图多用时同一布局的各子项输出到不同的文件"""
+        return os.path.abspath(file), info['layout'], info.get('sub_project', '')
+
+    def _print_names(self, rows: List[Tuple[str, Dict]]) -> List[str]:
+        if self.name_template is not None:
+            return self.name_template.render_all(info for _, info in rows)
+        return [os.path.splitext(os.path.basename(file))[0] + '_' + info['layout'] + '.pdf' for file, info in rows]
+
+    def render_outputs(self, jobs: Dict[str, List[Dict]]) -> Dict[Tuple[str, str, str], str]:
+        """
+        打印前生成所有布局的输出文件, 由 preflight_utils.preflight 检查是否重复后设置为 outputs
+
+        Args:
+            jobs (Dict[str, List[Dict]]): key--dwg 文件, value--该文件中各布局的图签信息
+
+        Returns:
+            Dict[Tuple[str, str, str], str]: key--见 output_key, value--输出文件
+        """
+        rows = [(file, info) for file, info_list in jobs.items() for info in info_list
+                if info.get('layout') is not None]
+        return {self.output_key(file, info): os.path.join(self.print_path, name)
+                for (file, info), name in zip(rows, self._print_names(rows))}
+
+    def _need_plot(self, file: str, info: Dict, print_file: str, unmodified: bool) -> bool:
+        """未使用打印缓存, 或打印缓存未命中且不是重复的输出文件时需要打印"""
+        if self.plot_cache is None:
+            return True
+        return self.plot_cache.check(os.path.abspath(file),
+                                     info['layout'],
+                                     info,
+                                     print_file,
+                                     device=self.plot_device,
+                                     style=self.plot_style,
+                                     unmodified=unmodified) == MISS
+
+    def sheets(self, jobs: Dict[str, List[Dict]]) -> List[SheetJob]:
+        """
+        所有需要发布的布局, 在文档保存后调用
+
+        Args:
+            jobs (Dict[str, List[Dict]]): key--dwg 文件, value--该文件中各布局的图签信息
+
+        Returns:
+            List[SheetJob]: 发布任务, 按子项分组
+        """
+        res = []
+        for file, info_list in jobs.items():
+            for layout, variants in group_variants(info_list).items():
+                # 变体在修改时已逐个打印
+                if layout is None or len(variants) > 1:
+                    continue
+                info = variants[0]
+                print_file = self.print_file(file, info)
+                if self._need_plot(file, info, print_file, True):
+                    res.append(SheetJob(os.path.abspath(file), info['layout'], print_file, info.get('sub_project', '')))
+        return res
+
+
 class ModifySignatureAndPlot(Command):
     """修改图签信息并打印"""
 
-    def __init__(self, *, plot=True, close=True, **kwargs) -> None:
+    def __init__(self,
+                 *,
+                 plot=True,
+                 close=True,
+                 workers: int = None,
+                 prefetch: int = None,
+                 attr_map: str = None,
+                 **kwargs) -> None:
         """
         修改图签信息并打印
 
         Args:
             plot (bool, optional): 修改信息同时打印图纸. Defaults to True.
             close (bool, optional): 修改完成后关闭文档. Defaults to True.
+            workers (int, optional): 并行处理的 AutoCAD 实例数量, 大于 1 时每个工作进程启动一个新的实例,
+                按文件分配任务. Defaults to None, 读取配置 [DEFAULT] workers.
+            prefetch (int, optional): 预先打开的文件数量, 大于 0 且 workers <= 1 时在后台实例中打开下一个文件,
+                与当前文件的修改和打印并行, 文档处理完成后保存并关闭. Defaults to None, 读取配置 [DEFAULT] prefetch.
+            attr_map (str, optional): 图签属性与 excel 表头的映射方式, prompt/auto/always, 见 attr_map_utils.
+                Defaults to None, 读取配置 [project] attr_map.
          """
         # 获取参数
         super().__init__(**kwargs)
-        self.__app = _get_acad_app()
-
-        self.__plot = plot
-        self.__close = close
+        _sect = common_utils.get_config()['DEFAULT']
+        if workers is None:
+            workers = _sect.getint('workers', 1)
+        if prefetch is None:
+            prefetch = _sect.getint('prefetch', 0)
+        self.__workers = workers
+        self.__prefetch = prefetch if workers <= 1 else 0
+        self.__app = acad_utils.get_application() if self.__workers <= 1 and self.__prefetch <= 0 else None
 
         # 项目配置
         _sect = common_utils.modify_project_config()
         self.__project_path = _sect.get('project_path')
         self.__excel_file = _sect.get('excel_file')
-
-        # 图签属性与 excel 表头映射关系
-        self.__attr_map: Dict[str, str] | None = None
+        # 检查出错误时: filter--跳过有错误的图纸, abort--不处理任何图纸
+        self.__preflight = _sect.get('preflight', 'filter')
+        # 打印前检查的结果
+        self.preflight_report: PreflightReport | None = None
+        # 图签属性映射按签名保存在 temp_path 中的 attr_map.json
+        temp_path = common_utils.get_config().defaults().get('temp_path')
+        _attr_map = AttrMapResolver(AttrMapStore(os.path.join(temp_path, 'attr_map.json') if temp_path else None),
+                                    attr_map or _sect.get('attr_map', 'prompt'))
+
+        # 每个图签的修改结果
+        self.reports: List[SyncReport] = []
+        # 并行处理时各文件的处理结果
+        self.pool_report: PoolReport | None = None
+        # 预先打开文件时各文件的处理结果
+        self.pipeline_report: PipelineReport | None = None
+        # 文档缓存的命中统计
+        self.cache_stats: DocumentCacheStats | None = None
+        # 批量发布的结果
+        self.publish_report: PublishReport | None = None
 
         # 获取打印配置
-        if self.__plot:
+        _kw = {}
+        # 发布配置, None 表示逐个布局打印
+        self.__publish_kw: Dict | None = None
+        if plot:
             _sect = common_utils.modify_plot_config()
-            self.__named_template = _sect.get('named_template')
-            self.__print_path = _sect.get('print_path')
+            _kw = {
+                'named_template': _sect.get('named_template'),
+                'print_path': _sect.get('print_path'),
+                'plot_device': _sect.get('plot_device', ''),
+                'plot_style': _sect.get('plot_style', '')
+            }
+            if _sect.getboolean('plot_cache', False) and workers <= 1:
+                # 打印缓存在运行结束时记录, 只在主进程中使用
+                temp_path = common_utils.get_config().defaults().get('temp_path')
+                _kw['plot_cache'] = PlotCache(os.path.join(temp_path, 'plot_cache.json') if temp_path else None)
+            if _sect.get('mode', 'plot') == 'publish':
+                # 所有文件修改完成后通过 DSD 批量发布, 每批执行一次 PUBLISH
+                _kw['publish'] = True
+                self.__publish_kw = {
+                    'dsd_path': common_utils.get_config().defaults().get('temp_path')
+                                or os.path.join(_sect.get('print_path'), 'dsd'),
+                    'multi_sheet': _sect.getboolean('multi_sheet', False),
+                    'batch_size': _sect.getint('batch_size', 0) or None
+                }
+            elif _sect.get('mode', 'plot') == 'background':
+                # 后台打印, 打印的同时修改下一个布局
+                _kw['plot_queue'] = PlotQueue(acad_utils.plot_layout_background,
+                                              max_in_flight=_sect.getint('max_in_flight', 1),
+                                              timeout=_sect.getfloat('plot_timeout', 300))
+        self.__task = _SignatureTask(plot=plot, close=close, attr_map=_attr_map, **_kw)
+        # 逐个文件处理且运行中不关闭文档时, 所有文件处理完成后再等待打印完成;
+        # 否则文档可能在打印完成前被关闭(文档缓存淘汰), 每个文件处理完成后等待
+        self.__task.keep_plotting = self.__workers <= 1 and self.__prefetch <= 0 and not close
+        # 并行处理时工作进程的结果在文档保存后返回, 主进程只记录已保存的文件
+        self.__task.save_each = self.__workers > 1
+        # 后台打印的结果
+        self.plot_report: PlotReport | None = None
+        # 打印缓存的命中结果
+        self.plot_cache_report: PlotCacheReport | None = None
+        # 增量生成时各文件是否需要重新生成
+        self.build_plan: Dict[str, Decision] | None = None
+        # 一图多用时各布局变体的属性写入次数, 并行处理时只记录在工作进程的日志中
+        self.variant_reports: List[VariantReport] = []
+
+    @staticmethod
+    def __build_target(file: str) -> str:
+        return f'signature:{os.path.abspath(file)}'
+
+    def __add_build_target(self, graph: BuildGraph, file: str, info_list: List[Dict]):
+        """添加一个文件的增量生成目标, 输入为各布局的图签信息、图框样式配置、打印配置和 dwg 文件, 输出为打印文件"""
+        inputs = {'dwg': graph.file_input(file), 'plot': self.__task.plot}
+        outputs = []
+        for info in info_list:
+            key = f'row:{info.get("layout")}'
+            while key in inputs:
+                key += '+'
+            inputs[key] = dict(info)
+            style_sect = f'border_style.{info.get("border_style")}'
+            inputs[f'config:{style_sect}'] = _config_input(style_sect)
+            if self.__task.plot and info.get('layout') is not None:
+                outputs.append(self.__task.print_file(file, info))
+        if self.__task.plot:
+            inputs['config:plot'] = _config_input('plot')
+        graph.add(self.__build_target(file), inputs, outputs=outputs)
 
     def execute(self):
         # 获取 excel 数据
         _data = _read_excel(self.__excel_file, check_na=['file', 'layout'])
-        # 遍历文件修改打印
+        jobs: Dict[str, List[Dict]] = {}
+        # 如果 file 不是文件则添加项目路径为根路径
+        found = existing_files(_data.keys()) if self.__project_path is not None else set()
         for file, info_list in _data.items():
-            # 根据图块模板添加图签图块名
-            for info in info_list:
-                info['block_name'] = common_utils.get_config(
-                )[f'border_style.{info["border_style"]}'].get('signature_block_name', 'signature')
-            # 如果 file 不是文件则添加项目路径为根路径
-            if self.__project_path is not None and not os.path.isfile(file):
+            if self.__project_path is not None and file not in found:
                 file = os.path.join(self.__project_path, file)
-            # 文件类型检查
-            if os.path.exists(file) and not file.endswith('.dwg'):
-                logging.warning(f'{file} 不是 .dwg 文件')
-                continue
-            # 打开文件，遍历图签信息
-            doc = acad_utils.open_file(self.__app, os.path.abspath(file))
-            for info in info_list:
-                if self.__attr_map is None:
-                    self.__attr_map = common_utils.make_dwg_excel_attr_map(
-                        acad_utils.get_bloct_attr_tags(doc, info['block_name']), list(info.keys()))
-
-                layout_name: str = info.get('layout', None)
-                if layout_name is None: continue
-                logging.info(f'正在修改 {file} 文件的 {layout_name} 布局')
-                try:
-                    ly = doc.Layouts.Item(layout_name)
-                    for b in acad_utils.get_block_ref_from_layout(ly, info['block_name']):
-                        dic = deepcopy(self.__attr_map)
-                        for k, v in self.__attr_map.items():
-                            dic[k] = info.get(v)
-                        acad_utils.modify_block_attr(b)
-                        acad_utils.modify_block_attr(b, dic)
-                    if self.__plot:
-                        # 根据模板获取打印文件名, 默认为布局名
-                        print_file: str = self.__named_template
-                        if print_file is None:
-                            name, _ = os.path.splitext(os.path.basename(file))[0]
-                            print_file = name + '_' + layout_name + '.pdf'
-                        else:
-                            for k, v in info.items():
-                                print_file = print_file.replace(f'<{k}>', v)
-                        print_file = os.path.join(self.__print_path, print_file)
-                        if not acad_utils.print_layout(doc, layout_name, print_file):
-                            logging.warning(f'{file} 文件的 {layout_name} 布局打印失败')
-                except Exception as e:
-                    logging.warning(e)
-
-            if self.__close:
-                doc.Close(True)
-
+            jobs.setdefault(file, []).extend(info_list)
 
+        # 启动 AutoCAD 处理前检查所有图纸: 文件、图框样式、重复的布局、重复的输出文件
+        conf = common_utils.get_config()
+        styles = [s[len('border_style.'):] for s in conf.sections() if s.startswith('border_style.')]
+        outputs = self.__task.render_outputs(jobs) if self.__task.plot else None
+        self.preflight_report, jobs = preflight(jobs, styles=styles, outputs=outputs)
+        if self.preflight_report.ok:
+            logging.info(self.preflight_report.summary())
+        else:
+            logging.error(self.preflight_report.summary())
+            if self.__preflight == 'abort':
+                raise ValueError(self.preflight_report.summary())
+        if outputs is not None:
+            self.__task.outputs = outputs
+
+        # 根据图块模板添加图签图块名
+        for info_list in jobs.values():
+            for info in info_list:
+                info['block_name'] = conf[f'border_style.{info["border_style"]}'].get('signature_block_name',
+                                                                                      'signature')
+
+        # 增量生成: 跳过输入未变化且打印文件存在的文件
+        graph = _build_graph()
+        if graph is not None:
+            for file, info_list in jobs.items():
+                self.__add_build_target(graph, file, info_list)
+            self.build_plan = _plan_build(graph)
+            jobs = {f: v for f, v in jobs.items() if self.build_plan[self.__build_target(f)].rebuild}
+
+        done: List[str] = []
+        if self.__workers > 1:
+            # 工作进程不确认映射: 主进程生成所有映射后传递给工作进程
+            self.__task.resolve_attr_maps(jobs, acad_utils.get_application)
+            # 每个工作进程启动一个 AutoCAD 实例, 按文件分配
+            pool = WorkerPool(self.__workers,
+                              acad_utils.new_application,
+                              self.__task,
+                              close_app=acad_utils.quit_application)
+            self.pool_report = pool.run(jobs)
+            for r in self.pool_report.succeeded:
+                self.reports.extend(r.result)
+                if not any(rep.failed for rep in r.result):
+                    done.append(r.file)
+            logging.info(self.pool_report.summary())
+        elif self.__prefetch > 0:
+            # 打开下一个文件与修改打印当前文件并行
+            pipeline = acad_utils.prefetch_pipeline(self.__task.process,
+                                                    depth=self.__prefetch,
+                                                    instances=self.__prefetch + 1)
+            self.pipeline_report = pipeline.run(jobs)
+            for r in self.pipeline_report.succeeded:
+                self.reports.extend(r.result)
+                if not any(rep.failed for rep in r.result):
+                    done.append(r.file)
+            logging.info(self.pipeline_report.summary())
+        else:
+            # 遍历文件修改打印
+            try:
+                for file, info_list in jobs.items():
+                    result = self.__task(self.__app, file, info_list)
+                    self.reports.extend(result)
+                    if not any(rep.failed for rep in result):
+                        done.append(file)
+            finally:
+                if self.__task.background:
+                    self.plot_report = self.__task.plot_queue.drain()
+                    logging.info(self.plot_report.summary())
+                if self.__task.close:
+                    # 保存失败时抛出异常, 不记录任何文件
+                    self.cache_stats = acad_utils.close_documents(self.__app)
+            if self.__task.close:
+                # 文档在关闭时保存, 只记录已保存的文件(例如在 AutoCAD 界面中关闭的文档未保存)
+                done = [f for f in done if self.cache_stats.is_saved(f)]
+
+        self.variant_reports = self.__task.variant_reports
+        if self.variant_reports:
+            logging.info(f'一图多用 {len(self.variant_reports)} 个布局, 属性写入: '
+                         f'全部重写 {sum(r.full_writes for r in self.variant_reports)}, '
+                         f'排序后 {sum(r.planned_writes for r in self.variant_reports)}, '
+                         f'实际 {sum(r.writes for r in self.variant_reports)}')
+
+        if self.__publish_kw is not None:
+            app = self.__app or acad_utils.get_application()
+            publisher = Publisher(acad_utils.publish_executor(app), **self.__publish_kw)
+            self.publish_report = publisher.publish(self.__task.sheets(jobs))
+            logging.info(self.publish_report.summary())
+
+        if self.__task.plot_cache is not None:
+            # 文档已保存且打印已完成, 记录本次打印的图纸
+            self.plot_cache_report = self.__task.plot_cache.commit()
+            logging.info(self.plot_cache_report.summary())
+
+        if graph is not None and (self.__task.close or self.__task.publish):
+            # 只记录已保存的 dwg 文件: 并行处理的结果在保存后返回, 预先打开时处理完成后保存并关闭,
+            # 发布时不关闭的文档在处理完成后保存; 不关闭的文档未保存、有布局修改失败的文件, 下一次运行时重新生成
+            graph.record(*[self.__build_target(f) for f in done])
+            graph.save()
@@ -0,0 +1,366 @@
+"""
+已打开文档索引
+
+DocumentRegistry 按规范化的 Windows 路径(绝对路径、统一分隔符、忽略大小写)保存应用实例中已打开的文档,
+打开文件时直接查找索引, 不再遍历 Documents 并逐个读取 FullName 和 ReadOnly
+
+索引在第一次使用时遍历一次 Documents 建立, 之后由 open / close / register 维护;
+命中时读取一次 FullName 验证文档仍然打开, 未命中时比较 Documents.Count, 数量不一致
+(在 AutoCAD 界面中打开或关闭了文档)时重新建立索引
+
+DocumentCache 在索引之上保留最近使用的文档, 延迟到超出上限或运行结束时再保存并关闭;
+只有 stats.saved 中的文件已经保存, 保存或关闭失败时抛出异常
+"""
+from __future__ import annotations
+
+import collections
+import logging
+import ntpath
+import os
+from dataclasses import dataclass, field
+from typing import *
+
+if TYPE_CHECKING:
+    from lib.acad_typing.acadApplication import *
+    from lib.acad_typing.acadDocuments import *
+
+
+def normalize_path(path: str) -> str:
+    """
+    规范化 Windows 路径, 用作文档索引的键
+
+    Args:
+        path (str): 文件路径
+
+    Returns:
+        str: 绝对路径, 分隔符为 \\, 忽略大小写
+    """
+    if not ntpath.isabs(path):
+        path = os.path.abspath(path)
+    return ntpath.normpath(path).casefold()
+
+
+@dataclass
+class _Entry:
+    doc: Any
+    read_only: bool
+
+
+class DocumentRegistry:
+    """一个应用实例的已打开文档索引"""
+
+    def __init__(self, app: AcadApplication = None, on_close: Callable[[AcadDocument], Any] = None):
+        """
+        Args:
+            app (AcadApplication, optional): 应用实例. Defaults to None.
+            on_close (Callable[[AcadDocument], Any], optional): 关闭文档前调用, 用于清除按文件路径缓存的该文档的数据.
+                Defaults to None.
+        """
+        self.app = app
+        self.on_close = on_close
+        self._entries: Dict[str, _Entry] | None = None
+        """key--规范化路径, value--文档, None 表示尚未建立索引"""
+        self._count = 0
+        """索引对应的 Documents.Count, 包括未保存的新文档"""
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def __len__(self):
+        return len(self._entries or ())
+
+    def rebuild(self):
+        """遍历 Documents 重新建立索引"""
+        self._entries = {}
+        self._count = 0
+        self.rebuilds += 1
+        for doc in self.app.Documents:
+            self._count += 1
+            full_name = doc.FullName
+            if full_name:  # 未保存的新文档没有路径
+                self._entries[normalize_path(full_name)] = _Entry(doc, bool(doc.ReadOnly))
+
+    def _ensure(self):
+        if self._entries is None:
+            self.rebuild()
+
+    def _alive(self, key: str, entry: _Entry) -> bool:
+        """文档仍然打开且路径未改变(另存为)"""
+        try:
+            return normalize_path(entry.doc.FullName) == key
+        except Exception:
+            return False
+
+    def find(self, file: str, writable: bool = True) -> AcadDocument | None:
+        """
+        查找已打开的文档
+
+        Args:
+            file (str): 文件路径
+            writable (bool, optional): 只查找非只读打开的文档. Defaults to True.
+
+        Returns:
+            AcadDocument | None: 文档, 未打开时返回 None
+        """
+        self._ensure()
+        key = normalize_path(file)
+        entry = self._entries.get(key)
+        if entry is not None and not self._alive(key, entry):
+            # 文档已在 AutoCAD 界面中关闭、另存为或应用实例已重启
+            self.rebuild()
+            entry = self._entries.get(key)
+        elif entry is None and self.app.Documents.Count != self._count:
+            # 在 AutoCAD 界面中打开或关闭了文档
+            self.rebuild()
+            entry = self._entries.get(key)
+        if entry is None or (writable and entry.read_only):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.doc
+
+    def register(self, doc: AcadDocument, file: str = None, read_only: bool = False):
+        """
+        添加文档到索引
+
+        Args:
+            doc (AcadDocument): 文档
+            file (str, optional): 文件路径. Defaults to None, 读取 doc.FullName.
+            read_only (bool, optional): 是否只读打开. Defaults to False.
+        """
+        self._ensure()
+        file = file or doc.FullName
+        if file:
+            key = normalize_path(file)
+            if key not in self._entries:
+                self._count += 1
+            self._entries[key] = _Entry(doc, read_only)
+
+    def unregister(self, doc: AcadDocument | str) -> bool:
+        """
+        从索引中移除文档
+
+        Args:
+            doc (AcadDocument | str): 文档或文件路径
+
+        Returns:
+            bool: 文档是否在索引中
+        """
+        if self._entries is None:
+            return False
+        if isinstance(doc, str):
+            return self._entries.pop(normalize_path(doc), None) is not None
+        keys = [k for k, e in self._entries.items() if e.doc is doc]
+        if not keys:
+            try:
+                keys = [normalize_path(doc.FullName)]
+            except Exception:
+                ...
+        return any([self._entries.pop(key, None) is not None for key in keys])
+
+    def open(self, file: str) -> AcadDocument:
+        """
+        打开文件, 已打开时激活并返回该文档
+
+        Args:
+            file (str): 文件路径
+
+        Returns:
+            AcadDocument: 文档
+        """
+        file = os.path.abspath(file) if not ntpath.isabs(file) else file
+        doc = self.find(file)
+        if doc is not None:
+            doc.Activate()
+            return doc
+        doc = self.app.Documents.Open(file)
+        self.register(doc, file)
+        return doc
+
+    def close(self, doc: AcadDocument, save: bool = False):
+        """
+        关闭文档并从索引中移除
+
+        Args:
+            doc (AcadDocument): 文档
+            save (bool, optional): 是否保存. Defaults to False.
+        """
+        if self.on_close is not None:
+            self.on_close(doc)
+        if self.unregister(doc):
+            # 只有索引中的文档计入 _count 的变化, 未登记的文档关闭后由 find 比较 Documents.Count 重新建立索引
+            self._count -= 1
+        try:
+            doc.Close(save)
+        except Exception as e:
+            logging.warning(f'关闭文档失败: {e}')
+            raise
+
+    def report(self) -> Dict[str, int]:
+        return {'documents': len(self), 'hits': self.hits, 'misses': self.misses, 'rebuilds': self.rebuilds}
+
+
+@dataclass
+class DocumentCacheStats:
+    """一次运行中 DocumentCache 的统计"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    closed: int = 0
+    saved: List[str] = field(default_factory=list)
+    """已保存并关闭的文件, 规范化路径"""
+    failed: Dict[str, str] = field(default_factory=dict)
+    """保存或关闭失败的文件, key--规范化路径, value--错误信息"""
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def is_saved(self, file: str) -> bool:
+        """文件是否已保存并关闭"""
+        return normalize_path(file) in self.saved
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'closed': self.closed,
+                'hit_rate': round(self.hit_rate, 3)}
+
+
+class DocumentCache:
+    """
+    最近使用的已打开文档
+
+    打开文件后不立即关闭, 保留最近使用的 size 个文档, 同一文件再次使用时不需要重新打开;
+    超过数量或内存上限时保存并关闭最久未使用的文档, 运行结束时调用 close_all 保存并关闭所有文档;
+    文档在关闭时才保存, 处理完成的文件需要在 stats.saved 中才表示修改已写入文件
+
+    文档占用的内存按 DWG 文件大小估算
+    """
+
+    def __init__(self,
+                 registry: DocumentRegistry,
+                 size: int = 4,
+                 max_memory: float = None,
+                 save: bool = True,
+                 sizeof: Callable[[str], int] = None):
+        """
+        Args:
+            registry (DocumentRegistry): 应用实例的已打开文档索引
+            size (int, optional): 最多保留的文档数量. Defaults to 4.
+            max_memory (float, optional): 保留文档的估算内存上限(MB), None 表示不限制. Defaults to None.
+            save (bool, optional): 关闭文档时是否保存. Defaults to True.
+            sizeof (Callable[[str], int], optional): 估算文档占用的内存(字节). Defaults to 文件大小.
+        """
+        self.registry = registry
+        self.size = max(1, size)
+        self.max_memory = max_memory
+        self.save = save
+        self.sizeof = sizeof or self._file_size
+        self._docs: collections.OrderedDict[str, Tuple[Any, int]] = collections.OrderedDict()
+        """key--规范化路径, value--(文档, 估算内存), 按使用顺序排列"""
+        self.stats = DocumentCacheStats()
+
+    @staticmethod
+    def _file_size(file: str) -> int:
+        try:
+            return os.path.getsize(file)
+        except OSError:
+            return 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, file: str):
+        return normalize_path(file) in self._docs
+
+    @property
+    def memory(self) -> float:
+        """保留文档的估算内存(MB)"""
+        return sum(n for _, n in self._docs.values()) / 1024 / 1024
+
+    def open(self, file: str) -> AcadDocument:
+        """
+        打开文件, 文件在缓存中时直接激活
+
+        Args:
+            file (str): 文件路径
+
+        Returns:
+            AcadDocument: 文档
+        """
+        key = normalize_path(file)
+        cached = self._docs.get(key)
+        doc = self.registry.open(file)
+        if cached is not None and cached[0] is doc:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+            self._docs[key] = (doc, self.sizeof(file))
+        self._docs.move_to_end(key)
+        self._evict(keep=key)
+        return doc
+
+    def _over_limit(self) -> bool:
+        if len(self._docs) > self.size:
+            return True
+        return self.max_memory is not None and len(self._docs) > 1 and self.memory > self.max_memory
+
+    def _evict(self, keep: str):
+        """关闭最久未使用的文档, 直到不超过数量和内存上限, 不关闭 keep"""
+        while self._over_limit():
+            key = next(iter(self._docs))
+            if key == keep:
+                break
+            self.stats.evictions += 1
+            self._close(key)
+
+    def _close(self, key: str):
+        doc, _ = self._docs.pop(key)
+        try:
+            self.registry.close(doc, self.save)
+        except Exception as e:
+            # 修改未保存, 调用者不能将该文件记录为已完成
+            self.stats.failed[key] = str(e)
+            logging.error(f'关闭文档失败 {key}: {e}')
+            raise
+        self.stats.closed += 1
+        if self.save:
+            self.stats.saved.append(key)
+
+    def close(self, file: str):
+        """
+        保存并关闭指定文件
+
+        Raises:
+            Exception: 保存或关闭失败
+        """
+        key = normalize_path(file)
+        if key in self._docs:
+            self._close(key)
+
+    def close_all(self):
+        """
+        保存并关闭所有文档, 在运行结束时调用
+
+        Raises:
+            Exception: 保存或关闭失败, 其他文档仍然保存并关闭, 抛出第一个异常
+        """
+        errors = []
+        for key in list(self._docs):
+            try:
+                self._close(key)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def reset_stats(self) -> DocumentCacheStats:
+        """开始新的一次运行, 返回上一次运行的统计"""
+        stats, self.stats = self.stats, DocumentCacheStats()
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_all()
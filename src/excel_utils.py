@@ -0,0 +1,328 @@
+"""
+读取 excel
+
+pandas.read_excel 先读取所有工作表的所有列, to_dict 再为每一行创建字典; 这里逐行读取工作表,
+只保留需要的列, 按工作表返回逐行生成的记录
+
+读取引擎可替换, 引擎为返回 (工作表名称, 行迭代器) 的函数, 每一行为单元格值的元组:
+    - openpyxl: 只读模式流式读取
+    - calamine: 安装 python-calamine 时可用, 速度更快
+默认使用已安装的最快引擎
+
+与 pandas.read_excel(dtype=str) 的结果一致: 首行为表头, 空单元格和 pandas 默认的缺失值字符串为 NaN,
+整数值的浮点数转换为整数后转为字符串, 重复的表头添加 .1 .2 后缀, 空表头为 Unnamed: 列序号,
+末尾的空行不返回
+
+WorkbookCache 将读取并整理后的结果保存到临时文件夹, excel 文件和读取参数未变化时直接加载
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import logging
+import math
+import os
+import pickle
+from typing import *
+
+from .plot_utils import file_digest
+
+Rows = Iterable[Sequence[Any]]
+Engine = Callable[[str], Iterator[Tuple[str, Rows]]]
+
+NA = math.nan
+"""缺失值, 与 pandas 相同"""
+
+NA_VALUES = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+    'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'
+})
+"""识别为缺失值的字符串, 与 pandas 默认的 na_values 相同"""
+
+
+def _openpyxl_engine(file: str) -> Iterator[Tuple[str, Rows]]:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            yield ws.title, ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _calamine_engine(file: str) -> Iterator[Tuple[str, Rows]]:
+    from python_calamine import CalamineWorkbook
+
+    wb = CalamineWorkbook.from_path(file)
+    for name in wb.sheet_names:
+        yield name, wb.get_sheet_by_name(name).to_python(skip_empty_area=False)
+
+
+_ENGINES: Dict[str, Tuple[str, Engine]] = {
+    'calamine': ('python_calamine', _calamine_engine),
+    'openpyxl': ('openpyxl', _openpyxl_engine),
+}
+"""key--引擎名称, value--(依赖的模块, 引擎), 按速度排序"""
+
+
+def register_engine(name: str, engine: Engine, module: str = None):
+    """
+    注册读取引擎
+
+    Args:
+        name (str): 引擎名称
+        engine (Engine): 返回 (工作表名称, 行迭代器) 的函数
+        module (str, optional): 引擎依赖的模块, 未安装时不可用. Defaults to None.
+    """
+    _ENGINES[name] = (module, engine)
+
+
+def available_engines() -> List[str]:
+    """已安装依赖的引擎, 按速度排序"""
+    return [k for k, (module, _) in _ENGINES.items() if module is None or importlib.util.find_spec(module)]
+
+
+def get_engine(name: str = None) -> Engine:
+    """
+    获取读取引擎
+
+    Args:
+        name (str, optional): 引擎名称, None 或 'auto' 表示已安装的最快引擎. Defaults to None.
+
+    Raises:
+        ValueError: 引擎不存在或未安装依赖
+
+    Returns:
+        Engine: 引擎
+    """
+    if name in (None, '', 'auto'):
+        engines = available_engines()
+        if not engines:
+            raise ValueError(f'没有可用的 excel 读取引擎, 需要安装 {" 或 ".join(m for m, _ in _ENGINES.values())}')
+        name = engines[0]
+    if name not in _ENGINES:
+        raise ValueError(f'excel 读取引擎 {name} 不存在')
+    if name not in available_engines():
+        raise ValueError(f'excel 读取引擎 {name} 需要安装 {_ENGINES[name][0]}')
+    return _ENGINES[name][1]
+
+
+def _header(row: Sequence[Any], lower: bool) -> List[Tuple[int, str]]:
+    """表头 (列序号, 列名), 不含末尾的空表头"""
+    row = list(row)
+    while row and _is_na(row[-1]):
+        row.pop()
+    res, seen = [], {}
+    for i, v in enumerate(row):
+        name = f'Unnamed: {i}' if _is_na(v) else str(_convert(v, None))
+        if lower:
+            name = name.lower()
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f'{base}.{seen[base]}'
+        seen[name] = 0
+        res.append((i, name))
+    return res
+
+
+def _is_na(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value in NA_VALUES) or (
+            isinstance(value, float) and math.isnan(value))
+
+
+def _convert(value: Any, dtype: Callable[[Any], Any] | None) -> Any:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return value if dtype is None else dtype(value)
+
+
+def _records(sheet: str,
+             rows: Rows,
+             columns: Iterable[str] | None,
+             required: Iterable[str],
+             how: str,
+             dtype: Callable[[Any], Any] | None,
+             lower: bool) -> Iterator[Dict[str, Any]]:
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    names = _header(header, lower)
+    key = str.lower if lower else str
+    required = [key(c) for c in required]
+    if columns is not None:
+        wanted = {key(c) for c in columns} | set(required)
+        names = [(i, name) for i, name in names if name in wanted]
+    check = [name for _, name in names if name in required]
+    if len(check) < len(required):
+        logging.warning(f'工作表 {sheet} 缺少列 {", ".join(c for c in required if c not in check)}')
+        if how == 'any':
+            # 所有行都缺失该列的值
+            return
+    blank = 0
+    for row in rows:
+        n = len(row)
+        record = {}
+        empty = True
+        for i, name in names:
+            v = row[i] if i < n else None
+            if _is_na(v):
+                record[name] = NA
+            else:
+                record[name] = _convert(v, dtype)
+                empty = False
+        if empty:
+            # 空行在后面有数据时才返回
+            blank += 1
+            continue
+        if blank:
+            if not check:
+                for _ in range(blank):
+                    yield dict.fromkeys(record, NA)
+            blank = 0
+        if check:
+            missing = [_is_na(record[c]) for c in check]
+            if (any(missing) if how == 'any' else all(missing)):
+                continue
+        yield record
+
+
+def read_sheets(file: str,
+                *,
+                columns: Iterable[str] = None,
+                required: Iterable[str] = (),
+                how: str = 'any',
+                dtype: Callable[[Any], Any] | None = str,
+                lower: bool = False,
+                engine: str = None) -> Iterator[Tuple[str, Iterator[Dict[str, Any]]]]:
+    """
+    逐个工作表读取 excel, 每个工作表的记录逐行生成, 读取下一个工作表前需要读取完当前工作表的记录
+
+    Args:
+        file (str): excel 文件
+        columns (Iterable[str], optional): 需要的列, None 表示所有列. Defaults to None.
+        required (Iterable[str], optional): 检查非空的列, 同 pandas.DataFrame.dropna 的 subset. Defaults to ().
+        how (str, optional): 'any'--任一检查的列为空时跳过该行, 'all'--全部为空时跳过. Defaults to 'any'.
+        dtype (Callable[[Any], Any] | None, optional): 非空单元格值的类型转换, None 表示保留原始值. Defaults to str.
+        lower (bool, optional): 列名转为小写, columns 和 required 忽略大小写. Defaults to False.
+        engine (str, optional): 读取引擎, 见 get_engine. Defaults to None.
+
+    Returns:
+        Iterator[Tuple[str, Iterator[Dict[str, Any]]]]: (工作表名称, 记录), 记录的键为列名
+    """
+    for name, rows in get_engine(engine)(file):
+        yield name, _records(name, rows, columns, required, how, dtype, lower)
+
+
+def read_records(file: str, **kwargs) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    按顺序读取所有工作表的记录, 参数见 read_sheets
+
+    Returns:
+        Iterator[Tuple[str, Dict[str, Any]]]: (工作表名称, 记录)
+    """
+    for name, records in read_sheets(file, **kwargs):
+        for record in records:
+            yield name, record
+
+
+def group_records(records: Iterable[Tuple[str, Dict[str, Any]]],
+                  key: str,
+                  sheet_key: str = None) -> Dict[Any, List[Dict[str, Any]]]:
+    """
+    按列的值分组
+
+    Args:
+        records (Iterable[Tuple[str, Dict[str, Any]]]): read_records 的结果
+        key (str): 分组的列
+        sheet_key (str, optional): 将工作表名称添加到记录中的键, None 表示不添加. Defaults to None.
+
+    Returns:
+        Dict[Any, List[Dict[str, Any]]]: key--列的值, value--记录, 按出现顺序排列
+    """
+    res: Dict[Any, List[Dict[str, Any]]] = {}
+    for sheet, record in records:
+        if sheet_key is not None:
+            record[sheet_key] = sheet
+        res.setdefault(record.get(key), []).append(record)
+    return res
+
+
+class WorkbookCache:
+    """
+    读取结果缓存
+
+    每个 excel 文件和读取参数保存一个 pickle 文件, 记录 excel 文件的大小、修改时间和 sha256;
+    大小和修改时间未变化时直接加载, 变化时比较 sha256, 内容未变化时更新记录后加载, 否则重新读取
+    """
+    VERSION = 2
+    """缓存格式版本, 读取结果的格式变化时修改"""
+
+    def __init__(self, path: str, *, digest: Callable[[str], str | None] = file_digest):
+        """
+        Args:
+            path (str): 缓存文件夹
+            digest (Callable[[str], str | None], optional): 文件内容的指纹. Defaults to file_digest.
+        """
+        self.path = path
+        self.digest = digest
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, file: str, options: Dict[str, Any]) -> str:
+        key = repr((os.path.normcase(os.path.abspath(file)), sorted(options.items())))
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pickle')
+
+    def _read(self, cache_file: str) -> Dict[str, Any] | None:
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with open(cache_file, 'rb') as f:
+                entry = pickle.load(f)
+        except Exception as e:
+            logging.warning(f'读取 excel 缓存失败: {e}')
+            return None
+        return entry if isinstance(entry, dict) and entry.get('version') == self.VERSION else None
+
+    def _write(self, cache_file: str, entry: Dict[str, Any]):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = cache_file + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+
+    def load(self, file: str, options: Dict[str, Any], parse: Callable[[], Any]) -> Any:
+        """
+        加载读取结果, 缓存无效时调用 parse 读取并保存
+
+        Args:
+            file (str): excel 文件
+            options (Dict[str, Any]): 读取参数, 参数不同的结果分别缓存
+            parse (Callable[[], Any]): 读取 excel, 结果必须可以 pickle
+
+        Returns:
+            Any: 读取结果, 每次加载返回新的对象, 修改结果不影响缓存
+        """
+        st = os.stat(file)
+        stat = (st.st_size, st.st_mtime_ns)
+        cache_file = self._file(file, options)
+        entry = self._read(cache_file)
+        if entry is not None and entry['options'] == options:
+            if entry['stat'] == stat:
+                self.hits += 1
+                return entry['data']
+            if entry['digest'] == self.digest(file):
+                # 文件内容未变化(例如只保存了一次), 更新记录
+                entry['stat'] = stat
+                self._write(cache_file, entry)
+                self.hits += 1
+                return entry['data']
+        self.misses += 1
+        digest = self.digest(file)
+        data = parse()
+        entry = {'version': self.VERSION, 'stat': stat, 'digest': digest, 'options': options, 'data': data}
+        # 写入缓存后再返回, 调用者修改结果不影响缓存
+        self._write(cache_file, entry)
+        return data
@@ -0,0 +1,149 @@
+"""
+输出文件命名
+
+named_template 中 <列名> 替换为图签信息中该列的值, 例如 <number>_<name>_<sub_project>.pdf
+
+NameTemplate 只解析一次模板, 生成文本和列名交替的片段, 渲染时按片段拼接;
+替换的值去除文件名中不能使用的字符, 缺失值(空单元格、NaN、不存在的列)替换为空字符串
+
+find_collisions 在打印前检查不同图纸的输出文件是否相同
+"""
+from __future__ import annotations
+
+import ntpath
+import re
+from typing import *
+
+from .attr_utils import normalize
+
+_FIELD = re.compile(r'<([^<>]+)>')
+_INVALID = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+_RESERVED = {'CON', 'PRN', 'AUX', 'NUL', *(f'COM{i}' for i in range(1, 10)), *(f'LPT{i}' for i in range(1, 10))}
+_MISSING = object()
+
+
+def sanitize(value: Any, replace: str = '_') -> str:
+    """
+    值转换为可以用于文件名的字符串
+
+    Args:
+        value (Any): 值, None 和 NaN 转换为空字符串
+        replace (str, optional): 替换文件名中不能使用的字符. Defaults to '_'.
+
+    Returns:
+        str: 文件名片段
+    """
+    return _INVALID.sub(replace, normalize(value).strip())
+
+
+def _safe_name(path: str) -> str:
+    """去除文件名末尾的空格和点, Windows 保留的设备名前添加 _"""
+    _dir, name = ntpath.split(path)
+    stem, ext = ntpath.splitext(name)
+    stem = stem.rstrip(' .')
+    if stem.upper() in _RESERVED:
+        stem = '_' + stem
+    return ntpath.join(_dir, stem + ext) if _dir else stem + ext
+
+
+class NameTemplate:
+    """编译后的命名模板"""
+
+    def __init__(self, template: str, replace: str = '_'):
+        """
+        Args:
+            template (str): 模板, <列名> 为替换的列, 列名区分大小写, 不存在时使用小写的列名
+            replace (str, optional): 替换值中文件名不能使用的字符. Defaults to '_'.
+        """
+        self.template = template
+        self.replace = replace
+        self._parts: List[Tuple[bool, str, str]] = []
+        """片段 (是否为列, 文本或列名, 小写列名)"""
+        pos = 0
+        for m in _FIELD.finditer(template):
+            if m.start() > pos:
+                self._parts.append((False, template[pos:m.start()], ''))
+            self._parts.append((True, m.group(1), m.group(1).lower()))
+            pos = m.end()
+        if pos < len(template):
+            self._parts.append((False, template[pos:], ''))
+
+    @property
+    def fields(self) -> List[str]:
+        """模板中的列名"""
+        return [text for is_field, text, _ in self._parts if is_field]
+
+    def __repr__(self):
+        return f'NameTemplate({self.template!r})'
+
+    def _value(self, row: Mapping, field: str, lower: str) -> Any:
+        v = row.get(field, _MISSING)
+        if v is _MISSING:
+            v = row.get(lower)
+        return v
+
+    def render(self, row: Mapping) -> str:
+        """
+        渲染一行
+
+        Args:
+            row (Mapping): 图签信息
+
+        Returns:
+            str: 文件名
+        """
+        return _safe_name(''.join(sanitize(self._value(row, text, lower), self.replace) if is_field else text
+                                  for is_field, text, lower in self._parts))
+
+    def render_all(self, rows: Iterable[Mapping]) -> List[str]:
+        """
+        渲染所有行, 相同的值只转换一次
+
+        Args:
+            rows (Iterable[Mapping]): 图签信息
+
+        Returns:
+            List[str]: 文件名, 与 rows 的顺序相同
+        """
+        memo: Dict[Tuple[type, Any], str] = {}
+        parts = self._parts
+        res = []
+        for row in rows:
+            out = []
+            for is_field, text, lower in parts:
+                if not is_field:
+                    out.append(text)
+                    continue
+                v = self._value(row, text, lower)
+                # 1 和 True 的哈希相同, 按类型区分
+                key = (v.__class__, v)
+                try:
+                    s = memo.get(key)
+                except TypeError:
+                    key, s = None, None
+                if s is None:
+                    s = sanitize(v, self.replace)
+                    if key is not None:
+                        memo[key] = s
+                out.append(s)
+            res.append(_safe_name(''.join(out)))
+        return res
+
+
+def find_collisions(outputs: Mapping[Hashable, str]) -> Dict[str, List[Hashable]]:
+    """
+    查找输出到同一文件的不同图纸
+
+    Args:
+        outputs (Mapping[Hashable, str]): key--图纸, 例如 (dwg 文件, 布局), value--输出文件
+
+    Returns:
+        Dict[str, List[Hashable]]: key--输出文件, value--输出到该文件的图纸; 没有重复时为空
+    """
+    seen: Dict[str, List[Hashable]] = {}
+    names: Dict[str, str] = {}
+    for key, output in outputs.items():
+        norm = ntpath.normcase(ntpath.normpath(output))
+        names.setdefault(norm, output)
+        seen.setdefault(norm, []).append(key)
+    return {names[k]: v for k, v in seen.items() if len(v) > 1}
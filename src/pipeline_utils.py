@@ -0,0 +1,251 @@
+"""
+预先打开文档的流水线
+
+PrefetchPipeline 将文件的处理分为两个阶段: 打开线程依次打开文件(open_stage), 主线程处理已打开的文档(process_stage).
+主线程修改和打印当前文档时, 打开线程同时打开下一个文件, 打开文档的耗时与处理耗时重叠
+
+已打开未处理(不包括正在处理)的文档数量不超过 depth, 达到上限时打开线程等待主线程取出文档(背压);
+调用 cancel 后打开线程不再打开新文件, 已打开未处理的文档交给 discard 处理, 未处理的文件记录到报告中
+
+打开线程创建的资源(例如 COM 初始化和后台应用实例)在 thread_init 中创建, 在主线程处理完所有文档后由 thread_exit
+在打开线程中释放; open_stage 的返回值在主线程中经过 receive 转换后交给 process_stage(例如跨线程传递 COM 对象)
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import *
+
+from .pool_utils import FileResult
+
+_DONE = object()
+"""打开线程结束标记"""
+
+
+@dataclass
+class PipelineReport:
+    """
+    流水线的处理结果
+
+    Attributes:
+        results (List[FileResult]): 已处理文件的结果, 按处理顺序排列
+        cancelled (List[str]): 取消后未处理的文件
+        elapsed (float): 总耗时
+        open_seconds (float): 打开线程打开文件的耗时
+        process_seconds (float): 主线程处理文档的耗时
+        wait_seconds (float): 主线程等待文件打开的耗时
+        blocked_seconds (float): 打开线程因已打开文档数量达到上限而等待的耗时
+        max_prefetched (int): 已打开未处理(不包括正在处理)的最大文档数量
+    """
+    results: List[FileResult] = field(default_factory=list)
+    cancelled: List[str] = field(default_factory=list)
+    elapsed: float = 0
+    open_seconds: float = 0
+    process_seconds: float = 0
+    wait_seconds: float = 0
+    blocked_seconds: float = 0
+    max_prefetched: int = 0
+
+    @property
+    def succeeded(self) -> List[FileResult]:
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> List[FileResult]:
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def overlap(self) -> float:
+        """打开与处理重叠的耗时"""
+        return max(0.0, self.open_seconds + self.process_seconds - self.elapsed)
+
+    def summary(self) -> str:
+        lines = [f'{len(self.results)} 个文件, 成功 {len(self.succeeded)}, 失败 {len(self.failed)}, '
+                 f'取消 {len(self.cancelled)}, 耗时 {self.elapsed:.1f}s '
+                 f'(打开 {self.open_seconds:.1f}s, 处理 {self.process_seconds:.1f}s, 等待打开 {self.wait_seconds:.1f}s)']
+        for r in self.failed:
+            lines.append(f'    {r.file}: {r.error}')
+        return '\n'.join(lines)
+
+
+@dataclass
+class _Item:
+    file: str
+    data: Any
+    handle: Any = None
+    error: str = ''
+    traceback: str = ''
+    seconds: float = 0
+
+
+class PrefetchPipeline:
+    """打开下一个文件与处理当前文档并行的两阶段流水线"""
+
+    def __init__(self,
+                 open_stage: Callable[[str], Any],
+                 process_stage: Callable[[str, Any, Any], Any],
+                 *,
+                 depth: int = 1,
+                 receive: Callable[[Any], Any] = None,
+                 discard: Callable[[str, Any], Any] = None,
+                 thread_init: Callable[[], Any] = None,
+                 thread_exit: Callable[[], Any] = None,
+                 poll: float = 0.05):
+        """
+        Args:
+            open_stage (Callable[[str], Any]): 在打开线程中打开文件, 参数为文件, 返回值交给 receive
+            process_stage (Callable[[str, Any, Any], Any]): 在主线程中处理文档, 参数为 (文件, 任务, 文档),
+                返回值记录到报告中
+            depth (int, optional): 已打开未处理(不包括正在处理)的最大文档数量. Defaults to 1.
+            receive (Callable[[Any], Any], optional): 在主线程中将 open_stage 的返回值转换为文档. Defaults to None.
+            discard (Callable[[str, Any], Any], optional): 取消后处理已打开未处理的文档, 参数为 (文件, 文档),
+                在主线程中调用. Defaults to None.
+            thread_init (Callable[[], Any], optional): 打开线程开始时调用. Defaults to None.
+            thread_exit (Callable[[], Any], optional): 主线程处理完所有文档后在打开线程中调用. Defaults to None.
+            poll (float, optional): 等待时检查是否取消的间隔(秒). Defaults to 0.05.
+        """
+        self.open_stage = open_stage
+        self.process_stage = process_stage
+        self.depth = max(1, depth)
+        self.receive = receive
+        self.discard = discard
+        self.thread_init = thread_init
+        self.thread_exit = thread_exit
+        self.poll = poll
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """停止打开新文件, 主线程处理完当前文档后结束, 可以在任意线程中调用"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _opener(self,
+                jobs: List[Tuple[str, Any]],
+                items: queue.Queue,
+                slots: threading.Semaphore,
+                done: threading.Event,
+                report: PipelineReport):
+        """打开线程: 依次打开文件放入队列, 主线程处理完成后释放资源"""
+        init_error = None
+        try:
+            if self.thread_init is not None:
+                self.thread_init()
+        except Exception as e:
+            logging.error(f'打开线程初始化失败: {e}')
+            init_error = (f'{type(e).__name__}: {e}', traceback.format_exc())
+        try:
+            for file, data in jobs:
+                # 背压: 已打开未处理的文档数量达到上限时等待主线程取出
+                start = time.perf_counter()
+                while not slots.acquire(timeout=self.poll):
+                    if self._cancel.is_set():
+                        break
+                report.blocked_seconds += time.perf_counter() - start
+                if self._cancel.is_set():
+                    break
+                item = _Item(file, data)
+                if init_error is not None:
+                    item.error, item.traceback = init_error
+                else:
+                    start = time.perf_counter()
+                    try:
+                        item.handle = self.open_stage(file)
+                    except Exception as e:
+                        logging.error(f'打开 {file} 失败: {e}')
+                        item.error, item.traceback = f'{type(e).__name__}: {e}', traceback.format_exc()
+                    item.seconds = time.perf_counter() - start
+                    report.open_seconds += item.seconds
+                items.put(item)
+                report.max_prefetched = max(report.max_prefetched, items.qsize())
+        finally:
+            items.put(_DONE)
+            # 打开线程的资源在主线程处理完所有文档后释放
+            done.wait()
+            if self.thread_exit is not None:
+                try:
+                    self.thread_exit()
+                except Exception as e:
+                    logging.warning(f'打开线程释放资源失败: {e}')
+
+    def _discard(self, item: _Item):
+        if item.error or self.discard is None:
+            return
+        try:
+            handle = self.receive(item.handle) if self.receive is not None else item.handle
+            self.discard(item.file, handle)
+        except Exception as e:
+            logging.warning(f'丢弃 {item.file} 失败: {e}')
+
+    def run(self, jobs: Dict[str, Any] | Iterable[Tuple[str, Any]]) -> PipelineReport:
+        """
+        处理所有文件
+
+        Args:
+            jobs (Dict[str, Any] | Iterable[Tuple[str, Any]]): key--文件, value--该文件的任务
+
+        Returns:
+            PipelineReport: 处理结果
+        """
+        jobs = list(jobs.items() if isinstance(jobs, dict) else jobs)
+        report = PipelineReport()
+        items: queue.Queue[_Item] = queue.Queue()
+        slots = threading.Semaphore(self.depth)
+        done = threading.Event()
+        opener = threading.Thread(target=self._opener, args=(jobs, items, slots, done, report),
+                                  name='prefetch', daemon=True)
+        start = time.perf_counter()
+        opener.start()
+        processed = set()
+        try:
+            while True:
+                wait = time.perf_counter()
+                item = items.get()
+                report.wait_seconds += time.perf_counter() - wait
+                if item is _DONE:
+                    break
+                # 取出后打开线程即可打开下一个文件, 与处理当前文档并行
+                slots.release()
+                if self._cancel.is_set():
+                    self._discard(item)
+                    continue
+                processed.add(item.file)
+                if item.error:
+                    report.results.append(FileResult(item.file, 0, False, error=item.error, traceback=item.traceback,
+                                                     seconds=item.seconds))
+                    continue
+                t = time.perf_counter()
+                try:
+                    doc = self.receive(item.handle) if self.receive is not None else item.handle
+                    result = self.process_stage(item.file, item.data, doc)
+                    report.results.append(FileResult(item.file, 0, True, result,
+                                                     seconds=item.seconds + time.perf_counter() - t))
+                except Exception as e:
+                    logging.error(f'处理 {item.file} 失败: {e}')
+                    report.results.append(FileResult(item.file, 0, False, error=f'{type(e).__name__}: {e}',
+                                                     traceback=traceback.format_exc(),
+                                                     seconds=item.seconds + time.perf_counter() - t))
+                finally:
+                    report.process_seconds += time.perf_counter() - t
+        except BaseException:
+            # 处理中断(例如 KeyboardInterrupt), 丢弃已打开的文档后继续抛出
+            self._cancel.set()
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    break
+                slots.release()
+                self._discard(item)
+            raise
+        finally:
+            done.set()
+            opener.join()
+            report.cancelled = [f for f, _ in jobs if f not in processed]
+            report.elapsed = time.perf_counter() - start
+        return report
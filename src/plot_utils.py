@@ -0,0 +1,380 @@
+"""
+后台打印队列和打印缓存
+
+print_layout 使用前台打印(BACKGROUNDPLOT = 0), 每张图纸打印完成前不能继续修改;
+PlotQueue 以后台打印方式提交图纸后立即返回, 继续修改下一个布局, 通过输出文件判断打印是否完成:
+输出文件与提交时不同(新建或修改时间、大小改变), 并且连续两次检查大小不变时视为完成
+
+同时打印的图纸数量达到 max_in_flight 时, 提交前等待已提交的图纸完成; 超过 timeout 未完成的图纸记为超时,
+不再等待. 每张图纸的排队、打印耗时记录到 PlotReport
+
+PlotCache 按 DWG 文件内容、布局、图签信息、打印设备和样式、输出文件计算打印键, 与上一次打印时的键一致且
+输出文件的校验值未改变时跳过打印; 同一次运行中输出文件相同的多行只打印一次
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import *
+
+from .attr_utils import normalize
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+
+
+def file_stat(path: str) -> Tuple[int, float] | None:
+    """(文件大小, 修改时间), 文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+@dataclass
+class PlotJob:
+    """
+    一张图纸的打印任务
+
+    Attributes:
+        doc: 文档
+        layout (str): 布局名称
+        output (str): 输出文件
+        status (str): pending | done | failed | timeout
+        queued (float): 调用 submit 的时间
+        started (float): 开始打印的时间
+        finished (float): 完成、失败或超时的时间
+    """
+    doc: Any
+    layout: str
+    output: str
+    status: str = PENDING
+    error: str = ''
+    queued: float = 0
+    started: float = 0
+    finished: float = 0
+    _baseline: Any = field(default=None, repr=False)
+    _last: Any = field(default=None, repr=False)
+
+    @property
+    def wait(self) -> float:
+        """等待其他图纸完成的耗时"""
+        return self.started - self.queued
+
+    @property
+    def latency(self) -> float:
+        """开始打印到完成的耗时"""
+        return self.finished - self.started
+
+
+@dataclass
+class PlotReport:
+    """所有图纸的打印结果"""
+    jobs: List[PlotJob] = field(default_factory=list)
+
+    def by_status(self, status: str) -> List[PlotJob]:
+        return [j for j in self.jobs if j.status == status]
+
+    @property
+    def done(self) -> List[PlotJob]:
+        return self.by_status(DONE)
+
+    @property
+    def failed(self) -> List[PlotJob]:
+        return [j for j in self.jobs if j.status in (FAILED, TIMEOUT)]
+
+    def latency(self) -> Dict[str, float]:
+        """已完成图纸的打印耗时统计(秒)"""
+        values = sorted(j.latency for j in self.done)
+        if not values:
+            return {'count': 0, 'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+        return {'count': len(values),
+                'mean': sum(values) / len(values),
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max': values[-1]}
+
+    def summary(self) -> str:
+        stats = self.latency()
+        lines = [f'{len(self.jobs)} 张图纸, 完成 {len(self.done)}, 超时 {len(self.by_status(TIMEOUT))}, '
+                 f'失败 {len(self.by_status(FAILED))}, 打印耗时 平均 {stats["mean"]:.1f}s '
+                 f'p95 {stats["p95"]:.1f}s 最长 {stats["max"]:.1f}s']
+        for j in self.failed:
+            lines.append(f'    {j.output} ({j.layout}): {j.status} {j.error}')
+        return '\n'.join(lines)
+
+
+class PlotQueue:
+    """后台打印队列"""
+
+    def __init__(self,
+                 start: Callable[[Any, str, str], bool],
+                 *,
+                 max_in_flight: int = 1,
+                 timeout: float = 300,
+                 poll_interval: float = 0.5,
+                 stat: Callable[[str], Any] = file_stat,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Any] = time.sleep):
+        """
+        Args:
+            start (Callable[[Any, str, str], bool]): 开始后台打印, 参数为 (文档, 布局名称, 输出文件),
+                返回 False 表示提交失败, 例如 acad_utils.plot_layout_background
+            max_in_flight (int, optional): 同时打印的最多图纸数量. Defaults to 1.
+            timeout (float, optional): 开始打印后超过多少秒未完成记为超时. Defaults to 300.
+            poll_interval (float, optional): 检查输出文件的间隔秒数. Defaults to 0.5.
+            stat (Callable[[str], Any], optional): 输出文件状态, 文件不存在时返回 None. Defaults to file_stat.
+            clock (Callable[[], float], optional): 时钟函数. Defaults to time.monotonic.
+            sleep (Callable[[float], Any], optional): 等待函数. Defaults to time.sleep.
+        """
+        self.start = start
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.stat = stat
+        self.clock = clock
+        self.sleep = sleep
+        self.in_flight: List[PlotJob] = []
+        self.report = PlotReport()
+
+    def _finish(self, job: PlotJob, status: str, error: str = ''):
+        job.status, job.error, job.finished = status, error, self.clock()
+        if job in self.in_flight:
+            self.in_flight.remove(job)
+        if status != DONE:
+            logging.warning(f'{job.output} 打印{"超时" if status == TIMEOUT else "失败"} {error}')
+
+    def poll(self) -> List[PlotJob]:
+        """
+        检查正在打印的图纸, 返回本次检查完成(包括超时)的图纸
+        """
+        finished = []
+        for job in list(self.in_flight):
+            current = self.stat(job.output)
+            if current is not None and current != job._baseline and current == job._last:
+                self._finish(job, DONE)
+            elif self.clock() - job.started > self.timeout:
+                self._finish(job, TIMEOUT, f'{self.timeout}s')
+            else:
+                job._last = current
+                continue
+            finished.append(job)
+        return finished
+
+    def _wait_slot(self):
+        while len(self.in_flight) >= self.max_in_flight:
+            if not self.poll():
+                self.sleep(self.poll_interval)
+
+    def submit(self, doc, layout: str, output: str) -> PlotJob:
+        """
+        提交一张图纸, 正在打印的图纸数量达到上限时先等待
+
+        Args:
+            doc (AcadDocument): 文档
+            layout (str): 布局名称
+            output (str): 输出文件
+
+        Returns:
+            PlotJob: 打印任务
+        """
+        job = PlotJob(doc, layout, output, queued=self.clock())
+        self.report.jobs.append(job)
+        self._wait_slot()
+        job._baseline = self.stat(output)
+        job.started = self.clock()
+        try:
+            ok = self.start(doc, layout, output)
+        except Exception as e:
+            ok, job.error = False, f'{type(e).__name__}: {e}'
+        if ok:
+            self.in_flight.append(job)
+        else:
+            self._finish(job, FAILED, job.error)
+        return job
+
+    def drain(self) -> PlotReport:
+        """等待所有图纸完成或超时"""
+        while self.in_flight:
+            if not self.poll():
+                self.sleep(self.poll_interval)
+        return self.report
+
+
+HIT = 'hit'
+MISS = 'miss'
+COALESCED = 'coalesced'
+
+
+def file_digest(path: str) -> str | None:
+    """文件内容的 sha256, 文件不存在时返回 None"""
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+@dataclass
+class PlotCacheReport:
+    """一次运行中打印缓存的结果, 各列表为输出文件"""
+    hits: List[str] = field(default_factory=list)
+    misses: List[str] = field(default_factory=list)
+    coalesced: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        lines = [f'打印缓存: 跳过 {len(self.hits)}, 打印 {len(self.misses)}, 重复 {len(self.coalesced)}']
+        lines += [f'    跳过 {f}' for f in self.hits]
+        lines += [f'    打印 {f}' for f in self.misses]
+        lines += [f'    重复 {f}' for f in self.coalesced]
+        return '\n'.join(lines)
+
+
+class PlotCache:
+    """
+    打印缓存
+
+    只有文档没有未保存的修改时, 打开的内容才与 DWG 文件一致, 才可能跳过打印;
+    需要打印的图纸在 commit 时(文档已保存、打印已完成)按保存后的 DWG 文件和生成的输出文件记录
+    """
+
+    def __init__(self, file: str = None, digest: Callable[[str], str | None] = file_digest):
+        """
+        Args:
+            file (str, optional): 缓存文件路径(json), None 表示不保存到文件. Defaults to None.
+            digest (Callable[[str], str | None], optional): 文件内容的校验值. Defaults to file_digest.
+        """
+        self.file = file
+        self.digest = digest
+        self._store: Dict[str, Dict[str, str]] | None = None
+        """缓存文件内容, key--输出文件, value--{'key': 打印键, 'output': 输出文件校验值}"""
+        self._digests: Dict[Tuple[str, int, float], str | None] = {}
+        """DWG 文件校验值, key--(路径, 大小, 修改时间)"""
+        self._planned: Dict[str, str] = {}
+        """本次运行已处理的输出文件, value--图签信息"""
+        self._pending: List[Tuple[str, str, str, str, str, str]] = []
+        """需要记录的打印 (DWG 文件, 布局, 图签信息, 设备, 样式, 输出文件)"""
+        self.report = PlotCacheReport()
+
+    @staticmethod
+    def _path_key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if self._store is None:
+            self._store = {}
+            if self.file and os.path.isfile(self.file):
+                try:
+                    with open(self.file, encoding='utf-8') as f:
+                        self._store = json.load(f)
+                except (OSError, ValueError) as e:
+                    logging.warning(f'读取打印缓存失败: {e}')
+        return self._store
+
+    def _save(self):
+        _dir = os.path.dirname(self.file)
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir)
+        tmp = self.file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._store, f, ensure_ascii=False)
+        os.replace(tmp, self.file)
+
+    def _dwg_digest(self, dwg: str) -> str | None:
+        try:
+            st = os.stat(dwg)
+        except OSError:
+            return None
+        key = (self._path_key(dwg), st.st_size, st.st_mtime)
+        if key not in self._digests:
+            self._digests[key] = self.digest(dwg)
+        return self._digests[key]
+
+    @staticmethod
+    def _values(values: Dict[str, Any]) -> str:
+        return json.dumps({str(k): normalize(v) for k, v in values.items()}, ensure_ascii=False, sort_keys=True)
+
+    def _key(self, dwg: str, layout: str, values: str, device: str, style: str, output: str) -> str | None:
+        dwg_digest = self._dwg_digest(dwg)
+        if dwg_digest is None:
+            return None
+        text = json.dumps([dwg_digest, layout, values, device or '', style or '', self._path_key(output)],
+                          ensure_ascii=False)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def check(self,
+              dwg: str,
+              layout: str,
+              values: Dict[str, Any],
+              output: str,
+              *,
+              device: str = '',
+              style: str = '',
+              unmodified: bool = True) -> str:
+        """
+        检查图纸是否需要打印, 需要打印时记录下来, 在 commit 时写入缓存
+
+        Args:
+            dwg (str): DWG 文件
+            layout (str): 布局名称
+            values (Dict[str, Any]): 图签信息
+            output (str): 输出文件
+            device (str, optional): 打印设备. Defaults to ''.
+            style (str, optional): 打印样式. Defaults to ''.
+            unmodified (bool, optional): 文档没有未保存的修改(doc.Saved). Defaults to True.
+
+        Returns:
+            str: hit--跳过; miss--需要打印; coalesced--本次运行已处理同一输出文件
+        """
+        out_key = self._path_key(output)
+        text = self._values(values)
+        if out_key in self._planned:
+            if self._planned[out_key] != text:
+                logging.warning(f'多行图签信息对应同一输出文件, 只打印第一行: {output}')
+            self.report.coalesced.append(output)
+            return COALESCED
+        self._planned[out_key] = text
+        entry = self._load().get(out_key)
+        if unmodified and entry is not None and entry['key'] == self._key(dwg, layout, text, device, style, output) \
+                and entry['output'] == self.digest(output):
+            self.report.hits.append(output)
+            return HIT
+        self.report.misses.append(output)
+        self._pending.append((dwg, layout, text, device, style, output))
+        return MISS
+
+    def commit(self) -> PlotCacheReport:
+        """
+        记录本次运行打印的图纸, 在文档保存且打印完成后调用; 返回本次运行的结果并开始新的一次运行
+        """
+        store = self._load()
+        changed = False
+        for dwg, layout, text, device, style, output in self._pending:
+            key = self._key(dwg, layout, text, device, style, output)
+            digest = self.digest(output)
+            out_key = self._path_key(output)
+            if key is None or digest is None:
+                # 打印失败或 DWG 文件不存在
+                changed |= store.pop(out_key, None) is not None
+                continue
+            store[out_key] = {'key': key, 'output': digest}
+            changed = True
+        if changed and self.file:
+            try:
+                self._save()
+            except OSError as e:
+                logging.warning(f'保存打印缓存失败: {e}')
+        report, self.report = self.report, PlotCacheReport()
+        self._pending.clear()
+        self._planned.clear()
+        self._digests.clear()
+        return report
@@ -0,0 +1,227 @@
+"""
+多实例并行处理文档
+
+WorkerPool 启动多个工作进程, 每个进程创建并独占一个 AutoCAD 应用实例; 按文件分组的任务(与 _read_excel 的结果相同)
+按工作量分配给各进程, 同一文件只由一个进程处理. 各文件的结果和异常汇总到 PoolReport
+
+应用实例退出或崩溃时(见 com_utils.is_disconnected), 工作进程重新创建应用实例并重试该文件;
+其他异常只记录到报告中, 继续处理下一个文件
+
+executor 可以为 'process' / 'thread' / 'inline', 在 Linux 中可以使用模拟应用实例测试调度、分配和异常处理;
+使用 'process' 时 app_factory, task 和 close_app 必须可以被 pickle(模块级函数或对象)
+"""
+from __future__ import annotations
+
+import logging
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import *
+
+from .com_utils import is_disconnected
+
+
+@dataclass
+class FileResult:
+    """一个文件的处理结果"""
+    file: str
+    worker: int
+    ok: bool
+    result: Any = None
+    error: str = ''
+    traceback: str = ''
+    seconds: float = 0
+    attempts: int = 1
+
+
+@dataclass
+class PoolReport:
+    """所有文件的处理结果"""
+    results: List[FileResult] = field(default_factory=list)
+    elapsed: float = 0
+    workers: int = 1
+
+    @property
+    def succeeded(self) -> List[FileResult]:
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> List[FileResult]:
+        return [r for r in self.results if not r.ok]
+
+    def by_worker(self) -> Dict[int, Dict[str, Any]]:
+        """
+        各工作进程的统计
+
+        Returns:
+            Dict[int, Dict[str, Any]]: key--工作进程序号, value--文件数量、失败数量、重试次数和处理时间
+        """
+        res = {}
+        for r in self.results:
+            w = res.setdefault(r.worker, {'files': 0, 'failed': 0, 'retries': 0, 'seconds': 0.0})
+            w['files'] += 1
+            w['failed'] += 0 if r.ok else 1
+            w['retries'] += r.attempts - 1
+            w['seconds'] += r.seconds
+        return res
+
+    def summary(self) -> str:
+        lines = [f'{len(self.results)} 个文件, 成功 {len(self.succeeded)}, 失败 {len(self.failed)}, '
+                 f'{self.workers} 个实例, 耗时 {self.elapsed:.1f}s']
+        for r in self.failed:
+            lines.append(f'    {r.file} (实例 {r.worker}): {r.error}')
+        return '\n'.join(lines)
+
+
+def shard(jobs: Dict[str, Sequence], workers: int, weight: Callable[[Sequence], float] = len) -> List[List[str]]:
+    """
+    按工作量将文件分配给各工作进程, 工作量大的文件优先分配给当前工作量最小的进程
+
+    Args:
+        jobs (Dict[str, Sequence]): key--文件, value--该文件的任务(例如布局列表)
+        workers (int): 工作进程数量
+        weight (Callable[[Sequence], float], optional): 文件的工作量. Defaults to len, 布局数量.
+
+    Returns:
+        List[List[str]]: 各工作进程处理的文件, 不包含空分组
+    """
+    workers = max(1, min(workers, len(jobs)))
+    shards: List[List[str]] = [[] for _ in range(workers)]
+    loads = [0.0] * workers
+    for file in sorted(jobs, key=lambda f: -weight(jobs[f])):
+        i = min(range(workers), key=lambda k: (loads[k], k))
+        shards[i].append(file)
+        loads[i] += weight(jobs[file])
+    return [s for s in shards if s]
+
+
+def run_shard(worker: int,
+              items: List[Tuple[str, Any]],
+              app_factory: Callable[[int], Any],
+              task: Callable[[Any, str, Any], Any],
+              close_app: Callable[[Any], Any] = None,
+              retries: int = 1) -> List[FileResult]:
+    """
+    在工作进程中依次处理分配的文件
+
+    Args:
+        worker (int): 工作进程序号
+        items (List[Tuple[str, Any]]): [(文件, 任务), ...]
+        app_factory (Callable[[int], Any]): 创建应用实例, 参数为工作进程序号
+        task (Callable[[Any, str, Any], Any]): 处理一个文件, 参数为 (应用实例, 文件, 任务)
+        close_app (Callable[[Any], Any], optional): 处理完成后关闭应用实例. Defaults to None.
+        retries (int, optional): 应用实例不可用时重新创建并重试的次数. Defaults to 1.
+
+    Returns:
+        List[FileResult]: 各文件的处理结果
+    """
+    results = []
+    app = None
+    try:
+        for file, data in items:
+            attempts = 0
+            start = time.perf_counter()
+            while True:
+                attempts += 1
+                try:
+                    if app is None:
+                        app = app_factory(worker)
+                    result = task(app, file, data)
+                    results.append(FileResult(file, worker, True, result, seconds=time.perf_counter() - start,
+                                              attempts=attempts))
+                    break
+                except Exception as e:
+                    disconnected = is_disconnected(e)
+                    if disconnected:
+                        app = None  # 重新创建应用实例
+                    if disconnected and attempts <= retries:
+                        logging.warning(f'实例 {worker} 不可用, 重新创建后处理 {file}: {e}')
+                        continue
+                    logging.error(f'实例 {worker} 处理 {file} 失败: {e}')
+                    results.append(FileResult(file, worker, False, error=f'{type(e).__name__}: {e}',
+                                              traceback=traceback.format_exc(),
+                                              seconds=time.perf_counter() - start, attempts=attempts))
+                    break
+    finally:
+        if app is not None and close_app is not None:
+            try:
+                close_app(app)
+            except Exception as e:
+                logging.warning(f'关闭实例 {worker} 失败: {e}')
+    return results
+
+
+class WorkerPool:
+    """多应用实例的工作进程池"""
+
+    def __init__(self,
+                 workers: int,
+                 app_factory: Callable[[int], Any],
+                 task: Callable[[Any, str, Any], Any],
+                 *,
+                 close_app: Callable[[Any], Any] = None,
+                 executor: str | Callable[[int], Executor] = 'process',
+                 retries: int = 1,
+                 weight: Callable[[Sequence], float] = len):
+        """
+        Args:
+            workers (int): 工作进程数量, 即应用实例数量
+            app_factory (Callable[[int], Any]): 创建应用实例, 参数为工作进程序号, 例如 acad_utils.new_application
+            task (Callable[[Any, str, Any], Any]): 处理一个文件, 参数为 (应用实例, 文件, 任务), 返回值记录到报告中
+            close_app (Callable[[Any], Any], optional): 工作进程结束时关闭应用实例. Defaults to None.
+            executor (str | Callable[[int], Executor], optional): 'process' | 'thread' | 'inline',
+                或参数为工作进程数量的 Executor 工厂函数. Defaults to 'process'.
+            retries (int, optional): 应用实例不可用时重新创建并重试的次数. Defaults to 1.
+            weight (Callable[[Sequence], float], optional): 文件的工作量. Defaults to len.
+        """
+        self.workers = max(1, workers)
+        self.app_factory = app_factory
+        self.task = task
+        self.close_app = close_app
+        self.executor = executor
+        self.retries = retries
+        self.weight = weight
+
+    def _executor(self, workers: int) -> Executor:
+        if callable(self.executor):
+            return self.executor(workers)
+        if self.executor == 'thread':
+            return ThreadPoolExecutor(max_workers=workers)
+        return ProcessPoolExecutor(max_workers=workers)
+
+    def run(self, jobs: Dict[str, Sequence]) -> PoolReport:
+        """
+        处理所有文件
+
+        Args:
+            jobs (Dict[str, Sequence]): key--文件, value--该文件的任务
+
+        Returns:
+            PoolReport: 处理结果, 按 jobs 中文件的顺序排列
+        """
+        start = time.perf_counter()
+        shards = shard(jobs, self.workers, self.weight)
+        results: List[FileResult] = []
+        if self.executor == 'inline' or len(shards) <= 1:
+            for i, files in enumerate(shards):
+                results.extend(run_shard(i, [(f, jobs[f]) for f in files], self.app_factory, self.task,
+                                         self.close_app, self.retries))
+        else:
+            with self._executor(len(shards)) as executor:
+                futures = {
+                    executor.submit(run_shard, i, [(f, jobs[f]) for f in files], self.app_factory, self.task,
+                                    self.close_app, self.retries): (i, files)
+                    for i, files in enumerate(shards)
+                }
+                for future in as_completed(futures):
+                    i, files = futures[future]
+                    try:
+                        results.extend(future.result())
+                    except Exception as e:
+                        # 工作进程异常退出, 该进程的所有文件记为失败
+                        logging.error(f'实例 {i} 异常退出: {e}')
+                        results.extend(FileResult(f, i, False, error=f'{type(e).__name__}: {e}') for f in files)
+        order = {f: k for k, f in enumerate(jobs)}
+        results.sort(key=lambda r: order[r.file])
+        return PoolReport(results, time.perf_counter() - start, len(shards))
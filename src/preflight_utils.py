@@ -0,0 +1,200 @@
+"""
+打印前检查
+
+在启动 AutoCAD 前一次检查 excel 中的所有图纸, 生成一份报告和去除错误图纸后的任务:
+    - dwg 文件是否存在: 按文件夹批量检查, 每个文件夹只列出一次文件
+    - 图框样式是否在 config.ini 中配置: 每个样式只检查一次
+    - 同一文件的同一布局是否重复: 保留第一行; 不同子项(sub_project)的同一布局是该布局的变体, 不是重复, 见 variant_utils
+    - 不同布局的输出文件是否重复: 见 naming_utils.find_collisions
+"""
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import *
+
+from .attr_utils import normalize
+from .naming_utils import find_collisions
+
+ERROR = 'error'
+"""错误, 图纸不处理"""
+WARNING = 'warning'
+"""警告, 图纸继续处理"""
+
+
+@dataclass(frozen=True)
+class Issue:
+    """
+    检查出的问题
+
+    Attributes:
+        level (str): ERROR 或 WARNING
+        check (str): 检查项, file/style/duplicate/collision
+        file (str): dwg 文件
+        layout (str): 布局, 整个文件的问题为空
+        message (str): 说明
+    """
+    level: str
+    check: str
+    file: str
+    layout: str
+    message: str
+
+    def __str__(self):
+        where = f'{self.file} {self.layout}'.strip()
+        return f'[{self.level}] {where}: {self.message}'
+
+
+@dataclass
+class PreflightReport:
+    """
+    检查结果
+
+    Attributes:
+        issues (List[Issue]): 检查出的问题
+        files (int): 检查的文件数量
+        rows (int): 检查的图纸数量
+        kept_files (int): 通过检查的文件数量
+        kept_rows (int): 通过检查的图纸数量
+        elapsed (float): 耗时
+    """
+    issues: List[Issue] = field(default_factory=list)
+    files: int = 0
+    rows: int = 0
+    kept_files: int = 0
+    kept_rows: int = 0
+    elapsed: float = 0
+
+    @property
+    def errors(self) -> List[Issue]:
+        return [i for i in self.issues if i.level == ERROR]
+
+    @property
+    def warnings(self) -> List[Issue]:
+        return [i for i in self.issues if i.level == WARNING]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def summary(self) -> str:
+        lines = [f'检查 {self.files} 个文件 {self.rows} 张图纸, 通过 {self.kept_files} 个文件 {self.kept_rows} 张图纸, '
+                 f'{len(self.errors)} 个错误, {len(self.warnings)} 个警告, 耗时 {self.elapsed * 1000:.0f}ms']
+        lines += [f'    {i}' for i in self.issues]
+        return '\n'.join(lines)
+
+
+def existing_files(files: Iterable[str], listdir: Callable[[str], Iterable[str]] = os.listdir) -> Set[str]:
+    """
+    按文件夹批量检查文件是否存在, 每个文件夹只列出一次文件
+
+    Args:
+        files (Iterable[str]): 文件
+        listdir (Callable[[str], Iterable[str]], optional): 列出文件夹中的文件. Defaults to os.listdir.
+
+    Returns:
+        Set[str]: 存在的文件, 与参数中的路径相同
+    """
+    by_dir: Dict[str, List[str]] = {}
+    for f in files:
+        by_dir.setdefault(os.path.dirname(os.path.abspath(f)), []).append(f)
+    res = set()
+    for _dir, items in by_dir.items():
+        try:
+            names = {os.path.normcase(n) for n in listdir(_dir)}
+        except OSError:
+            continue
+        res.update(f for f in items if os.path.normcase(os.path.basename(f)) in names)
+    return res
+
+
+def _row_key(info: Mapping) -> Tuple[str, str]:
+    """(布局, 子项), 同一文件中唯一"""
+    return normalize(info.get('layout')), normalize(info.get('sub_project'))
+
+
+def preflight(jobs: Dict[str, List[Mapping]],
+              *,
+              styles: Collection[str] = None,
+              outputs: Mapping[Tuple[str, str], str] = None,
+              extension: str = '.dwg',
+              listdir: Callable[[str], Iterable[str]] = os.listdir) -> Tuple[PreflightReport, Dict[str, List[Mapping]]]:
+    """
+    检查所有图纸
+
+    Args:
+        jobs (Dict[str, List[Mapping]]): key--dwg 文件, value--该文件中各布局的图签信息
+        styles (Collection[str], optional): 已配置的图框样式, None 表示不检查. Defaults to None.
+        outputs (Mapping[Tuple[str, ...], str], optional): key--(dwg 文件绝对路径, 布局[, 子项]), value--输出文件,
+            None 表示不检查. Defaults to None.
+        extension (str, optional): 文件扩展名. Defaults to '.dwg'.
+        listdir (Callable[[str], Iterable[str]], optional): 列出文件夹中的文件. Defaults to os.listdir.
+
+    Returns:
+        Tuple[PreflightReport, Dict[str, List[Mapping]]]: 检查结果, 去除错误图纸后的任务
+    """
+    start = time.perf_counter()
+    report = PreflightReport(files=len(jobs), rows=sum(len(v) for v in jobs.values()))
+    issues = report.issues
+    bad_files: Set[str] = set()
+    bad_rows: Set[Tuple[str, str, str]] = set()
+
+    # 文件
+    for f in jobs:
+        if not f.lower().endswith(extension):
+            issues.append(Issue(ERROR, 'file', f, '', f'不是 {extension} 文件'))
+            bad_files.add(f)
+    exists = existing_files([f for f in jobs if f not in bad_files], listdir)
+    for f in jobs:
+        if f not in bad_files and f not in exists:
+            issues.append(Issue(ERROR, 'file', f, '', '文件不存在'))
+            bad_files.add(f)
+
+    # 图框样式, 每个样式只检查一次
+    known = None if styles is None else set(styles)
+    style_ok: Dict[str, bool] = {}
+    for f, info_list in jobs.items():
+        seen = set()
+        for info in info_list:
+            layout, variant = _row_key(info)
+            if known is not None:
+                style = normalize(info.get('border_style'))
+                if style not in style_ok:
+                    style_ok[style] = style in known
+                if not style_ok[style]:
+                    issues.append(Issue(ERROR, 'style', f, layout,
+                                        f'图框样式 {style} 未配置' if style else '未指定图框样式'))
+                    bad_rows.add((f, layout, variant))
+            if (layout, variant) in seen:
+                issues.append(Issue(WARNING, 'duplicate', f, layout, '布局重复, 只处理第一行'))
+            seen.add((layout, variant))
+
+    # 输出文件
+    if outputs is not None:
+        abs_files = {os.path.abspath(f): f for f in jobs}
+        for output, keys in find_collisions(outputs).items():
+            for file, layout, *variant in keys:
+                f = abs_files.get(file, file)
+                issues.append(Issue(ERROR, 'collision', f, layout, f'输出文件 {output} 重复'))
+                bad_rows.add((f, layout, normalize(variant[0]) if variant else ''))
+
+    # 去除错误的图纸和重复的布局
+    res: Dict[str, List[Mapping]] = {}
+    for f, info_list in jobs.items():
+        if f in bad_files:
+            continue
+        seen = set()
+        kept = []
+        for info in info_list:
+            key = _row_key(info)
+            if (f, *key) in bad_rows or key in seen:
+                continue
+            seen.add(key)
+            kept.append(info)
+        if kept:
+            res[f] = kept
+    report.kept_files = len(res)
+    report.kept_rows = sum(len(v) for v in res.values())
+    report.elapsed = time.perf_counter() - start
+    return report, res
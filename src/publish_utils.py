@@ -0,0 +1,341 @@
+"""
+批量发布
+
+print_layout 每个布局调用一次 PlotToFile, 每次都要切换布局、重生成并启动打印引擎;
+Publisher 将一批布局写入 DSD 图纸集文件, 每批只执行一次 PUBLISH
+
+单页 PDF 由 AutoCAD 按图纸名称命名, 图纸名称使用输出文件名(不含扩展名), 同一批的输出文件必须在同一文件夹中且不重名;
+多页 PDF 按 group(子项)合并, 每个子项一个 DSD 和一个 PDF 文件
+
+执行 DSD 的方法由 executor 提供, 例如 acad_utils.publish_executor, 测试时可以使用生成输出文件的模拟函数;
+PUBLISH 命令异步执行, executor 通过 OutputWatcher 等待输出文件生成后才返回
+"""
+from __future__ import annotations
+
+import logging
+import ntpath
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import *
+
+_SEP = '\\'
+
+TARGET_PDF_SINGLE = 5
+"""每个图纸一个 PDF 文件"""
+TARGET_PDF_MULTI = 6
+"""所有图纸合并为一个 PDF 文件"""
+
+
+@dataclass(frozen=True)
+class SheetJob:
+    """
+    一个布局的发布任务
+
+    Attributes:
+        file (str): dwg 文件, 发布前必须已保存
+        layout (str): 布局名称
+        output (str): 单页发布时的输出文件
+        group (str): 多页发布时合并到同一 PDF 的分组, 例如子项名称
+    """
+    file: str
+    layout: str
+    output: str
+    group: str = ''
+
+    @property
+    def sheet_name(self) -> str:
+        return ntpath.splitext(ntpath.basename(self.output))[0]
+
+
+@dataclass
+class PublishBatch:
+    """
+    一次 PUBLISH 的图纸
+
+    Attributes:
+        jobs (List[SheetJob]): 图纸
+        target (str): 多页发布时为输出文件, 单页发布时为输出文件夹
+        multi_sheet (bool): 是否合并为一个 PDF
+        dsd (str): DSD 文件路径, 写入后设置
+    """
+    jobs: List[SheetJob]
+    target: str
+    multi_sheet: bool = False
+    dsd: str = ''
+
+    @property
+    def outputs(self) -> List[str]:
+        """发布后应生成的文件"""
+        if self.multi_sheet:
+            return [self.target]
+        return [j.output for j in self.jobs]
+
+
+class OutputWatcher:
+    """
+    等待发布生成输出文件
+
+    发送 PUBLISH 命令后立即返回, 发布开始前应用可能仍然空闲, 不能只等待应用空闲;
+    所有输出文件在创建 OutputWatcher 后生成或更新、文件大小在两次轮询之间不再变化且应用空闲时视为发布完成
+    """
+
+    def __init__(self,
+                 outputs: Iterable[str],
+                 *,
+                 stat: Callable[[str], os.stat_result] = os.stat,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Any] = time.sleep):
+        """
+        在发送命令前创建, 记录输出文件的修改时间和大小
+
+        Args:
+            outputs (Iterable[str]): 发布后应生成的文件, 见 PublishBatch.outputs
+            stat (Callable[[str], os.stat_result], optional): 读取文件状态. Defaults to os.stat.
+            clock (Callable[[], float], optional): 时钟函数. Defaults to time.monotonic.
+            sleep (Callable[[float], Any], optional): 等待函数. Defaults to time.sleep.
+        """
+        self.outputs = list(outputs)
+        self._stat = stat
+        self._clock = clock
+        self._sleep = sleep
+        self._before = self._state()
+
+    def _state(self) -> Dict[str, Tuple[float, int] | None]:
+        """key--输出文件, value--(修改时间, 大小), 文件不存在时为 None"""
+        res = {}
+        for f in self.outputs:
+            try:
+                st = self._stat(f)
+                res[f] = (st.st_mtime, st.st_size)
+            except OSError:
+                res[f] = None
+        return res
+
+    def pending(self) -> List[str]:
+        """尚未生成或更新的输出文件"""
+        return [f for f, s in self._state().items() if s is None or s == self._before[f]]
+
+    def wait(self, idle: Callable[[], bool] = None, timeout: float = 600, poll_interval: float = 0.5) -> bool:
+        """
+        等待发布完成
+
+        Args:
+            idle (Callable[[], bool], optional): 应用是否空闲. Defaults to None, 不检查.
+            timeout (float, optional): 最长等待秒数. Defaults to 600.
+            poll_interval (float, optional): 轮询间隔秒数. Defaults to 0.5.
+
+        Returns:
+            bool: 是否在超时前完成
+        """
+        start = self._clock()
+        last = None
+        while True:
+            state = self._state()
+            updated = all(s is not None and s != self._before[f] for f, s in state.items())
+            if updated and state == last and (idle is None or idle()):
+                return True
+            if self._clock() - start >= timeout:
+                logging.warning(f'等待发布超时 --> {timeout}s, 未生成: {self.pending()}')
+                return False
+            last = state
+            self._sleep(poll_interval)
+
+
+def build_dsd(batch: PublishBatch) -> str:
+    """
+    生成 DSD 文件内容
+
+    Args:
+        batch (PublishBatch): 一次发布的图纸
+
+    Raises:
+        ValueError: 图纸名称重复, 或单页发布的输出文件不在 target 文件夹中
+
+    Returns:
+        str: DSD 文件内容, 使用 \\r\\n 换行
+    """
+    names = set()
+    lines = ['[DWF6Version]', 'Ver=1', '[DWF6MinorVersion]', 'MinorVer=1']
+    for job in batch.jobs:
+        name = job.sheet_name
+        if name.casefold() in names:
+            raise ValueError(f'图纸名称重复: {name}')
+        names.add(name.casefold())
+        if not batch.multi_sheet and ntpath.normcase(ntpath.dirname(job.output)) != ntpath.normcase(
+                batch.target.rstrip(_SEP)):
+            raise ValueError(f'{job.output} 不在输出文件夹 {batch.target} 中')
+        lines += [f'[DWF6Sheet:{name}]',
+                  f'DWG={job.file}',
+                  f'Layout={job.layout}',
+                  'Setup=',
+                  f'OriginalSheetPath={job.file}',
+                  'Has Plot Port=0',
+                  'Has3DDWF=0']
+    if batch.multi_sheet:
+        target = [f'Type={TARGET_PDF_MULTI}', f'DWF={batch.target}', f'OUT={ntpath.dirname(batch.target)}']
+    else:
+        target = [f'Type={TARGET_PDF_SINGLE}', 'DWF=', f'OUT={batch.target.rstrip(_SEP)}']
+    lines += ['[Target]', *target, 'PWD=']
+    lines += ['[PdfOptions]',
+              'IncludeHyperlinks=TRUE',
+              'CreateBookmarks=TRUE',
+              'CaptureFontsInDrawing=TRUE',
+              'ConvertTextToGeometry=FALSE',
+              'VectorResolution=1200',
+              'RasterResolution=400']
+    lines += ['[AutoCAD Block Data]', 'IncludeBlockInfo=0', 'BlockTmplFilePath=']
+    lines += ['[SheetSet Properties]',
+              'IsSheetSet=FALSE',
+              'IsHomogeneous=FALSE',
+              'SheetSet Name=',
+              'NoOfCopies=1',
+              'PlotStampOn=FALSE',
+              'ViewFile=FALSE',
+              'JobID=0',
+              'SelectionSetName=',
+              'AcadProfile=',
+              'CategoryName=',
+              'LogFilePath=',
+              'IncludeLayer=FALSE',
+              'LineMerge=FALSE',
+              'CurrentPrecision=',
+              'PromptForDwfName=FALSE',
+              'PwdProtectPublishedDWF=FALSE',
+              'PromptForPwd=FALSE',
+              'RepublishingMarkups=FALSE',
+              'DSDType=1',
+              'MarkupProject=',
+              'PublishToWeb=FALSE',
+              'ConvertToImage=FALSE']
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def plan_batches(jobs: Iterable[SheetJob], multi_sheet: bool = False, batch_size: int = None) -> List[PublishBatch]:
+    """
+    将图纸分为多次发布
+
+    Args:
+        jobs (Iterable[SheetJob]): 图纸
+        multi_sheet (bool, optional): 按 group 合并为多页 PDF, 输出文件为第一个图纸输出文件夹中的 <group>.pdf.
+            Defaults to False.
+        batch_size (int, optional): 单页发布时每批最多的图纸数量, None 表示不限制. Defaults to None.
+
+    Returns:
+        List[PublishBatch]: 按图纸首次出现的顺序排列
+    """
+    groups: Dict[str, List[SheetJob]] = {}
+    for job in jobs:
+        key = job.group if multi_sheet else ntpath.normcase(ntpath.dirname(job.output))
+        groups.setdefault(key, []).append(job)
+    batches = []
+    for key, items in groups.items():
+        if multi_sheet:
+            target = ntpath.join(ntpath.dirname(items[0].output), f'{key or "publish"}.pdf')
+            batches.append(PublishBatch(items, target, True))
+            continue
+        size = batch_size or len(items)
+        for i in range(0, len(items), size):
+            batches.append(PublishBatch(items[i:i + size], ntpath.dirname(items[0].output)))
+    return batches
+
+
+@dataclass
+class PublishReport:
+    """
+    发布结果
+
+    Attributes:
+        batches (List[PublishBatch]): 各次发布
+        published (List[str]): 已生成的文件
+        missing (List[str]): 发布后未生成的文件
+        errors (Dict[str, str]): key--DSD 文件, value--发布失败的异常
+        elapsed (float): 总耗时
+    """
+    batches: List[PublishBatch] = field(default_factory=list)
+    published: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0
+
+    @property
+    def sheets(self) -> int:
+        return sum(len(b.jobs) for b in self.batches)
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.errors
+
+    def summary(self) -> str:
+        lines = [f'{self.sheets} 张图纸, {len(self.batches)} 次发布, 生成 {len(self.published)} 个文件, '
+                 f'缺少 {len(self.missing)} 个, 耗时 {self.elapsed:.1f}s']
+        for dsd, error in self.errors.items():
+            lines.append(f'    {dsd}: {error}')
+        for f in self.missing:
+            lines.append(f'    缺少 {f}')
+        return '\n'.join(lines)
+
+
+class Publisher:
+    """生成 DSD 文件并批量发布"""
+
+    def __init__(self,
+                 executor: Callable[[str, PublishBatch], Any],
+                 dsd_path: str,
+                 *,
+                 multi_sheet: bool = False,
+                 batch_size: int = None,
+                 encoding: str = 'utf-8-sig',
+                 exists: Callable[[str], bool] = os.path.exists):
+        """
+        Args:
+            executor (Callable[[str, PublishBatch], Any]): 执行一次发布, 参数为 (DSD 文件, 图纸)
+            dsd_path (str): DSD 文件保存的文件夹
+            multi_sheet (bool, optional): 按 group 合并为多页 PDF. Defaults to False.
+            batch_size (int, optional): 单页发布时每批最多的图纸数量. Defaults to None.
+            encoding (str, optional): DSD 文件编码. Defaults to 'utf-8-sig'.
+            exists (Callable[[str], bool], optional): 检查输出文件是否生成. Defaults to os.path.exists.
+        """
+        self.executor = executor
+        self.dsd_path = dsd_path
+        self.multi_sheet = multi_sheet
+        self.batch_size = batch_size
+        self.encoding = encoding
+        self.exists = exists
+
+    def write(self, batch: PublishBatch, index: int) -> str:
+        """写入 DSD 文件, 返回文件路径"""
+        os.makedirs(self.dsd_path, exist_ok=True)
+        path = os.path.join(self.dsd_path, f'publish_{index:03d}.dsd')
+        with open(path, 'w', encoding=self.encoding, newline='') as f:
+            f.write(build_dsd(batch))
+        batch.dsd = path
+        return path
+
+    def publish(self, jobs: Iterable[SheetJob]) -> PublishReport:
+        """
+        发布所有图纸
+
+        Args:
+            jobs (Iterable[SheetJob]): 图纸, 对应的 dwg 文件必须已保存
+
+        Returns:
+            PublishReport: 发布结果
+        """
+        start = time.perf_counter()
+        report = PublishReport(plan_batches(jobs, self.multi_sheet, self.batch_size))
+        for i, batch in enumerate(report.batches):
+            try:
+                path = self.write(batch, i)
+                logging.info(f'发布 {len(batch.jobs)} 张图纸 --> {batch.target}')
+                self.executor(path, batch)
+            except Exception as e:
+                logging.error(f'发布失败 {batch.dsd or batch.target}: {e}')
+                logging.debug(traceback.format_exc())
+                report.errors[batch.dsd or batch.target] = f'{type(e).__name__}: {e}'
+                continue
+            for f in batch.outputs:
+                (report.published if self.exists(f) else report.missing).append(f)
+        report.elapsed = time.perf_counter() - start
+        return report
@@ -0,0 +1,258 @@
+"""
+按列保存的 excel 记录
+
+每行一个字典时, 子项名称、图框样式、文件路径等重复的字符串在每一行都保存一次;
+RecordStore 按列保存, 每列为编码数组和不重复的值列表(字符串使用 sys.intern), 每行只保存一个 4 字节的编码
+
+RecordView 是一行的视图(__slots__, 只保存 RecordStore 和行号), 可以像字典一样使用;
+pickle 时转换为字典, 传递给工作进程时不会复制整个 RecordStore
+
+group_by 按列的值分组, 返回行号数组
+"""
+from __future__ import annotations
+
+import math
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import *
+
+NA = math.nan
+"""缺失值, 与 excel_utils.NA 相同"""
+
+
+def _is_na(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class _Column:
+    """一列数据, codes[i] 为第 i 行的值在 values 中的序号, 0 为缺失值"""
+    __slots__ = ('codes', 'values', '_index')
+
+    def __init__(self, size: int = 0):
+        self.codes = array('I', bytes(4 * size))
+        self.values: List[Any] = [NA]
+        self._index: Dict[Tuple[type, Any], int] | None = None
+
+    def encode(self, value: Any) -> int:
+        if _is_na(value):
+            return 0
+        if self._index is None:
+            self._index = {(v.__class__, v): i for i, v in enumerate(self.values) if i}
+        # 1 和 True 的哈希相同, 按类型区分
+        key = (value.__class__, value)
+        code = self._index.get(key)
+        if code is None:
+            code = len(self.values)
+            self.values.append(sys.intern(value) if type(value) is str else value)
+            self._index[key] = code
+        return code
+
+    def __getstate__(self):
+        # 查找表在下一次编码时重新生成
+        return self.codes, self.values
+
+    def __setstate__(self, state):
+        self.codes, self.values = state
+        # pickle 不保留 NaN 对象, 恢复为同一个缺失值对象, 使包含缺失值的记录可以比较
+        self.values[0] = NA
+        self._index = None
+
+
+class RecordStore:
+    """按列保存的记录, 每行可以有不同的列(例如不同工作表的表头不同)"""
+
+    def __init__(self):
+        self._columns: Dict[str, _Column] = {}
+        self._schemas: List[Tuple[str, ...]] = []
+        """各行的列名, 相同的列名只保存一次"""
+        self._schema_sets: List[FrozenSet[str]] = []
+        self._schema_index: Dict[Tuple[str, ...], int] = {}
+        self._row_schema = array('I')
+        self._size = 0
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping], **extra) -> RecordStore:
+        """
+        由记录创建
+
+        Args:
+            records (Iterable[Mapping]): 记录
+            **extra: 每行添加的列, 值为函数时参数为记录
+
+        Returns:
+            RecordStore: 记录
+        """
+        store = cls()
+        for record in records:
+            store.append(record, **{k: v(record) if callable(v) else v for k, v in extra.items()})
+        return store
+
+    def __getstate__(self):
+        return self._columns, self._schemas, self._row_schema, self._size
+
+    def __setstate__(self, state):
+        self._columns, self._schemas, self._row_schema, self._size = state
+        self._schema_sets = [frozenset(s) for s in self._schemas]
+        self._schema_index = {s: i for i, s in enumerate(self._schemas)}
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index: int) -> RecordView:
+        if not -self._size <= index < self._size:
+            raise IndexError(index)
+        return RecordView(self, index % self._size)
+
+    def __iter__(self) -> Iterator[RecordView]:
+        return (RecordView(self, i) for i in range(self._size))
+
+    @property
+    def columns(self) -> List[str]:
+        """所有列名"""
+        return list(self._columns)
+
+    def _schema(self, names: Tuple[str, ...]) -> int:
+        code = self._schema_index.get(names)
+        if code is None:
+            code = self._schema_index[names] = len(self._schemas)
+            self._schemas.append(names)
+            self._schema_sets.append(frozenset(names))
+        return code
+
+    def _column(self, name: str) -> _Column:
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = _Column(self._size)
+        return column
+
+    def append(self, record: Mapping, **extra):
+        """
+        添加一行
+
+        Args:
+            record (Mapping): 记录
+            **extra: 添加的列
+        """
+        names = (*record.keys(), *(k for k in extra if k not in record))
+        for name in names:
+            self._column(name)
+        for name, column in self._columns.items():
+            if name in extra:
+                value = extra[name]
+            elif name in record:
+                value = record[name]
+            else:
+                value = NA
+            column.codes.append(column.encode(value))
+        self._row_schema.append(self._schema(names))
+        self._size += 1
+
+    def extend(self, records: Iterable[Mapping]):
+        for record in records:
+            self.append(record)
+
+    def keys(self, index: int) -> Tuple[str, ...]:
+        """一行的列名"""
+        return self._schemas[self._row_schema[index]]
+
+    def has(self, index: int, name: str) -> bool:
+        """一行是否有该列"""
+        return name in self._schema_sets[self._row_schema[index]]
+
+    def value(self, index: int, name: str) -> Any:
+        """一行中一列的值, 不检查该行是否有该列"""
+        column = self._columns[name]
+        return column.values[column.codes[index]]
+
+    def set_value(self, index: int, name: str, value: Any):
+        """修改一行中一列的值, 该行没有该列时添加"""
+        column = self._column(name)
+        column.codes[index] = column.encode(value)
+        if not self.has(index, name):
+            self._row_schema[index] = self._schema((*self.keys(index), name))
+
+    def column(self, name: str) -> List[Any]:
+        """一列的所有值"""
+        column = self._columns[name]
+        values = column.values
+        return [values[c] for c in column.codes]
+
+    def categories(self, name: str) -> List[Any]:
+        """一列中不重复的值, 不含缺失值"""
+        return self._columns[name].values[1:]
+
+    def group_by(self, *names: str, indices: Iterable[int] = None) -> Dict[Any, array]:
+        """
+        按列的值分组
+
+        Args:
+            *names (str): 分组的列, 一列时键为值, 多列时键为值的元组
+            indices (Iterable[int], optional): 只分组这些行. Defaults to None, 所有行.
+
+        Returns:
+            Dict[Any, array]: key--列的值, value--行号数组, 按首次出现的顺序排列
+        """
+        columns = [self._columns[n] if n in self._columns else _Column(self._size) for n in names]
+        codes = [c.codes for c in columns]
+        groups: Dict[Tuple[int, ...], array] = {}
+        for i in (range(self._size) if indices is None else indices):
+            key = tuple(c[i] for c in codes)
+            rows = groups.get(key)
+            if rows is None:
+                rows = groups[key] = array('I')
+            rows.append(i)
+        res = {}
+        for key, rows in groups.items():
+            values = tuple(c.values[k] for c, k in zip(columns, key))
+            res[values[0] if len(names) == 1 else values] = rows
+        return res
+
+    def rows(self, indices: Iterable[int]) -> List[RecordView]:
+        """行号对应的视图"""
+        return [RecordView(self, i) for i in indices]
+
+
+class RecordView(Mapping):
+    """RecordStore 中一行的视图, 修改值时写入 RecordStore"""
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: RecordStore, index: int):
+        self._store = store
+        self._index = index
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    def __getitem__(self, key: str) -> Any:
+        if not self._store.has(self._index, key):
+            raise KeyError(key)
+        return self._store.value(self._index, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if not self._store.has(self._index, key):
+            return default
+        return self._store.value(self._index, key)
+
+    def __contains__(self, key: object) -> bool:
+        return self._store.has(self._index, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.keys(self._index))
+
+    def __len__(self) -> int:
+        return len(self._store.keys(self._index))
+
+    def __setitem__(self, key: str, value: Any):
+        self._store.set_value(self._index, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        store, i = self._store, self._index
+        return {k: store.value(i, k) for k in store.keys(i)}
+
+    def __reduce__(self):
+        return dict, (self.to_dict(),)
+
+    def __repr__(self):
+        return f'RecordView({self.to_dict()!r})'
@@ -0,0 +1,133 @@
+"""
+基于选择集过滤器的图形查询
+
+通过 SelectionSets.Add + Select(acSelectionSetAll, ..., FilterType, FilterData) 由 AutoCAD 按 DXF 组码筛选图形,
+只返回符合条件的图形, 不需要在 Python 中逐个读取布局内所有图形的属性:
+    -- 0:   图形类型, 例如图块实例为 INSERT
+    -- 2:   图块名称
+    -- 8:   图层名称
+    -- 410: 布局名称, 模型空间为 Model
+
+过滤值支持 AutoCAD 通配符, 按名称精确查询时使用 escape_pattern 转义; 过滤器匹配时忽略大小写,
+block_refs 再按图块名称区分大小写筛选, 与遍历布局时的 obj.Name == block_name 一致
+"""
+from __future__ import annotations
+
+from typing import *
+
+if TYPE_CHECKING:
+    from lib.acad_typing.acadObjects import *
+    from lib.acad_typing.acadDocuments import *
+
+DXF_TYPE = 0
+DXF_NAME = 2
+DXF_LAYER = 8
+DXF_LAYOUT = 410
+
+AC_SELECTION_SET_ALL = 5  # AcSelect.acSelectionSetAll
+MODEL_LAYOUT = 'Model'
+SELECTION_SET_NAME = 'AcadHelperQuery'
+
+WILDCARDS = '#@.*?~[]-,`'
+"""AutoCAD 通配符, 在字符前加 ` 转义"""
+
+
+def escape_pattern(name: str) -> str:
+    """
+    转义名称中的通配符, 使过滤条件按名称精确匹配
+
+    Args:
+        name (str): 图块、图层或布局名称
+
+    Returns:
+        str: 转义后的名称
+    """
+    return ''.join('`' + c if c in WILDCARDS else c for c in name)
+
+
+def block_ref_filter(block_name: str = None, layout_name: str = None) -> List[Tuple[int, str]]:
+    """
+    图块实例的过滤条件
+
+    Args:
+        block_name (str, optional): 图块名称, None 表示所有图块. Defaults to None.
+        layout_name (str, optional): 布局名称, None 表示所有布局. Defaults to None.
+
+    Returns:
+        List[Tuple[int, str]]: [(DXF 组码, 过滤值), ...]
+    """
+    res = [(DXF_TYPE, 'INSERT')]
+    if block_name is not None:
+        res.append((DXF_NAME, escape_pattern(block_name)))
+    if layout_name is not None:
+        res.append((DXF_LAYOUT, escape_pattern(layout_name)))
+    return res
+
+
+class SelectionQuery:
+    """
+    使用选择集查询文档中的图形
+
+    每个文档复用同一个名称的选择集, 查询前清空; 选择集只在当前会话中存在, 不会保存到图纸中
+    """
+
+    def __init__(self,
+                 encode: Callable[[Tuple[int, ...], Tuple[Any, ...]], Tuple[Any, Any]] = None,
+                 point=None,
+                 name: str = SELECTION_SET_NAME):
+        """
+        Args:
+            encode (Callable, optional): 将组码和过滤值转换为 Select 的 FilterType, FilterData 参数,
+                win32com 中需要转换为 VARIANT 数组. Defaults to None, 不转换.
+            point (optional): Select 的 Point1, Point2 参数, acSelectionSetAll 模式下不使用. Defaults to None.
+            name (str, optional): 选择集名称. Defaults to SELECTION_SET_NAME.
+        """
+        self.encode = encode
+        self.point = point
+        self.name = name
+
+    def _selection_set(self, doc: AcadDocument) -> AcadSelectionSet:
+        """获取文档中的查询选择集, 不存在时创建"""
+        sets = doc.SelectionSets
+        try:
+            ss = sets.Item(self.name)
+        except Exception:
+            return sets.Add(self.name)
+        ss.Clear()
+        return ss
+
+    def select(self, doc: AcadDocument, dxf_filter: Sequence[Tuple[int, Any]]) -> List:
+        """
+        查询文档中符合过滤条件的图形
+
+        Args:
+            doc (AcadDocument): 文档
+            dxf_filter (Sequence[Tuple[int, Any]]): [(DXF 组码, 过滤值), ...], 多个条件同时满足
+
+        Returns:
+            List: 符合条件的图形
+        """
+        codes = tuple(c for c, _ in dxf_filter)
+        values = tuple(v for _, v in dxf_filter)
+        filter_type, filter_data = self.encode(codes, values) if self.encode else (codes, values)
+        ss = self._selection_set(doc)
+        ss.Select(AC_SELECTION_SET_ALL, self.point, self.point, filter_type, filter_data)
+        return [obj for obj in ss]
+
+    def block_refs(self, doc: AcadDocument, block_name: str = None, layout_name: str = None) -> List:
+        """
+        查询图块实例
+
+        Args:
+            doc (AcadDocument): 文档
+            block_name (str, optional): 图块名称, None 表示所有图块. Defaults to None.
+            layout_name (str, optional): 布局名称, None 表示所有布局. Defaults to None.
+
+        Returns:
+            List[AcadBlockReference]: 图块实例, 图块名称区分大小写
+        """
+        refs = self.select(doc, block_ref_filter(block_name, layout_name))
+        if block_name is None:
+            return refs
+        # 过滤器忽略大小写, 只读取符合条件的图形的名称
+        return [obj for obj in refs if obj.Name == block_name]
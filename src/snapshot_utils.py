@@ -0,0 +1,295 @@
+"""
+布局图形快照
+
+LayoutSnapshot 遍历一次布局图块, 将图形的句柄、类型、图块名称、图层、插入点和属性值读取到按列保存的数组中,
+之后的查询都从快照读取, 不再调用 COM; 需要修改图形时再通过 HandleToObject 获取图形对象
+
+字符串列保存字符串表中的序号, 相同的类型、图层、图块名称和属性名称只保存一份
+
+DocumentSnapshot 保存一个文档中各 (布局, 图块名称) 的快照, 每个组合只查询一次, 同一文档的多行数据
+(包括一图多用的各变体)共用; 插入或删除图块后调用 invalidate 重新查询
+"""
+from __future__ import annotations
+
+from array import array
+from typing import *
+
+if TYPE_CHECKING:
+    from lib.acad_typing.acadObjects import *
+    from lib.acad_typing.acadDocuments import *
+
+BLOCK_REFERENCE = 'AcDbBlockReference'
+
+
+class SnapshotRow(object):
+    """快照中的一个图形, 属性从快照的列中读取"""
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot: LayoutSnapshot, index: int):
+        self.snapshot = snapshot
+        self.index = index
+
+    @property
+    def handle(self) -> str:
+        return self.snapshot.string(self.snapshot.handles[self.index])
+
+    @property
+    def object_name(self) -> str:
+        return self.snapshot.string(self.snapshot.object_names[self.index])
+
+    @property
+    def name(self) -> str:
+        """图块名称, 不是图块时为空字符串"""
+        return self.snapshot.string(self.snapshot.names[self.index])
+
+    @property
+    def layer(self) -> str:
+        return self.snapshot.string(self.snapshot.layers[self.index])
+
+    @property
+    def insertion_point(self) -> Tuple[float, float, float]:
+        i = self.index * 3
+        return tuple(self.snapshot.points[i:i + 3])
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        """属性名称: 属性值"""
+        return dict(self.snapshot.attributes(self.index))
+
+    def resolve(self):
+        """获取图形对象"""
+        return self.snapshot.resolve(self)
+
+    def __repr__(self):
+        return f'SnapshotRow<{self.handle} {self.object_name} {self.name}>'
+
+
+class LayoutSnapshot:
+    """
+    按列保存的布局图形快照
+
+    handles, object_names, names, layers 为字符串表序号, points 依次保存每个图形插入点的 x, y, z;
+    第 i 个图形的属性为 attr_tags / attr_values 中 [attr_start[i], attr_start[i + 1]) 范围内的元素
+    """
+
+    def __init__(self, document: AcadDocument = None, layout_name: str = ''):
+        """
+        Args:
+            document (AcadDocument, optional): 图形所在文档, 用于 resolve. Defaults to None.
+            layout_name (str, optional): 布局名称. Defaults to ''.
+        """
+        self.document = document
+        self.layout_name = layout_name
+        self._strings: List[str] = []
+        self._string_index: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}
+        """key--句柄, value--行号"""
+        self.handles = array('I')
+        self.object_names = array('I')
+        self.names = array('I')
+        self.layers = array('I')
+        self.points = array('d')
+        self.attr_start = array('I', [0])
+        self.attr_tags = array('I')
+        self.attr_values = array('I')
+
+    @classmethod
+    def capture(cls, layout: AcadLayout, entities: Iterable = None) -> LayoutSnapshot:
+        """
+        读取布局中的图形
+
+        每个图形读取 Handle, ObjectName, Layer; 图块另外读取 Name, InsertionPoint 和所有属性的 TagString, TextString
+
+        Args:
+            layout (AcadLayout): 布局
+            entities (Iterable, optional): 只读取指定的图形, 例如选择集查询的结果. Defaults to None, 布局中的所有图形.
+
+        Returns:
+            LayoutSnapshot: 快照
+        """
+        snapshot = cls(layout.Document, layout.Name)
+        for obj in (layout.Block if entities is None else entities):
+            snapshot.add_object(obj)
+        return snapshot
+
+    def string(self, index: int) -> str:
+        return self._strings[index]
+
+    def _intern(self, s) -> int:
+        s = '' if s is None else str(s)
+        index = self._string_index.get(s)
+        if index is None:
+            index = self._string_index[s] = len(self._strings)
+            self._strings.append(s)
+        return index
+
+    def add_object(self, obj) -> int:
+        """
+        读取图形并添加到快照
+
+        Returns:
+            int: 行号
+        """
+        object_name = obj.ObjectName
+        if object_name == BLOCK_REFERENCE:
+            attrs = [(a.TagString, a.TextString) for a in obj.GetAttributes()]
+            return self.add(obj.Handle, object_name, obj.Name, obj.Layer, obj.InsertionPoint, attrs)
+        return self.add(obj.Handle, object_name, layer=obj.Layer)
+
+    def add(self,
+            handle: str,
+            object_name: str,
+            name: str = '',
+            layer: str = '',
+            point: Sequence[float] = (0, 0, 0),
+            attributes: Iterable[Tuple[str, str]] = ()) -> int:
+        """
+        添加一行
+
+        Returns:
+            int: 行号
+        """
+        index = len(self.handles)
+        self._rows[handle] = index
+        self.handles.append(self._intern(handle))
+        self.object_names.append(self._intern(object_name))
+        self.names.append(self._intern(name))
+        self.layers.append(self._intern(layer))
+        self.points.extend(tuple(point)[:3])
+        for tag, value in attributes:
+            self.attr_tags.append(self._intern(tag))
+            self.attr_values.append(self._intern(value))
+        self.attr_start.append(len(self.attr_tags))
+        return index
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __iter__(self) -> Iterator[SnapshotRow]:
+        return (SnapshotRow(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index: int) -> SnapshotRow:
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return SnapshotRow(self, index % len(self))
+
+    def row(self, handle: str) -> SnapshotRow | None:
+        """按句柄查找图形"""
+        index = self._rows.get(handle)
+        return None if index is None else SnapshotRow(self, index)
+
+    def attributes(self, index: int) -> Iterator[Tuple[str, str]]:
+        """第 index 个图形的 (属性名称, 属性值)"""
+        for i in range(self.attr_start[index], self.attr_start[index + 1]):
+            yield self._strings[self.attr_tags[i]], self._strings[self.attr_values[i]]
+
+    def find(self, object_name: str = None, name: str = None, layer: str = None) -> List[SnapshotRow]:
+        """
+        查找图形, 各条件同时满足, None 表示不限
+
+        Args:
+            object_name (str, optional): 图形类型, 例如 AcDbBlockReference. Defaults to None.
+            name (str, optional): 图块名称. Defaults to None.
+            layer (str, optional): 图层名称. Defaults to None.
+
+        Returns:
+            List[SnapshotRow]: 符合条件的图形
+        """
+        columns = []
+        for column, value in ((self.object_names, object_name), (self.names, name), (self.layers, layer)):
+            if value is not None:
+                index = self._string_index.get(value)
+                if index is None:
+                    return []
+                columns.append((column, index))
+        return [SnapshotRow(self, i) for i in range(len(self)) if all(c[i] == v for c, v in columns)]
+
+    def block_refs(self, name: str = None) -> List[SnapshotRow]:
+        """查找图块实例"""
+        return self.find(BLOCK_REFERENCE, name)
+
+    def resolve(self, row: SnapshotRow | str):
+        """
+        通过 HandleToObject 获取图形对象, 用于修改图形
+
+        Args:
+            row (SnapshotRow | str): 快照中的图形或句柄
+        """
+        handle = row.handle if isinstance(row, SnapshotRow) else row
+        return self.document.HandleToObject(handle)
+
+    def set_attribute(self, row: SnapshotRow, tag: str, value: str):
+        """修改图形属性后同步更新快照"""
+        for i in range(self.attr_start[row.index], self.attr_start[row.index + 1]):
+            if self._strings[self.attr_tags[i]] == tag:
+                self.attr_values[i] = self._intern(value)
+
+    @property
+    def nbytes(self) -> int:
+        """各列数组占用的字节数, 不包括字符串表"""
+        return sum(a.itemsize * len(a) for a in (self.handles, self.object_names, self.names, self.layers,
+                                                 self.points, self.attr_start, self.attr_tags, self.attr_values))
+
+
+class DocumentSnapshot:
+    """一个文档的图块快照, 按 (布局, 图块名称) 查询一次"""
+
+    def __init__(self,
+                 document: AcadDocument,
+                 query: Callable[[str, str], Iterable],
+                 layouts: Callable[[], Iterable[str]] = None):
+        """
+        Args:
+            document (AcadDocument): 文档
+            query (Callable[[str, str], Iterable]): 查询图块实例, 参数为 (布局名称, 图块名称),
+                例如选择集查询
+            layouts (Callable[[], Iterable[str]], optional): 文档中的布局名称, 只读取一次, 用于检查布局是否存在.
+                Defaults to None, 不检查.
+        """
+        self.document = document
+        self.query = query
+        self._layouts = layouts
+        self._layout_names: Set[str] | None = None
+        self._snapshots: Dict[Tuple[str, str], LayoutSnapshot] = {}
+
+    def has_layout(self, layout_name: str) -> bool:
+        if self._layouts is None:
+            return True
+        if self._layout_names is None:
+            self._layout_names = set(self._layouts())
+        return layout_name in self._layout_names
+
+    def layout(self, layout_name: str, block_name: str) -> LayoutSnapshot:
+        """
+        布局中指定图块的快照, 第一次使用时查询
+
+        Raises:
+            KeyError: 布局不存在
+        """
+        key = (layout_name, block_name)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            if not self.has_layout(layout_name):
+                raise KeyError(f'布局 {layout_name} 不存在')
+            snapshot = LayoutSnapshot(self.document, layout_name)
+            for obj in self.query(layout_name, block_name):
+                snapshot.add_object(obj)
+            self._snapshots[key] = snapshot
+        return snapshot
+
+    def block_refs(self, layout_name: str, block_name: str) -> List[SnapshotRow]:
+        """布局中的图块实例"""
+        return self.layout(layout_name, block_name).block_refs(block_name)
+
+    def invalidate(self, layout_name: str = None):
+        """
+        插入或删除图块后清空快照
+
+        Args:
+            layout_name (str, optional): 布局名称, None 表示所有布局. Defaults to None.
+        """
+        if layout_name is None:
+            self._snapshots.clear()
+        else:
+            for key in [k for k in self._snapshots if k[0] == layout_name]:
+                del self._snapshots[key]
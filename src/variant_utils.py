@@ -0,0 +1,187 @@
+"""
+一图多用: 同一布局按不同子项的图签信息多次打印
+
+同一文件同一布局的多行图签信息(来自不同的子项工作表)为该布局的变体, 逐个修改图签并打印;
+sync_block_attr 只写入与当前值不同的属性, 因此按相邻变体差异最少的顺序处理可以减少属性写入次数
+
+order_variants 先从每个变体出发按最近邻生成顺序, 取写入次数最少的一个, 再用 2-opt 交换改进;
+变体数量一般只有几个到几十个, 不需要更复杂的算法
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import *
+
+from .attr_utils import normalize
+
+_MULTI_START_LIMIT = 64
+"""变体数量不超过该值时从每个变体出发生成顺序, 超过时只从与起始值差异最少的变体出发"""
+
+
+def _values(values: Mapping[str, Any]) -> Dict[str, str]:
+    """属性名称转换为大写, 值转换为字符串, 与 attr_utils.plan 一致"""
+    return {k.upper(): normalize(v) for k, v in values.items()}
+
+
+def distance(a: Mapping[str, Any], b: Mapping[str, Any]) -> int:
+    """
+    从 a 修改为 b 需要写入的属性数量, 属性名称忽略大小写, 缺少的属性视为空
+
+    Args:
+        a (Mapping[str, Any]): 属性名称: 值
+        b (Mapping[str, Any]): 属性名称: 值
+
+    Returns:
+        int: 值不同的属性数量
+    """
+    a, b = _values(a), _values(b)
+    return sum(a.get(k, '') != b.get(k, '') for k in a.keys() | b.keys())
+
+
+def path_writes(values: Sequence[Mapping[str, Any]], order: Sequence[int], start: Mapping[str, Any] = None) -> int:
+    """
+    按顺序修改所有变体需要写入的属性数量
+
+    Args:
+        values (Sequence[Mapping[str, Any]]): 各变体的属性值
+        order (Sequence[int]): 处理顺序
+        start (Mapping[str, Any], optional): 图块的起始值. Defaults to None, 所有属性为空.
+
+    Returns:
+        int: 属性写入次数
+    """
+    prev = start or {}
+    res = 0
+    for i in order:
+        res += distance(prev, values[i])
+        prev = values[i]
+    return res
+
+
+def order_variants(values: Sequence[Mapping[str, Any]], start: Mapping[str, Any] = None) -> List[int]:
+    """
+    变体的处理顺序, 使相邻变体之间不同的属性尽量少
+
+    Args:
+        values (Sequence[Mapping[str, Any]]): 各变体的属性值
+        start (Mapping[str, Any], optional): 图块的起始值. Defaults to None, 所有属性为空.
+
+    Returns:
+        List[int]: 变体序号, 写入次数相同时保持原顺序
+    """
+    n = len(values)
+    if n <= 1:
+        return list(range(n))
+    rows = [_values(v) for v in values]
+    first = _values(start or {})
+
+    def dist(a: Dict[str, str], b: Dict[str, str]) -> int:
+        return sum(a.get(k, '') != b.get(k, '') for k in a.keys() | b.keys())
+
+    d = [[dist(rows[i], rows[j]) for j in range(n)] for i in range(n)]
+    d0 = [dist(first, r) for r in rows]
+
+    def cost(path: List[int]) -> int:
+        return d0[path[0]] + sum(d[path[k]][path[k + 1]] for k in range(n - 1))
+
+    def greedy(s: int) -> List[int]:
+        path, left = [s], set(range(n)) - {s}
+        while left:
+            last = path[-1]
+            nxt = min(left, key=lambda j: (d[last][j], j))
+            path.append(nxt)
+            left.remove(nxt)
+        return path
+
+    starts = range(n) if n <= _MULTI_START_LIMIT else [min(range(n), key=lambda i: (d0[i], i))]
+    best = min((greedy(s) for s in starts), key=cost)
+
+    # 2-opt: 反转一段顺序, 写入次数减少时保留; 第一个变体之前为起始值, 最后一个变体之后没有变体
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 1):
+            for k in range(i + 1, n):
+                a, b = best[i], best[k]
+                before = (d0[a] if i == 0 else d[best[i - 1]][a]) + (d[b][best[k + 1]] if k + 1 < n else 0)
+                after = (d0[b] if i == 0 else d[best[i - 1]][b]) + (d[a][best[k + 1]] if k + 1 < n else 0)
+                if after < before:
+                    best[i:k + 1] = reversed(best[i:k + 1])
+                    improved = True
+    return best
+
+
+@dataclass
+class VariantReport:
+    """
+    一个布局的变体处理结果
+
+    Attributes:
+        file (str): dwg 文件
+        layout (str): 布局名称
+        variants (List[str]): 按处理顺序的变体, 子项名称
+        full_writes (int): 每个变体清空并重写所有属性时的写入次数
+        excel_writes (int): 按 excel 中的顺序只写入差异时的写入次数, 从图签的当前值开始
+        planned_writes (int): 按排序后的顺序只写入差异时的写入次数, 从图签的当前值开始
+        writes (int): 实际写入次数, 布局中有多个图签时为所有图签的写入次数之和
+    """
+    file: str
+    layout: str
+    variants: List[str] = field(default_factory=list)
+    full_writes: int = 0
+    excel_writes: int = 0
+    planned_writes: int = 0
+    writes: int = 0
+
+    def summary(self) -> str:
+        return (f'{self.file} 文件的 {self.layout} 布局 {len(self.variants)} 个变体 {" -> ".join(self.variants)}, '
+                f'属性写入: 全部重写 {self.full_writes}, excel 顺序 {self.excel_writes}, '
+                f'排序后 {self.planned_writes}, 实际 {self.writes}')
+
+
+def group_variants(info_list: Iterable[Mapping], key: str = 'layout') -> Dict[Any, List[Mapping]]:
+    """
+    按布局分组, 保持布局第一次出现的顺序和组内的顺序
+
+    Args:
+        info_list (Iterable[Mapping]): 一个文件中各布局的图签信息
+        key (str, optional): 布局名称的列. Defaults to 'layout'.
+
+    Returns:
+        Dict[Any, List[Mapping]]: key--布局名称, value--该布局的变体
+    """
+    res: Dict[Any, List[Mapping]] = {}
+    for info in info_list:
+        res.setdefault(info.get(key), []).append(info)
+    return res
+
+
+def plan_variants(file: str,
+                  layout: str,
+                  values: Sequence[Mapping[str, Any]],
+                  names: Sequence[str],
+                  tags: int = None,
+                  start: Mapping[str, Any] = None) -> Tuple[List[int], VariantReport]:
+    """
+    排序一个布局的变体并统计写入次数
+
+    Args:
+        file (str): dwg 文件
+        layout (str): 布局名称
+        values (Sequence[Mapping[str, Any]]): 各变体的属性值
+        names (Sequence[str]): 各变体的名称
+        tags (int, optional): 图签的属性数量. Defaults to None, 使用属性值和起始值中的属性数量.
+        start (Mapping[str, Any], optional): 图签的当前值, 第一个变体选择与当前值差异最少的顺序.
+            Defaults to None, 所有属性为空.
+
+    Returns:
+        Tuple[List[int], VariantReport]: 处理顺序, 写入次数统计(实际写入次数为 0)
+    """
+    order = order_variants(values, start)
+    if tags is None:
+        tags = len({k.upper() for v in (*values, start or {}) for k in v})
+    report = VariantReport(file, layout, [names[i] for i in order],
+                           full_writes=tags * len(values),
+                           excel_writes=path_writes(values, range(len(values)), start),
+                           planned_writes=path_writes(values, order, start))
+    return order, report
@@ -37,13 +37,16 @@ def get_option_to_variable(master, section: SectionProxy,
 
 
 # 创建 dwg 属性与 excel 表头的映射
-def make_dwg_excel_attr_map(dwg_attrs: List[str], excel_attrs: List[str]) -> Dict[str, str]:
+def make_dwg_excel_attr_map(dwg_attrs: List[str],
+                            excel_attrs: List[str],
+                            initial: Dict[str, str] = None) -> Dict[str, str]:
     """
     创建 dwg 属性与 excel 表头的映射
 
     Args:
         dwg_attrs (List[str]): dwg 图块属性名称列表
         excel_attrs (List[str]): excel 表头名称列表
+        initial (Dict[str, str], optional): 初始映射, key 为小写的属性名称. Defaults to None, 与属性名称相同的表头.
 
     Returns:
         Dict[str,str]: key --> dwg 属性名称, value --> excel 表头名称
@@ -54,7 +57,8 @@ def make_dwg_excel_attr_map(dwg_attrs: List[str], excel_attrs: List[str]) -> Dic
     res: Dict[str, Variable] = {}
     _dwg_attrs = set(tmp.lower() for tmp in dwg_attrs)
     for tmp in _dwg_attrs:
-        res.setdefault(tmp, StringVar(_tk, value=tmp if tmp in excel_attrs else ''))
+        value = initial.get(tmp, '') if initial is not None else (tmp if tmp in excel_attrs else '')
+        res.setdefault(tmp, StringVar(_tk, value=value))
 
     frm = ttk.Frame(_tk, padding=10)
     frm.pack()
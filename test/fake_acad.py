@@ -0,0 +1,549 @@
+"""
+测试用 AutoCAD 模拟对象
+
+与 win32com 的 CDispatch 一致, 所有成员都通过 __getattr__ / __setattr__ 访问,
+调用耗时使用 FakeClock 模拟, 不会真正等待
+"""
+import re
+import time
+
+from src import com_utils
+
+
+class FakeComError(Exception):
+    """与 pywintypes.com_error 结构一致: (hresult, strerror, excepinfo, argerror)"""
+
+    def __init__(self, hresult, strerror='', excepinfo=None, argerror=None):
+        super().__init__(hresult, strerror, excepinfo, argerror)
+        self.hresult = hresult
+
+
+def key_not_found():
+    """AutoCAD 集合中不存在指定键时抛出的异常"""
+    return FakeComError(com_utils.DISP_E_EXCEPTION, 'Exception occurred.',
+                        (0, None, 'Key not found', None, 0, com_utils.ACAD_E_KEY_NOT_FOUND))
+
+
+def call_rejected():
+    return FakeComError(com_utils.RPC_E_CALL_REJECTED, 'Call was rejected by callee.')
+
+
+class FakeClock:
+    """虚拟时钟, sleep 只推进时间"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class WallClock:
+    """真实时钟, sleep 实际等待, 用于模拟多线程中的耗时"""
+
+    def __call__(self):
+        return time.perf_counter()
+
+    @property
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class FakeAcadState:
+    def __init__(self, quiescent: bool):
+        self.IsQuiescent = quiescent
+
+
+class SimulatedApplication:
+    """
+    按脚本模拟忙碌时段的 AcadApplication
+
+    busy 时段内(例如重生成、打印)除 GetAcadState 外的调用都会被拒绝;
+    busy_after 指定调用方法后进入忙碌状态的秒数, 例如 {'Regen': 0.3};
+    每次调用消耗 call_cost 秒
+    """
+    METHODS = {'Regen', 'Update', 'ZoomExtents'}
+
+    def __init__(self, clock: FakeClock, busy=(), busy_after=None, call_cost=0.01):
+        self.__dict__.update(clock=clock, busy=list(busy), busy_after=busy_after or {}, call_cost=call_cost,
+                             calls=0, rejected=0, values={})
+
+    def is_busy(self):
+        return any(start <= self.clock.now < end for start, end in self.busy)
+
+    def _call(self):
+        self.__dict__['calls'] += 1
+        self.clock.sleep(self.call_cost)
+        if self.is_busy():
+            self.__dict__['rejected'] += 1
+            raise call_rejected()
+
+    def _get_acad_state(self):
+        self.__dict__['calls'] += 1
+        self.clock.sleep(self.call_cost)
+        return FakeAcadState(not self.is_busy())
+
+    def _method(self, name):
+        def _(*args):
+            self._call()
+            if name in self.busy_after:
+                self.busy.append((self.clock.now, self.clock.now + self.busy_after[name]))
+
+        return _
+
+    def __getattr__(self, item):
+        if item == 'GetAcadState':
+            return self._get_acad_state
+        if item in self.METHODS:
+            return self._method(item)
+        self._call()
+        return self.values.get(item)
+
+    def __setattr__(self, key, value):
+        self._call()
+        self.values[key] = value
+
+
+class CallCounter:
+    """统计 COM 调用次数, key--属性或方法名称"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def reset(self):
+        self.counts.clear()
+
+
+class FakeDispatch:
+    """
+    模拟 CDispatch
+
+    属性保存在 _props 中, 方法为类中定义的同名函数; 读取属性和调用方法都计为一次 COM 调用
+    """
+
+    def __init__(self, counter: CallCounter, **props):
+        self.__dict__['_counter'] = counter
+        self.__dict__['_props'] = props
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+        method = getattr(type(self), item, None)
+        if callable(method):
+            counter = self._counter
+
+            def _(*args, **kwargs):
+                counter(item)
+                return method(self, *args, **kwargs)
+
+            return _
+        self._counter(item)
+        if item in self._props:
+            return self._props[item]
+        try:
+            raise FakeComError(com_utils.DISP_E_UNKNOWNNAME, 'Unknown name.')
+        except FakeComError:
+            raise AttributeError(item)
+
+    def __setattr__(self, key, value):
+        self._counter(key)
+        self._props[key] = value
+
+    def __getitem__(self, index):
+        # 与 win32com 一致, 集合对象可以通过下标遍历
+        items = self._items()
+        if index >= len(items):
+            raise IndexError(index)
+        self._counter('__getitem__')
+        return items[index]
+
+    def _items(self):
+        raise TypeError(f'{type(self).__name__} is not a collection')
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self._props.get("Name", "")}>'
+
+
+class FakeEntity(FakeDispatch):
+    def __init__(self, doc, object_name='AcDbLine', **props):
+        props.setdefault('Layer', '0')
+        super().__init__(doc._counter, ObjectName=object_name, Handle=doc._new_handle(), **props)
+        self.__dict__['_doc'] = doc
+        self.__dict__['_owner'] = None
+        doc._handles[self._props['Handle']] = self
+
+    def Delete(self):
+        self._owner._entities.remove(self)
+        self._doc._handles.pop(self._props['Handle'], None)
+
+
+class FakeAttribute(FakeEntity):
+    def __init__(self, doc, tag, text='', definition=False):
+        super().__init__(doc, 'AcDbAttributeDefinition' if definition else 'AcDbAttribute', TagString=tag,
+                         TextString=text)
+
+
+class FakeBlockReference(FakeEntity):
+    def __init__(self, doc, name, point=(0, 0, 0), attributes=None):
+        super().__init__(doc, 'AcDbBlockReference', Name=name, EffectiveName=name, InsertionPoint=tuple(point),
+                         HasAttributes=bool(attributes))
+        self.__dict__['_attributes'] = [FakeAttribute(doc, k, v) for k, v in (attributes or {}).items()]
+
+    def GetAttributes(self):
+        return tuple(self._attributes)
+
+    def Explode(self):
+        return ()
+
+
+class FakeBlock(FakeDispatch):
+    """图块定义, 布局对应的图块为 *Paper_Space / *Model_Space"""
+
+    def __init__(self, doc, name, is_layout=False):
+        super().__init__(doc._counter, Name=name, IsLayout=is_layout, Handle=doc._new_handle())
+        self.__dict__['_doc'] = doc
+        self.__dict__['_entities'] = []
+
+    def __getattr__(self, item):
+        if item == 'Count':
+            self._counter(item)
+            return len(self._entities)
+        return super().__getattr__(item)
+
+    def _items(self):
+        return self._entities
+
+    def add(self, entity: FakeEntity):
+        entity.__dict__['_owner'] = self
+        self._entities.append(entity)
+        return entity
+
+    def Item(self, index):
+        return self._entities[index]
+
+    def InsertBlock(self, point, name, sx=1, sy=1, sz=1, rotation=0):
+        block = self._doc._blocks.get(name)
+        if block is None:
+            raise key_not_found()
+        attrs = {e._props['TagString']: '' for e in block._entities
+                 if e._props['ObjectName'] == 'AcDbAttributeDefinition'}
+        return self.add(FakeBlockReference(self._doc, name, point, attrs))
+
+
+class FakeLayout(FakeDispatch):
+    def __init__(self, doc, name):
+        block = FakeBlock(doc, f'*Paper_Space{len(doc._layouts)}', is_layout=True)
+        super().__init__(doc._counter, Name=name, Block=block, Handle=doc._new_handle(), Document=doc)
+        self.__dict__['_doc'] = doc
+
+    def Delete(self):
+        self._doc._layouts.pop(self._props['Name'])
+
+
+class FakeCollection(FakeDispatch):
+    def __init__(self, counter, mapping: dict):
+        super().__init__(counter)
+        self.__dict__['_mapping'] = mapping
+
+    def __getattr__(self, item):
+        if item == 'Count':
+            self._counter(item)
+            return len(self._mapping)
+        return super().__getattr__(item)
+
+    def _items(self):
+        return list(self._mapping.values())
+
+    def Item(self, key):
+        if isinstance(key, int):
+            return self._items()[key]
+        if key not in self._mapping:
+            raise key_not_found()
+        return self._mapping[key]
+
+
+DXF_NAMES = {
+    'AcDbBlockReference': 'INSERT',
+    'AcDbLine': 'LINE',
+    'AcDbPolyline': 'LWPOLYLINE',
+    'AcDbCircle': 'CIRCLE',
+    'AcDbText': 'TEXT',
+    'AcDbMText': 'MTEXT',
+}
+"""ObjectName 对应的 DXF 图形类型"""
+
+
+def _wildcard(pattern: str) -> str:
+    """将 AutoCAD 通配符转换为正则表达式, 支持 # @ . * ? ~ [...] , 及 ` 转义"""
+    res, alternatives = [], []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '`' and i + 1 < len(pattern):
+            i += 1
+            res.append(re.escape(pattern[i]))
+        elif c == ',':
+            alternatives.append(''.join(res))
+            res = []
+        elif c == '#':
+            res.append(r'\d')
+        elif c == '@':
+            res.append('[A-Za-z]')
+        elif c == '.':
+            res.append('[^A-Za-z0-9]')
+        elif c == '*':
+            res.append('.*')
+        elif c == '?':
+            res.append('.')
+        elif c == '[':
+            end = pattern.index(']', i + 1)
+            body = pattern[i + 1:end]
+            res.append('[^' + body[1:] + ']' if body.startswith('~') else '[' + body + ']')
+            i = end
+        else:
+            res.append(re.escape(c))
+        i += 1
+    alternatives.append(''.join(res))
+    return '|'.join(f'(?:{a})' for a in alternatives)
+
+
+def wcmatch(string: str, pattern: str) -> bool:
+    """与 AutoCAD wcmatch 一致, 忽略大小写"""
+    negate = pattern.startswith('~')
+    matched = re.fullmatch(_wildcard(pattern[1:] if negate else pattern), string, re.IGNORECASE) is not None
+    return matched != negate
+
+
+class FakeSelectionSet(FakeDispatch):
+    """
+    模拟 AcadSelectionSet, Select 只支持 acSelectionSetAll 模式
+
+    按 DXF 组码 0(图形类型) 2(图块名称) 8(图层) 410(布局名称) 筛选所有布局中的图形
+    """
+
+    def __init__(self, doc, name):
+        super().__init__(doc._counter, Name=name)
+        self.__dict__['_doc'] = doc
+        self.__dict__['_entities'] = []
+
+    def __getattr__(self, item):
+        if item == 'Count':
+            self._counter(item)
+            return len(self._entities)
+        return super().__getattr__(item)
+
+    def _items(self):
+        return self._entities
+
+    @staticmethod
+    def _dxf(entity, code, layout):
+        props = entity._props
+        if code == 0:
+            return DXF_NAMES.get(props['ObjectName'], props['ObjectName'])
+        if code == 2:
+            return props.get('Name', '')
+        if code == 8:
+            return props.get('Layer', '0')
+        if code == 410:
+            return layout
+        raise FakeComError(com_utils.E_INVALIDARG, 'Invalid argument.')
+
+    def Select(self, mode, point1=None, point2=None, filter_type=(), filter_data=()):
+        if mode != 5:
+            raise FakeComError(com_utils.E_INVALIDARG, 'Invalid argument.')
+        if len(filter_type) != len(filter_data):
+            raise FakeComError(com_utils.E_INVALIDARG, 'Invalid argument.')
+        conditions = list(zip(filter_type, filter_data))
+        for layout, block in self._doc._spaces():
+            for e in block._entities:
+                if all(wcmatch(str(self._dxf(e, code, layout)), str(value)) for code, value in conditions):
+                    self._entities.append(e)
+
+    def Item(self, index):
+        return self._entities[index]
+
+    def Clear(self):
+        self._entities.clear()
+
+    def Delete(self):
+        self._doc._selection_sets.pop(self._props['Name'])
+
+
+class FakeSelectionSets(FakeCollection):
+    def __init__(self, doc):
+        super().__init__(doc._counter, doc._selection_sets)
+        self.__dict__['_doc'] = doc
+
+    def Add(self, name):
+        if name in self._mapping:
+            raise FakeComError(com_utils.DISP_E_EXCEPTION, 'Exception occurred.',
+                               (0, None, 'Duplicate record name', None, 0, -2145386405))
+        ss = self._mapping[name] = FakeSelectionSet(self._doc, name)
+        return ss
+
+
+class FakeDocument(FakeDispatch):
+    """
+    模拟 AcadDocument
+
+    layouts: {布局名称: [实体, ...]}, 使用 block_ref / entity 创建实体
+    """
+
+    def __init__(self, full_name='', counter: CallCounter = None, application=None):
+        counter = counter or CallCounter()
+        super().__init__(counter, FullName=full_name, Name=full_name.replace('\\', '/').split('/')[-1],
+                         ReadOnly=False, Saved=True)
+        self.__dict__.update(_next_handle=0x100, _handles={}, _blocks={}, _layouts={}, _selection_sets={},
+                             _application=application)
+        self._blocks['*Model_Space'] = FakeBlock(self, '*Model_Space', is_layout=True)
+        self._props['ModelSpace'] = self._blocks['*Model_Space']
+        self._props['Blocks'] = FakeCollection(counter, self._blocks)
+        self._props['Layouts'] = FakeCollection(counter, self._layouts)
+        self._props['SelectionSets'] = FakeSelectionSets(self)
+        if application is not None:
+            self._props['Application'] = application
+
+    def _spaces(self):
+        """[(布局名称, 布局图块), ...], 包括模型空间"""
+        return [('Model', self._blocks['*Model_Space'])] + [(name, ly._props['Block'])
+                                                            for name, ly in self._layouts.items()]
+
+    def _new_handle(self):
+        self.__dict__['_next_handle'] += 1
+        return format(self._next_handle, 'X')
+
+    def add_layout(self, name) -> FakeLayout:
+        ly = FakeLayout(self, name)
+        self._layouts[name] = ly
+        self._blocks[ly._props['Block']._props['Name']] = ly._props['Block']
+        return ly
+
+    def add_block(self, name, attr_tags=(), entities=()) -> FakeBlock:
+        block = FakeBlock(self, name)
+        for tag in attr_tags:
+            block.add(FakeAttribute(self, tag, definition=True))
+        for e in entities:
+            block.add(e)
+        self._blocks[name] = block
+        return block
+
+    def block_ref(self, name, point=(0, 0, 0), attributes=None) -> FakeBlockReference:
+        return FakeBlockReference(self, name, point, attributes)
+
+    def entity(self, object_name='AcDbLine', **props) -> FakeEntity:
+        return FakeEntity(self, object_name, **props)
+
+    def HandleToObject(self, handle):
+        if handle not in self._handles:
+            raise key_not_found()
+        return self._handles[handle]
+
+    def Activate(self):
+        if self._application is not None:
+            self._application._props['ActiveDocument'] = self
+
+    def Save(self):
+        self._props['Saved'] = True
+
+    def __getattr__(self, item):
+        if self.__dict__.get('_closed'):
+            raise FakeComError(com_utils.RPC_E_DISCONNECTED,
+                               'The object invoked has disconnected from its clients.')
+        return super().__getattr__(item)
+
+    def Close(self, save=False):
+        if save:
+            self.Save()
+        if self._application is not None:
+            self._application._documents.remove(self)
+            self.__dict__['_closed'] = True
+
+    def Regen(self, where=0):
+        pass
+
+
+class FakeDocuments(FakeDispatch):
+    """模拟 AcadDocuments, Open 时调用应用的 loader 生成文档内容"""
+
+    def __init__(self, application):
+        super().__init__(application._counter)
+        self.__dict__['_application'] = application
+
+    def __getattr__(self, item):
+        if item == 'Count':
+            self._counter(item)
+            return len(self._application._documents)
+        return super().__getattr__(item)
+
+    def _items(self):
+        return self._application._documents
+
+    def Item(self, index):
+        return self._application._documents[index]
+
+    def Open(self, path, read_only=False):
+        app = self._application
+        if app._clock is not None:
+            app._clock.sleep(app.open_cost)
+        app.__dict__['opened'] += 1
+        doc = FakeDocument(path, self._counter, app)
+        doc._props['ReadOnly'] = read_only
+        if app.loader is not None:
+            app.loader(doc)
+        app._documents.append(doc)
+        doc.Activate()
+        return doc
+
+    def Add(self, template=''):
+        doc = FakeDocument('', self._counter, self._application)
+        doc._props['Name'] = f'Drawing{len(self._application._documents) + 1}.dwg'
+        self._application._documents.append(doc)
+        doc.Activate()
+        return doc
+
+
+class FakeAcadApplication(FakeDispatch):
+    """
+    模拟 AcadApplication
+
+    worker: 工作进程序号; open_cost: 打开文档耗时(秒), 使用 clock 模拟; loader: 打开文档时生成文档内容
+    """
+
+    def __init__(self, counter: CallCounter = None, worker=0, clock: FakeClock = None, open_cost=0.0, loader=None):
+        counter = counter or CallCounter()
+        super().__init__(counter, ActiveDocument=None, Visible=False)
+        self.__dict__.update(_documents=[], _clock=clock, worker=worker, open_cost=open_cost, loader=loader,
+                             opened=0, quit=False)
+        self._props['Documents'] = FakeDocuments(self)
+
+    def Quit(self):
+        self.__dict__['quit'] = True
+        self._documents.clear()
+
+
+def sample_document(counter: CallCounter = None, layouts=3, entities=50, full_name=r'C:\project\a.dwg'):
+    """
+    创建示例文档: 每个布局包含 entities 个普通图形和一个 signature 图签图块
+    """
+    doc = FakeDocument(full_name, counter)
+    doc.add_block('signature', attr_tags=('DWG_NO', 'NAME', 'DATE'))
+    for i in range(layouts):
+        ly = doc.add_layout(f'L{i}')
+        block = ly._props['Block']
+        for j in range(entities):
+            block.add(doc.entity(Layer=f'layer{j % 5}'))
+        block.add(doc.block_ref('signature', (i * 1000, 0, 0), {'DWG_NO': f'{i}', 'NAME': '', 'DATE': ''}))
+    return doc
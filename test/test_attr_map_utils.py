@@ -0,0 +1,89 @@
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+from src.attr_map_utils import ALWAYS, AUTO, AttrMapResolver, AttrMapStore, auto_match, signature
+
+
+class Test(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self._tmp.name, 'temp', 'attr_map.json')
+        self.prompts = []
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def prompt(self, tags, headers, initial):
+        self.prompts.append(dict(initial))
+        return {**initial, 'date': 'Date'}
+
+    def test_signature(self):
+        self.assertEqual(signature(['NAME', 'No'], ['b', 'a']), signature(['no', 'name', 'name'], ['a', 'b', 'a']))
+        self.assertNotEqual(signature(['name'], ['a']), signature(['name'], ['a', 'b']))
+
+    def test_header_case(self):
+        self.assertNotEqual(signature(['name'], ['Name']), signature(['name'], ['NAME']))
+        store = AttrMapStore(self.file)
+        store.put(['NAME'], ['Name'], {'name': 'Name'})
+        # 表头只有大小写变化时重新确认, 初始值使用当前的表头
+        self.assertIsNone(store.get(['NAME'], ['NAME']))
+        resolver = AttrMapResolver(AttrMapStore(self.file), prompt=lambda t, h, initial: initial)
+        self.assertEqual(resolver.resolve(['NAME'], ['NAME']), {'name': 'NAME'})
+
+    def test_auto_match(self):
+        tags = ['NAME', 'DWG_NO', 'Sub Project', 'SCALE']
+        headers = ['name', 'dwg no', 'sub_project', 'date']
+        self.assertEqual(auto_match(tags, headers), {'name': 'name', 'dwg_no': 'dwg no', 'sub project': 'sub_project'})
+        # 名称相同优先
+        self.assertEqual(auto_match(['dwg_no'], ['dwg no', 'DWG_NO']), {'dwg_no': 'DWG_NO'})
+
+    def test_prompt_once(self):
+        tags, headers = ['NAME', 'DATE'], ['name', 'Date', 'layout']
+        resolver = AttrMapResolver(AttrMapStore(self.file), prompt=self.prompt)
+        self.assertEqual(resolver.resolve(tags, headers), {'name': 'name', 'date': 'Date'})
+        self.assertEqual(self.prompts, [{'name': 'name', 'date': 'Date'}])
+        # 签名相同时使用保存的映射, 不再确认
+        resolver = AttrMapResolver(AttrMapStore(self.file), prompt=self.prompt)
+        self.assertEqual(resolver.resolve(['date', 'name'], ['layout', 'name', 'Date']), {'name': 'name', 'date': 'Date'})
+        self.assertEqual(len(self.prompts), 1)
+        # 表头变化时重新确认, 初始值保留上一次的映射
+        resolver.resolve(tags, headers + ['remark'])
+        self.assertEqual(len(self.prompts), 2)
+        self.assertEqual(self.prompts[-1], {'name': 'name', 'date': 'Date'})
+
+    def test_auto(self):
+        store = AttrMapStore(self.file)
+        store.put(['NAME'], ['title'], {'name': 'title'})
+        resolver = AttrMapResolver(AttrMapStore(self.file), AUTO, prompt=self.prompt)
+        self.assertEqual(resolver.resolve(['NAME'], ['title']), {'name': 'title'})
+        self.assertEqual(resolver.resolve(['NAME', 'DATE'], ['Name', 'date']), {'name': 'Name', 'date': 'date'})
+        # 不打开窗口, 自动匹配的结果不保存
+        self.assertEqual(self.prompts, [])
+        self.assertIsNone(AttrMapStore(self.file).get(['NAME', 'DATE'], ['Name', 'date']))
+
+    def test_always(self):
+        resolver = AttrMapResolver(AttrMapStore(self.file), ALWAYS, prompt=self.prompt)
+        resolver.resolve(['NAME'], ['name'])
+        resolver.resolve(['NAME'], ['name'])
+        self.assertEqual(len(self.prompts), 2)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            AttrMapResolver(AttrMapStore(), 'ask')
+        # 没有文件时只保存在内存中
+        store = AttrMapStore()
+        store.put(['a'], ['a'], {'a': 'a'})
+        self.assertEqual(store.get(['A'], ['a']), {'a': 'a'})
+        # 损坏的文件视为空
+        os.makedirs(os.path.dirname(self.file))
+        with open(self.file, 'w') as f:
+            f.write('{')
+        self.assertIsNone(AttrMapStore(self.file).get(['a'], ['a']))
+
+    def test_pickle(self):
+        resolver = AttrMapResolver(AttrMapStore(self.file), prompt=self.prompt)
+        other = pickle.loads(pickle.dumps(resolver))
+        self.assertIsNone(other._prompt)
+        self.assertEqual(other.mode, resolver.mode)
@@ -0,0 +1,106 @@
+from unittest import TestCase
+
+from src.attr_utils import SyncReport, normalize, plan, sync_block_attr, sync_snapshot_row
+from src.com_utils import ComContext, ComWrapper
+from src.snapshot_utils import LayoutSnapshot
+from test.fake_acad import CallCounter, FakeComError, FakeDispatch, sample_document
+
+
+def _modify_block_attr(block, kv_pair=None):
+    """原 modify_block_attr 的实现, 用于对比"""
+    if block.HasAttributes:
+        if kv_pair is None:
+            for attr in block.GetAttributes():
+                attr.TextString = ''
+        else:
+            KV = {k.upper(): v for k, v in kv_pair.items()}
+            for attr in [a for a in block.GetAttributes() if a.TagString.upper() in KV.keys()]:
+                attr.TextString = KV.get(attr.TagString.upper())
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.counter = CallCounter()
+        self.raw_doc = sample_document(self.counter, layouts=1, entities=5)
+        context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError))
+        self.doc = ComWrapper(self.raw_doc, context)
+        self.ly = self.doc.Layouts.Item('L0')
+        self.sig = [o for o in self.ly.Block if o.ObjectName == 'AcDbBlockReference'][0]
+
+    def _values(self):
+        return {a.TagString: a.TextString for a in self.sig.GetAttributes()}
+
+    def test_normalize(self):
+        self.assertEqual(normalize(None), '')
+        self.assertEqual(normalize(float('nan')), '')
+        self.assertEqual(normalize(3), '3')
+
+    def test_plan(self):
+        changes, unchanged, unknown = plan([('A', '1'), ('b', '2'), ('C', '3')], {'a': '1', 'B': 'x', 'D': '4'})
+        self.assertEqual([(i, c.tag, c.old, c.new) for i, c in changes], [(1, 'b', '2', 'x'), (2, 'C', '3', '')])
+        self.assertEqual(unchanged, 1)
+        self.assertEqual(unknown, ['D'])
+        changes, unchanged, _ = plan([('A', '1'), ('C', '3')], {'a': '2'}, blank_missing=False)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(unchanged, 1)
+
+    def test_sync(self):
+        report = sync_block_attr(self.sig, {'dwg_no': '0', 'name': 'plan'})
+        self.assertEqual(self._values(), {'DWG_NO': '0', 'NAME': 'plan', 'DATE': ''})
+        self.assertEqual([c.tag for c in report.changes], ['NAME'])
+        self.assertEqual(report.unchanged, 2)
+        self.assertEqual(report.handle, self.sig.Handle)
+
+        report = sync_block_attr(self.sig, {'DWG_NO': '0'})
+        self.assertEqual(self._values(), {'DWG_NO': '0', 'NAME': '', 'DATE': ''})
+        self.assertEqual(report.writes, 1)
+
+    def test_failed_report(self):
+        self.assertFalse(sync_block_attr(self.sig, {'DWG_NO': '0'}).failed)
+        report = SyncReport(error='L0: Key not found')
+        self.assertTrue(report.failed)
+        self.assertEqual(report.writes, 0)
+        self.assertIn('失败', str(report))
+
+    def test_same_result_as_modify_twice(self):
+        values = {'DWG_NO': '7', 'NAME': None, 'DATE': '2024'}
+        _modify_block_attr(self.sig)
+        _modify_block_attr(self.sig, {k: v or '' for k, v in values.items()})
+        expected = self._values()
+        sync_block_attr(self.sig, {'DWG_NO': '0'})
+        sync_block_attr(self.sig, values)
+        self.assertEqual(self._values(), expected)
+
+    def test_unchanged_block_zero_writes(self):
+        values = {'DWG_NO': '0', 'NAME': 'plan', 'DATE': '2024'}
+        sync_block_attr(self.sig, values)
+        self.counter.reset()
+        _modify_block_attr(self.sig)
+        _modify_block_attr(self.sig, values)
+        self.assertEqual(self.counter.counts['TextString'], 6)
+
+        self.counter.reset()
+        report = sync_block_attr(self.sig, values)
+        self.assertFalse(report.changed)
+        # GetAttributes + 3 个属性读取 TagString, TextString + Handle, 没有修改
+        self.assertEqual(self.counter.total, 1 + 3 * 2 + 1)
+        self.assertEqual(self.counter.counts['TextString'], 3)
+
+    def test_snapshot_row(self):
+        snapshot = LayoutSnapshot.capture(self.ly)
+        row = snapshot.block_refs('signature')[0]
+        self.counter.reset()
+        report = sync_snapshot_row(row, {'DWG_NO': '0'})
+        self.assertFalse(report.changed)
+        self.assertEqual(self.counter.total, 0)
+
+        report = sync_snapshot_row(row, {'DWG_NO': '1', 'NAME': 'plan'})
+        self.assertEqual(report.writes, 2)
+        self.assertEqual(row.attributes, {'DWG_NO': '1', 'NAME': 'plan', 'DATE': ''})
+        self.assertEqual(self._values(), row.attributes)
+
+        self.counter.reset()
+        sync_snapshot_row(row, None)
+        # HandleToObject + GetAttributes + 2 次修改
+        self.assertEqual(self.counter.total, 4)
+        self.assertEqual(self._values(), {'DWG_NO': '', 'NAME': '', 'DATE': ''})
@@ -0,0 +1,186 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.block_utils import BlockGraph, BlockGraphCache, TagSchemaCache
+from src.com_utils import ComContext, ComWrapper
+from test.fake_acad import CallCounter, FakeComError, FakeDispatch, FakeDocument, sample_document
+
+
+def _flatten(doc, block_obj):
+    """原 flatten_block_reference 的实现, 用于对比"""
+    res = [block_obj]
+    i = 0
+    while i < len(res):
+        b = doc.Blocks.Item(res[i].Name)
+        for j in range(b.Count):
+            if b.Item(j).ObjectName == 'AcDbBlockReference':
+                res.append(b.Item(j))
+        i += 1
+    return res
+
+
+def _furniture(counter, chairs=20):
+    """room 中有 chairs 个 chair 和 1 个 table, chair 有 4 个 leg, table 有 4 个 leg 和 1 个 chair"""
+    doc = FakeDocument(r'C:\project\furniture.dwg', counter)
+    doc.add_block('leg', entities=[doc.entity()])
+    doc.add_block('chair', entities=[doc.block_ref('leg') for _ in range(4)] + [doc.entity()])
+    doc.add_block('table', entities=[doc.block_ref('leg') for _ in range(4)] + [doc.block_ref('chair')])
+    doc.add_block('room', entities=[doc.block_ref('chair') for _ in range(chairs)] + [doc.block_ref('table')])
+    ref = doc.ModelSpace.add(doc.block_ref('room'))
+    return doc, ref
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.counter = CallCounter()
+        self.raw_doc, raw_ref = _furniture(self.counter)
+        context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError))
+        self.doc = ComWrapper(self.raw_doc, context)
+        self.ref = self.doc.HandleToObject(raw_ref._props['Handle'])
+
+    def test_same_result(self):
+        expected = [o.Handle for o in _flatten(self.doc, self.ref)]
+        graph = BlockGraph(self.doc)
+        actual = [o.Handle for o in graph.flatten(self.ref)]
+        self.assertEqual(actual, expected)
+        # room + 20 * (chair + 4 leg) + table + 4 leg + chair + 4 leg
+        self.assertEqual(len(actual), 1 + 20 * 5 + 1 + 4 + 5)
+        self.assertEqual(graph.expanded_count('room'), len(actual))
+        self.assertEqual(graph.visits, 4)
+
+    def test_com_calls(self):
+        self.counter.reset()
+        _flatten(self.doc, self.ref)
+        naive = self.counter.total
+
+        self.counter.reset()
+        graph = BlockGraph(self.doc)
+        graph.flatten(self.ref)
+        first = self.counter.total
+
+        self.counter.reset()
+        graph.flatten(self.ref)
+        again = self.counter.total
+        self.assertGreater(naive, 9 * first)
+        # room Name + 4 个定义各读取 Blocks, Item, Count + 32 个图形 Item, ObjectName + 30 个图块 Name
+        self.assertEqual(first, 1 + 4 * 3 + 2 * (21 + 5 + 5 + 1) + (21 + 4 + 5))
+        self.assertEqual(again, 1)  # 只读取最外层图块的 Name
+
+    def test_expanded_count_without_walk(self):
+        graph = BlockGraph(self.doc)
+        self.counter.reset()
+        self.assertEqual(graph.expanded_count('chair'), 5)
+        self.assertEqual(graph.expanded_count('room'), 111)
+        self.assertEqual(graph.visits, 4)
+        self.assertEqual(graph.definitions('table'), {'table', 'chair', 'leg'})
+        calls = self.counter.total
+        self.assertEqual(graph.expanded_count('room'), 111)
+        self.assertEqual(self.counter.total, calls)
+
+    def test_cycle(self):
+        a = self.raw_doc.add_block('a')
+        self.raw_doc.add_block('b', entities=[self.raw_doc.block_ref('a')])
+        a.add(self.raw_doc.block_ref('b'))
+        with self.assertRaises(ValueError):
+            BlockGraph(self.doc).expanded_count('a')
+
+    def test_cache_invalidation(self):
+        cache = BlockGraphCache()
+        graph = cache.get(self.doc)
+        self.assertIs(cache.get(self.doc), graph)
+        self.assertEqual(graph.expanded_count('chair'), 5)
+
+        # 新增图块定义, 指纹变化
+        self.raw_doc.add_block('stool', entities=[self.raw_doc.block_ref('leg')])
+        self.assertIsNot(cache.get(self.doc), graph)
+
+        # 重定义图块, 指纹不变, 需要手动清除
+        graph = cache.get(self.doc)
+        self.assertEqual(graph.expanded_count('chair'), 5)
+        self.raw_doc._blocks['chair'].add(self.raw_doc.block_ref('leg'))
+        self.assertEqual(cache.get(self.doc).expanded_count('chair'), 5)
+        cache.invalidate(self.doc)
+        self.assertEqual(cache.get(self.doc).expanded_count('chair'), 6)
+
+    def test_cache_per_instance(self):
+        cache = BlockGraphCache()
+        graph = cache.get(self.doc)
+        # 重新创建的实例中打开同一文件, 图块数量相同
+        other = ComWrapper(_furniture(self.counter)[0],
+                           ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError)))
+        self.assertIsNot(cache.get(other), graph)
+        self.assertIs(cache.get(self.doc), graph)
+        # 按文件路径清除所有实例中的缓存
+        cache.invalidate(self.raw_doc.FullName)
+        self.assertIsNot(cache.get(self.doc), graph)
+
+
+class TestTagSchemaCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dwg = os.path.join(self.tmp.name, 'a.dwg')
+        with open(self.dwg, 'wb') as f:
+            f.write(b'dwg')
+        self.cache_file = os.path.join(self.tmp.name, 'temp', 'attr_tags.json')
+        self.counter = CallCounter()
+        self.context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError))
+        self.raw_doc = sample_document(self.counter, layouts=1, entities=0, full_name=self.dwg)
+        self.doc = ComWrapper(self.raw_doc, self.context)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_memory(self):
+        cache = TagSchemaCache()
+        self.assertEqual(cache.get(self.doc, 'signature'), ['DWG_NO', 'NAME', 'DATE'])
+        self.counter.reset()
+        self.assertEqual(cache.get(self.doc, 'signature'), ['DWG_NO', 'NAME', 'DATE'])
+        # FullName + Blocks + Item + 指纹(Count, 首尾图形 Item, Handle)
+        self.assertEqual(self.counter.total, 3 + 5)
+        self.assertEqual(cache.report(), {'hits': 1, 'file_hits': 0, 'misses': 1})
+
+    def test_definition_changed(self):
+        cache = TagSchemaCache()
+        cache.get(self.doc, 'signature')
+        self.raw_doc.add_block('signature', attr_tags=('DWG_NO', 'SCALE'))
+        self.assertEqual(cache.get(self.doc, 'signature'), ['DWG_NO', 'SCALE'])
+        self.assertEqual(cache.misses, 2)
+
+    def test_file(self):
+        TagSchemaCache(self.cache_file).get(self.doc, 'signature')
+        self.assertTrue(os.path.isfile(self.cache_file))
+
+        # 下一次运行, 文件未修改时不读取图块定义
+        cache = TagSchemaCache(self.cache_file)
+        self.counter.reset()
+        self.assertEqual(cache.get(self.doc, 'signature'), ['DWG_NO', 'NAME', 'DATE'])
+        self.assertEqual(self.counter.counts, {'FullName': 1, 'Saved': 1})
+        self.assertEqual(cache.file_hits, 1)
+
+    def test_peek(self):
+        self.assertIsNone(TagSchemaCache(self.cache_file).peek(self.dwg, 'signature'))
+        TagSchemaCache(self.cache_file).get(self.doc, 'signature')
+        # 不打开文档, 只读取缓存文件
+        self.assertEqual(TagSchemaCache(self.cache_file).peek(self.dwg, 'signature'), ['DWG_NO', 'NAME', 'DATE'])
+        self.assertIsNone(TagSchemaCache(self.cache_file).peek(self.dwg, 'border'))
+        os.utime(self.dwg, (0, 1))
+        self.assertIsNone(TagSchemaCache(self.cache_file).peek(self.dwg, 'signature'))
+        self.assertIsNone(TagSchemaCache().peek(self.dwg, 'signature'))
+
+    def test_file_modified(self):
+        TagSchemaCache(self.cache_file).get(self.doc, 'signature')
+        self.raw_doc.add_block('signature', attr_tags=('DWG_NO',))
+        os.utime(self.dwg, (0, 1))
+        cache = TagSchemaCache(self.cache_file)
+        self.assertEqual(cache.get(self.doc, 'signature'), ['DWG_NO'])
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(TagSchemaCache(self.cache_file).get(self.doc, 'signature'), ['DWG_NO'])
+
+    def test_unsaved_document(self):
+        TagSchemaCache(self.cache_file).get(self.doc, 'signature')
+        self.raw_doc._props['Saved'] = False
+        cache = TagSchemaCache(self.cache_file)
+        cache.get(self.doc, 'signature')
+        self.assertEqual(cache.file_hits, 0)
+        self.assertEqual(cache.misses, 1)
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from src.build_utils import BuildGraph, value_digest
+
+
+class Test(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+        self.state = os.path.join(self.dir, 'build_graph.json')
+        self.dwg = self.write('a.dwg', b'dwg-1')
+        self.template = self.write('border.dwg', b'template-1')
+        self.pdf = self.write('a_L1.pdf', b'pdf')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def graph(self, rows=None, template=None, deps=False):
+        graph = BuildGraph(self.state)
+        rows = rows or {'L1': {'layout': 'L1', 'name': 'x'}}
+        graph.add('template', {'file': graph.file_input(template or self.template)})
+        graph.add('a', {'dwg': graph.file_input(self.dwg),
+                        **{f'row:{k}': v for k, v in rows.items()}},
+                  deps=['template'] if deps else (),
+                  outputs=[self.pdf])
+        return graph
+
+    def build(self, graph):
+        """模拟生成: 需要重新生成的目标修改 dwg 文件后记录"""
+        stale = graph.stale()
+        if 'a' in stale:
+            with open(self.dwg, 'ab') as f:
+                f.write(b'+')
+        graph.record(*graph.plan().keys())
+        graph.save()
+        return stale
+
+    def test_value_digest(self):
+        self.assertEqual(value_digest({'a': 1, 'b': [1, 2]}), value_digest({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(value_digest({'a': 1}), value_digest({'a': '1'}))
+        self.assertEqual(value_digest({'a': float('nan')}), value_digest({'a': float('nan')}))
+
+    def test_first_run(self):
+        plan = self.graph().plan()
+        self.assertEqual([d.reasons for d in plan.values()], [['新目标'], ['新目标']])
+
+    def test_unchanged(self):
+        self.build(self.graph())
+        # 记录的是生成后的 dwg 文件, 第二次运行全部跳过
+        self.assertEqual(self.build(self.graph()), [])
+        self.assertIn('0/2', self.graph().explain())
+
+    def test_input_changed(self):
+        self.build(self.graph())
+        graph = self.graph(rows={'L1': {'layout': 'L1', 'name': 'y'}, 'L2': {'layout': 'L2'}})
+        plan = graph.plan()
+        self.assertFalse(plan['template'].rebuild)
+        self.assertEqual(plan['a'].reasons, ['输入 row:L1 已修改', '新增输入 row:L2'])
+        graph = self.graph(rows={'L2': {'layout': 'L2'}})
+        self.assertIn('输入 row:L1 已删除', graph.plan()['a'].reasons)
+
+    def test_file_changed(self):
+        self.build(self.graph())
+        with open(self.dwg, 'ab') as f:
+            f.write(b'edited')
+        self.assertEqual(self.graph().stale(), ['a'])
+
+    def test_output_missing(self):
+        self.build(self.graph())
+        os.remove(self.pdf)
+        plan = self.graph().plan()
+        self.assertEqual(plan['a'].reasons, [f'输出 {self.pdf} 不存在'])
+
+    def test_deps(self):
+        self.build(self.graph(deps=True))
+        self.write('border.dwg', b'template-2')
+        plan = self.graph(deps=True).plan()
+        # 依赖的目标在前
+        self.assertEqual(list(plan), ['template', 'a'])
+        self.assertEqual(plan['a'].reasons, ['依赖 template 需要重新生成'])
+        self.assertIn('a: 依赖 template 需要重新生成', self.graph(deps=True).explain(plan))
+
+    def test_dep_rebuilt_separately(self):
+        self.build(self.graph(deps=True))
+        # 依赖的目标在另一次运行中单独重新生成
+        graph = self.graph(deps=True)
+        graph.record('template')
+        graph.save()
+        self.assertEqual(self.graph(deps=True).plan()['a'].reasons, ['依赖 template 已更新'])
+
+    def test_cycle(self):
+        graph = BuildGraph()
+        graph.add('a', {}, deps=['b'])
+        graph.add('b', {}, deps=['a'])
+        with self.assertRaises(ValueError):
+            graph.plan()
+
+    def test_not_recorded(self):
+        graph = self.graph()
+        graph.record('template')
+        graph.save()
+        self.assertEqual(self.graph().stale(), ['a'])
+        graph = self.graph()
+        self.build(graph)
+        graph.forget('a')
+        graph.save()
+        self.assertEqual(self.graph().stale(), ['a'])
+
+    def test_state_file(self):
+        self.build(self.graph())
+        with open(self.state, encoding='utf-8') as f:
+            state = json.load(f)
+        self.assertEqual(set(state['targets']), {'template', 'a'})
+        self.assertEqual(set(state['targets']['a']['inputs']), {'dwg', 'row:L1'})
+        # 损坏的记录文件视为首次运行
+        self.write('build_graph.json', b'{')
+        self.assertEqual(len(self.graph().stale()), 2)
+
+    def test_file_digest_memo(self):
+        calls = []
+        graph = BuildGraph(digest=lambda p: calls.append(p) or 'd')
+        graph.add('a', {'dwg': graph.file_input(self.dwg)})
+        graph.add('b', {'dwg': graph.file_input(self.dwg), 'missing': graph.file_input(self.dwg + '.x')})
+        graph.plan()
+        graph.record('a', 'b')
+        self.assertEqual(calls, [self.dwg])
@@ -0,0 +1,455 @@
+import configparser
+import threading
+from types import SimpleNamespace
+from unittest import TestCase
+
+from src import com_utils
+from test.fake_acad import (CallCounter, FakeClock, FakeComError, FakeDispatch, SimulatedApplication,
+                            sample_document)
+from test.fake_acad import key_not_found as _key_not_found
+from src.com_utils import (TRANSIENT, PERMANENT, UNKNOWN, CircuitBreaker, ComContext, ComMethod, ComWrapper,
+                           InstanceUnhealthyError, PropertyCache, RetryPolicy, RetryStats, call_with_retry,
+                           classify, get_hresult)
+
+
+class FakeComObject:
+    """按脚本依次抛出 HRESULT 的 COM 对象"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+
+    def Item(self, name):
+        self.calls += 1
+        if self.script:
+            err = self.script.pop(0)
+            if err is not None:
+                raise err
+        return name
+
+    def __getattr__(self, item):
+        # 模拟 win32com: GetIDsOfNames 失败时转换为 AttributeError
+        try:
+            raise FakeComError(com_utils.DISP_E_UNKNOWNNAME, 'Unknown name.')
+        except FakeComError:
+            raise AttributeError(item)
+
+
+_POLICIES = {
+    TRANSIENT: RetryPolicy(retries=5, delay=0),
+    PERMANENT: RetryPolicy(retries=1, delay=0),
+    UNKNOWN: RetryPolicy(retries=3, delay=0),
+}
+
+
+def _call(obj, *args, **kwargs):
+    return call_with_retry(obj.Item, *args, errors=(AttributeError, FakeComError), policies=_POLICIES,
+                           **kwargs)
+
+
+class _LateBound:
+    """模拟 late-bound CDispatch: Python 类型相同, 接口 IID 保存在 _olerepr_.clsid"""
+
+    def __init__(self, iid, **attrs):
+        self.__dict__['_olerepr_'] = SimpleNamespace(clsid=iid)
+        self.__dict__['_attrs'] = attrs
+
+    def __getattr__(self, item):
+        try:
+            return self.__dict__['_attrs'][item]
+        except KeyError:
+            raise AttributeError(item)
+
+
+class Test(TestCase):
+    def test_get_hresult(self):
+        self.assertEqual(get_hresult(FakeComError(0x80010001)), com_utils.RPC_E_CALL_REJECTED)
+        self.assertEqual(get_hresult(_key_not_found()), com_utils.ACAD_E_KEY_NOT_FOUND)
+        self.assertIsNone(get_hresult(ValueError('x')))
+
+    def test_classify(self):
+        self.assertEqual(classify(FakeComError(com_utils.RPC_E_CALL_REJECTED)), TRANSIENT)
+        self.assertEqual(classify(FakeComError(com_utils.RPC_E_SERVERCALL_RETRYLATER)), TRANSIENT)
+        self.assertEqual(classify(FakeComError(com_utils.E_INVALIDARG)), PERMANENT)
+        self.assertEqual(classify(FakeComError(com_utils.DISP_E_MEMBERNOTFOUND)), PERMANENT)
+        self.assertEqual(classify(_key_not_found()), PERMANENT)
+        self.assertEqual(classify(FakeComError(-1)), UNKNOWN)
+        self.assertEqual(classify(AttributeError('Foo')), PERMANENT)
+
+    def test_load_retry_policies(self):
+        parser = configparser.ConfigParser()
+        parser.read_string('[com]\ntransient_retries = 3\nunknown_delay = 0.5\n')
+        default = (com_utils.RETRY_POLICIES[TRANSIENT].retries, com_utils.RETRY_POLICIES[UNKNOWN].delay)
+        policies = com_utils.load_retry_policies(parser['com'])
+        self.assertEqual((policies[TRANSIENT].retries, policies[UNKNOWN].delay), (3, 0.5))
+        self.assertEqual(policies[PERMANENT], com_utils.RETRY_POLICIES[PERMANENT])
+        # 不修改默认策略
+        self.assertEqual((com_utils.RETRY_POLICIES[TRANSIENT].retries, com_utils.RETRY_POLICIES[UNKNOWN].delay),
+                         default)
+        self.assertIsNot(policies[PERMANENT], com_utils.RETRY_POLICIES[PERMANENT])
+        parser.read_string('[com]\ntransient_retries = x\n')
+        with self.assertRaises(ValueError):
+            com_utils.load_retry_policies(parser['com'])
+
+    def test_classify_attribute_error_from_busy_application(self):
+        try:
+            try:
+                raise FakeComError(com_utils.RPC_E_CALL_REJECTED)
+            except FakeComError:
+                raise AttributeError('Name')
+        except AttributeError as e:
+            self.assertEqual(classify(e), TRANSIENT)
+
+    def test_transient_retry(self):
+        obj = FakeComObject([FakeComError(com_utils.RPC_E_CALL_REJECTED)] * 3)
+        self.assertEqual(_call(obj, 'layout'), 'layout')
+        self.assertEqual(obj.calls, 4)
+
+    def test_transient_exhausted(self):
+        obj = FakeComObject([FakeComError(com_utils.RPC_E_SERVERCALL_RETRYLATER)] * 10)
+        with self.assertRaises(FakeComError):
+            _call(obj, 'layout')
+        self.assertEqual(obj.calls, 5)
+
+    def test_permanent_fail_fast(self):
+        obj = FakeComObject([_key_not_found()])
+        with self.assertRaises(FakeComError):
+            _call(obj, 'missing')
+        self.assertEqual(obj.calls, 1)
+
+        obj = FakeComObject([FakeComError(com_utils.E_INVALIDARG)])
+        with self.assertRaises(FakeComError):
+            _call(obj, 'missing')
+        self.assertEqual(obj.calls, 1)
+
+    def test_unknown_member_fail_fast(self):
+        obj = FakeComObject([])
+        with self.assertRaises(AttributeError):
+            call_with_retry(getattr, obj, 'Nmae', errors=(AttributeError, FakeComError),
+                            policies=_POLICIES)
+
+    def test_unknown_policy(self):
+        obj = FakeComObject([FakeComError(-1)] * 10)
+        with self.assertRaises(FakeComError):
+            _call(obj, 'layout')
+        self.assertEqual(obj.calls, 3)
+
+    def test_errors_not_handled(self):
+        obj = FakeComObject([ValueError('x')])
+        with self.assertRaises(ValueError):
+            _call(obj, 'layout')
+        self.assertEqual(obj.calls, 1)
+
+    def test_backoff(self):
+        policy = RetryPolicy(retries=10, delay=0.1, factor=2, max_delay=1, jitter=0.5)
+        for attempt, upper in ((1, 0.1), (2, 0.2), (3, 0.4), (4, 0.8), (5, 1), (9, 1)):
+            for _ in range(20):
+                _delay = policy.backoff(attempt)
+                self.assertLessEqual(_delay, upper + 1e-9)
+                self.assertGreaterEqual(_delay, upper * 0.5 - 1e-9)
+
+    def test_stats(self):
+        stats = RetryStats()
+        slept = []
+        obj = FakeComObject([FakeComError(com_utils.RPC_E_CALL_REJECTED)] * 3)
+        policies = dict(_POLICIES)
+        policies[TRANSIENT] = RetryPolicy(retries=5, delay=0.1, factor=2, max_delay=1, jitter=0)
+        call_with_retry(obj.Item, 'a', errors=(FakeComError,), policies=policies, stats=stats,
+                        sleep=slept.append)
+        self.assertEqual(slept, [0.1, 0.2, 0.4])
+        self.assertEqual(stats.calls, 1)
+        self.assertEqual(stats.retries, 3)
+        self.assertAlmostEqual(stats.sleep_time, 0.7)
+        self.assertEqual(stats.errors[TRANSIENT], 3)
+        self.assertEqual(stats.failures, 0)
+
+
+class FakeApplication:
+    """被模态对话框卡住的应用: 所有调用都被拒绝, 直到 hung = False"""
+
+    def __init__(self):
+        self.hung = True
+        self.calls = 0
+
+    def __getattr__(self, item):
+        # ComWrapper 通过 __getattr__ 访问所有成员, 与 CDispatch 一致
+        self.calls += 1
+        if self.hung:
+            raise FakeComError(com_utils.RPC_E_CALL_REJECTED)
+        if item == 'GetKey':
+            return self._get_key
+        return item
+
+    @staticmethod
+    def _get_key(key):
+        raise _key_not_found()
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.raw = FakeApplication()
+        self.context = ComContext('FakeApp',
+                                  dispatch_types=(FakeApplication,),
+                                  errors=(AttributeError, FakeComError),
+                                  policies=_POLICIES,
+                                  breaker=CircuitBreaker(threshold=2, reset_timeout=10, clock=self.clock),
+                                  sleep=self.clock.sleep)
+        self.app = ComWrapper(self.raw, self.context)
+
+    def test_trip_and_reject(self):
+        for _ in range(2):
+            with self.assertRaises(FakeComError):
+                self.app.Name
+        self.assertFalse(self.context.healthy)
+        self.assertEqual(self.context.breaker.state, CircuitBreaker.OPEN)
+        calls = self.raw.calls
+        with self.assertRaises(InstanceUnhealthyError):
+            self.app.Name
+        self.assertEqual(self.raw.calls, calls)
+        stats = self.context.stats.as_dict()
+        self.assertEqual(stats['breaker_trips'], 1)
+        self.assertEqual(stats['rejected'], 1)
+        self.assertEqual(stats['failures'], 2)
+        self.assertEqual(stats['retries'], 8)
+
+    def test_half_open_recover(self):
+        for _ in range(2):
+            with self.assertRaises(FakeComError):
+                self.app.Name
+        self.clock.now += 10
+        self.assertEqual(self.context.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.raw.hung = False
+        self.assertEqual(self.app.Name, 'Name')
+        self.assertEqual(self.context.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_fail(self):
+        for _ in range(2):
+            with self.assertRaises(FakeComError):
+                self.app.Name
+        self.clock.now += 10
+        with self.assertRaises(FakeComError):
+            self.app.Name
+        self.assertEqual(self.context.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.context.stats.breaker_trips, 2)
+
+    def test_half_open_single_trial(self):
+        for _ in range(2):
+            with self.assertRaises(FakeComError):
+                self.app.Name
+        self.clock.now += 10
+        breaker = self.context.breaker
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.healthy)
+        # 试探结束前其他线程的调用被拒绝
+        errors = []
+
+        def call():
+            try:
+                self.app.Name
+            except InstanceUnhealthyError as e:
+                errors.append(e)
+
+        calls = self.raw.calls
+        thread = threading.Thread(target=call)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(self.raw.calls, calls)
+        # 试探未得出结果时结束试探, 下一个调用重新试探
+        breaker.release()
+        self.assertTrue(breaker.healthy)
+        self.raw.hung = False
+        self.assertEqual(self.app.Name, 'Name')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_permanent_error_keeps_breaker_closed(self):
+        self.raw.hung = False
+        for _ in range(5):
+            with self.assertRaises(FakeComError):
+                self.app.GetKey('missing')
+        self.assertTrue(self.context.healthy)
+        self.assertEqual(self.context.stats.retries, 0)
+
+
+class TestQuiescence(TestCase):
+    """在脚本化的忙碌时段内比较 重试 与 等待空闲 两种调用方式"""
+    POLICIES = {
+        TRANSIENT: RetryPolicy(retries=20, delay=0.05, factor=2, max_delay=0.4, jitter=0),
+        PERMANENT: RetryPolicy(retries=1, delay=0),
+        UNKNOWN: RetryPolicy(retries=3, delay=0),
+    }
+
+    def _run(self, quiescent: bool, busy=(), busy_after=None):
+        clock = FakeClock()
+        raw = SimulatedApplication(clock, busy=busy, busy_after=busy_after, call_cost=0.01)
+        context = ComContext('SimApp',
+                             dispatch_types=(SimulatedApplication,),
+                             errors=(AttributeError, FakeComError),
+                             policies=self.POLICIES,
+                             quiescent=quiescent,
+                             poll_interval=0.02,
+                             clock=clock,
+                             sleep=clock.sleep)
+        context.bind(raw)
+        app = ComWrapper(raw, context)
+        for i in range(300):
+            app.Caption = str(i)
+            if i % 20 == 0:
+                app.Regen(1)
+        return clock.now, raw, context.stats
+
+    def test_quiescent_dispatch(self):
+        elapsed, raw, stats = self._run(quiescent=True, busy=[(0, 0.5)], busy_after={'Regen': 0.3})
+        self.assertEqual(raw.rejected, 0)
+        self.assertEqual(stats.retries, 0)
+        self.assertEqual(stats.waits, 16)
+        self.assertEqual(raw.values['Caption'], '299')
+
+    def test_compare_with_retry(self):
+        busy_after = {'Regen': 0.3}
+        retry_elapsed, retry_raw, retry_stats = self._run(quiescent=False, busy_after=busy_after)
+        wait_elapsed, wait_raw, wait_stats = self._run(quiescent=True, busy_after=busy_after)
+        self.assertGreater(retry_raw.rejected, 0)
+        self.assertGreater(retry_stats.retries, 0)
+        self.assertEqual(wait_raw.rejected, 0)
+        self.assertLess(wait_elapsed, retry_elapsed)
+
+    def test_read_only_method_not_gated(self):
+        clock = FakeClock()
+        raw = SimulatedApplication(clock)
+        context = ComContext(dispatch_types=(SimulatedApplication,), quiescent=True, clock=clock,
+                             sleep=clock.sleep)
+        context.bind(raw)
+        app = ComWrapper(raw, context)
+        app.GetAcadState()
+        self.assertEqual(context.stats.polls, 0)
+        app.Regen(1)
+        self.assertEqual(context.stats.polls, 1)
+
+
+def _scan(ly, name):
+    """与 acad_utils.get_block_ref_from_layout 相同的遍历方式"""
+    return [obj for obj in ly.Block if obj.ObjectName == 'AcDbBlockReference' and obj.Name == name]
+
+
+class TestPropertyCache(TestCase):
+    def setUp(self):
+        self.counter = CallCounter()
+        self.raw_doc = sample_document(self.counter, layouts=2, entities=50)
+
+    def _app(self, cache=None, identity_map=False):
+        context = ComContext('FakeApp',
+                             dispatch_types=(FakeDispatch,),
+                             errors=(AttributeError, FakeComError),
+                             policies=_POLICIES,
+                             cache=cache,
+                             identity_map=identity_map)
+        return ComWrapper(FakeDispatch(self.counter, ActiveDocument=self.raw_doc), context), context
+
+    def test_without_cache(self):
+        app, context = self._app()
+        ly = app.ActiveDocument.Layouts.Item('L0')
+        for _ in range(2):
+            self.assertEqual(len(_scan(ly, 'signature')), 1)
+        self.assertEqual(self.counter.counts['ObjectName'], 102)
+        self.assertNotIn('Handle', self.counter.counts)
+
+    def test_cache_hits(self):
+        app, context = self._app(PropertyCache())
+        doc = app.ActiveDocument
+        self.assertEqual(doc._doc, r'C:\project\a.dwg')
+        ly = doc.Layouts.Item('L0')
+        for _ in range(3):
+            self.assertEqual(len(_scan(ly, 'signature')), 1)
+        self.assertEqual(self.counter.counts['ObjectName'], 51)
+        self.assertEqual(self.counter.counts['Name'], 1)
+        report = context.cache.report()
+        self.assertEqual(report['ObjectName'], {'hits': 102, 'misses': 51, 'hit_rate': 0.667})
+
+    def test_write_bumps_epoch(self):
+        app, context = self._app(PropertyCache())
+        doc = app.ActiveDocument
+        ly = doc.Layouts.Item('L0')
+        b = _scan(ly, 'signature')[0]
+        epoch = context.cache.epoch(doc._doc)
+        b.Layer = 'signature'
+        self.assertEqual(context.cache.epoch(doc._doc), epoch + 1)
+        _scan(ly, 'signature')
+        self.assertEqual(self.counter.counts['ObjectName'], 102)
+        # 非只读方法同样使缓存失效, 只读方法不影响
+        b.GetAttributes()
+        self.assertEqual(context.cache.epoch(doc._doc), epoch + 1)
+        ly.Block.InsertBlock((0, 0, 0), 'signature', 1, 1, 1, 0)
+        self.assertEqual(context.cache.epoch(doc._doc), epoch + 2)
+
+    def test_invalidate(self):
+        app, context = self._app(PropertyCache())
+        doc = app.ActiveDocument
+        ly = doc.Layouts.Item('L1')
+        _scan(ly, 'signature')
+        context.invalidate(doc)
+        _scan(ly, 'signature')
+        self.assertEqual(self.counter.counts['ObjectName'], 102)
+
+    def test_property_not_cacheable(self):
+        app, context = self._app(PropertyCache(['ObjectName']))
+        ly = app.ActiveDocument.Layouts.Item('L0')
+        for _ in range(2):
+            _scan(ly, 'signature')
+        self.assertEqual(self.counter.counts['ObjectName'], 51)
+        self.assertEqual(self.counter.counts['Name'], 2)
+
+
+class TestIdentityMap(TestPropertyCache):
+    def test_slots(self):
+        app, context = self._app()
+        doc = app.ActiveDocument
+        self.assertFalse(hasattr(doc, '__dict__'))
+        self.assertIsInstance(doc.Layouts.Item, ComMethod)
+
+    def test_method_reuse(self):
+        app, context = self._app()
+        block = app.ActiveDocument.Layouts.Item('L0').Block
+        self.assertIs(block.Item, block.Item)
+        self.assertEqual(block.Item(0).ObjectName, 'AcDbLine')
+        self.assertIn('Item', context._type_methods[type(block._wrapped_object)])
+
+    def test_method_cache_per_interface(self):
+        # late-bound 对象的 Python 类型相同, 按接口 IID 区分同名的方法和属性
+        context = ComContext(dispatch_types=(_LateBound,))
+        a = ComWrapper(_LateBound('A', Value=lambda: 1), context)
+        b = ComWrapper(_LateBound('B', Value=2), context)
+        self.assertEqual(a.Value(), 1)
+        self.assertEqual(b.Value, 2)
+        self.assertEqual(dict(context._type_methods), {'A': {'Value'}})
+        # 没有类型信息时不记录
+        c = ComWrapper(_LateBound(None, Value=lambda: 3), context)
+        self.assertEqual(c.Value(), 3)
+        self.assertNotIn(None, context._type_methods)
+
+    def test_same_entity_same_wrapper(self):
+        app, context = self._app(identity_map=True)
+        block = app.ActiveDocument.Layouts.Item('L0').Block
+        first = list(block)
+        second = [block.Item(i) for i in range(block.Count)]
+        self.assertEqual(len(first), 51)
+        for a, b in zip(first, second):
+            self.assertIs(a, b)
+        # 每次获取图形都需要读取 Handle 才能找到已有的 ComWrapper, Layouts、布局与图块各一次
+        self.assertEqual(self.counter.counts['Handle'], 51 * 2 + 3)
+
+    def test_identity_map_with_cache(self):
+        app, context = self._app(PropertyCache(), identity_map=True)
+        ly = app.ActiveDocument.Layouts.Item('L0')
+        for _ in range(3):
+            _scan(ly, 'signature')
+        self.assertEqual(self.counter.counts['Handle'], (51 + 1) * 3 + 2)
+        self.assertEqual(self.counter.counts['ObjectName'], 51)
+        self.assertEqual(self.counter.counts['Name'], 1)
+
+    def test_identity_map_is_weak(self):
+        app, context = self._app(identity_map=True)
+        block = app.ActiveDocument.Layouts.Item('L0').Block
+        list(block)
+        self.assertLessEqual(sum(len(v) for v in context.identity.values()), 3)
@@ -0,0 +1,212 @@
+import os
+from unittest import TestCase
+
+from src.com_utils import ComContext, ComWrapper
+from src.document_utils import DocumentCache, DocumentRegistry, normalize_path
+from test.fake_acad import CallCounter, FakeAcadApplication, FakeComError, FakeDispatch, FakeDocument
+
+FILES = [rf'C:\Project\Arch\{i:02d}.dwg' for i in range(40)]
+
+
+class _SaveFailedDocument(FakeDocument):
+    """保存失败的文档"""
+
+    def Close(self, save=False):
+        raise FakeComError(-2147352567, 'Exception occurred.')
+
+
+def _open_file(app, file):
+    """原 open_file 的实现, 用于对比"""
+    for doc in app.Documents:
+        if file.casefold() == doc.FullName.casefold() and not doc.ReadOnly:
+            doc.Activate()
+            return doc
+    return app.Documents.Open(file)
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.counter = CallCounter()
+        self.raw_app = FakeAcadApplication(self.counter)
+        context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError))
+        self.app = ComWrapper(self.raw_app, context)
+        self.registry = DocumentRegistry(self.app)
+
+    def test_normalize_path(self):
+        self.assertEqual(normalize_path(r'C:/Project/Arch/../Arch/A.DWG'), r'c:\project\arch\a.dwg')
+        self.assertEqual(normalize_path(r'c:\project\arch\a.dwg'), normalize_path(r'C:\PROJECT\ARCH\A.dwg'))
+        self.assertTrue(normalize_path('a.dwg').endswith('a.dwg'))
+
+    def test_open_once(self):
+        doc = self.registry.open(FILES[0])
+        self.assertIs(self.registry.open(FILES[0].upper().replace('\\', '/')), doc)
+        self.assertEqual(self.raw_app.opened, 1)
+        self.assertEqual(self.registry.report(), {'documents': 1, 'hits': 1, 'misses': 1, 'rebuilds': 1})
+
+    def test_com_calls(self):
+        for f in FILES:
+            self.raw_app.Documents.Open(f)
+        self.counter.reset()
+        _open_file(self.app, FILES[-1])
+        linear = self.counter.total
+
+        self.registry.open(FILES[0])  # 建立索引
+        self.counter.reset()
+        self.registry.open(FILES[-1])
+        indexed = self.counter.total
+        # 遍历: Documents + 40 次 __getitem__ + 40 次 FullName + ReadOnly + Activate
+        self.assertEqual(linear, 1 + 40 + 40 + 1 + 1)
+        # 索引: FullName 验证 + Activate
+        self.assertEqual(indexed, 2)
+        self.assertEqual(self.raw_app.opened, 40)
+
+    def test_read_only_not_reused(self):
+        self.raw_app.Documents.Open(FILES[0], True)
+        doc = self.registry.open(FILES[0])
+        self.assertFalse(doc.ReadOnly)
+        self.assertEqual(self.raw_app.opened, 2)
+        self.assertIs(self.registry.open(FILES[0]), doc)
+
+    def test_close(self):
+        doc = self.registry.open(FILES[0])
+        self.registry.close(doc, True)
+        self.assertEqual(len(self.registry), 0)
+        self.assertEqual(self.raw_app.Documents.Count, 0)
+        self.registry.open(FILES[0])
+        self.assertEqual(self.raw_app.opened, 2)
+        self.assertEqual(self.registry.rebuilds, 1)
+
+    def test_close_unregistered(self):
+        doc = self.registry.open(FILES[0])
+        self.registry.close(doc)
+        # 已关闭或未登记的文档不改变数量
+        other = self.raw_app.Documents.Open(FILES[1])
+        self.registry.unregister(FILES[1])
+        self.registry.close(ComWrapper(other, self.app._context))
+        self.assertEqual(self.registry._count, 0)
+        self.assertIs(self.registry.open(FILES[2]), self.registry.find(FILES[2]))
+        self.assertEqual(self.registry._count, 1)
+        self.assertEqual(self.registry.rebuilds, 1)
+
+    def test_on_close(self):
+        closed = []
+        registry = DocumentRegistry(self.app, on_close=lambda d: closed.append(d.FullName))
+        cache = DocumentCache(registry, size=1, sizeof=lambda f: 0)
+        cache.open(FILES[0])
+        cache.open(FILES[1])  # 淘汰 FILES[0]
+        registry.close(registry.open(FILES[2]))
+        cache.close_all()
+        # 关闭前调用, 文档仍然可以访问
+        self.assertEqual(closed, [FILES[0], FILES[2], FILES[1]])
+
+    def test_closed_in_ui(self):
+        doc = self.registry.open(FILES[0])
+        self.registry.open(FILES[1])
+        self.raw_app._documents[0].Close()  # 在 AutoCAD 界面中关闭
+        doc2 = self.registry.open(FILES[0])
+        self.assertIsNot(doc2, doc)
+        self.assertEqual(self.raw_app.opened, 3)
+        self.assertEqual(self.registry.rebuilds, 2)
+
+    def test_opened_in_ui(self):
+        self.registry.open(FILES[0])
+        self.raw_app.Documents.Open(FILES[1])  # 在 AutoCAD 界面中打开
+        self.registry.open(FILES[1])
+        self.assertEqual(self.raw_app.opened, 2)
+        self.assertEqual(self.registry.rebuilds, 2)
+        # 数量一致时不重新建立索引
+        self.registry.open(FILES[2])
+        self.assertEqual(self.registry.rebuilds, 2)
+
+    def test_unsaved_document(self):
+        self.raw_app.Documents.Add()
+        self.registry.open(FILES[0])
+        self.registry.open(FILES[1])
+        self.assertEqual(self.registry.rebuilds, 1)
+        self.assertEqual(len(self.registry), 2)
+
+    def test_relative_path(self):
+        doc = self.registry.open('a.dwg')
+        self.assertEqual(doc.FullName, os.path.abspath('a.dwg'))
+        self.assertIs(self.registry.find(os.path.abspath('a.dwg')), doc)
+
+    def test_cache_reuse(self):
+        with DocumentCache(self.registry, size=2, sizeof=lambda f: 0) as cache:
+            doc = cache.open(FILES[0])
+            cache.open(FILES[1])
+            self.assertIs(cache.open(FILES[0].lower()), doc)
+            self.assertEqual(self.raw_app.opened, 2)
+            self.assertEqual(self.raw_app.Documents.Count, 2)
+        # 运行结束时保存并关闭
+        self.assertEqual(self.raw_app.Documents.Count, 0)
+        self.assertTrue(doc._wrapped_object._props['Saved'])
+        self.assertEqual(cache.stats.as_dict(),
+                         {'hits': 1, 'misses': 2, 'evictions': 0, 'closed': 2, 'hit_rate': 0.333})
+
+    def test_cache_evict_lru(self):
+        cache = DocumentCache(self.registry, size=2, sizeof=lambda f: 0)
+        docs = [cache.open(f) for f in FILES[:2]]
+        cache.open(FILES[0])  # FILES[1] 成为最久未使用
+        cache.open(FILES[2])
+        self.assertNotIn(FILES[1], cache)
+        self.assertIn(FILES[0], cache)
+        self.assertTrue(docs[1]._wrapped_object._props['Saved'])
+        self.assertEqual(self.raw_app.Documents.Count, 2)
+        self.assertEqual(len(self.registry), 2)
+        # 被关闭的文件重新打开
+        cache.open(FILES[1])
+        self.assertEqual(self.raw_app.opened, 4)
+        self.assertEqual(cache.stats.evictions, 2)
+
+    def test_cache_memory_limit(self):
+        sizes = {FILES[0]: 30, FILES[1]: 50, FILES[2]: 10}
+        cache = DocumentCache(self.registry, size=10, max_memory=60, sizeof=lambda f: sizes[f] * 1024 * 1024)
+        cache.open(FILES[0])
+        cache.open(FILES[1])
+        self.assertNotIn(FILES[0], cache)
+        cache.open(FILES[2])
+        self.assertEqual(len(cache), 2)
+        self.assertAlmostEqual(cache.memory, 60)
+        # 单个文件超出上限时仍然保持打开
+        cache.max_memory = 1
+        cache.open(FILES[1])
+        self.assertEqual(len(cache), 1)
+
+    def test_cache_closed_in_ui(self):
+        cache = DocumentCache(self.registry, size=4, sizeof=lambda f: 0)
+        doc = cache.open(FILES[0])
+        doc.Close()  # 在 AutoCAD 界面中关闭
+        self.assertIsNot(cache.open(FILES[0]), doc)
+        self.assertEqual(cache.stats.misses, 2)
+        cache.close_all()
+        self.assertEqual(self.raw_app.Documents.Count, 0)
+
+    def test_cache_stats_per_run(self):
+        cache = DocumentCache(self.registry, size=4, sizeof=lambda f: 0)
+        for f in FILES[:3] * 2:
+            cache.open(f)
+        cache.close_all()
+        first = cache.reset_stats()
+        self.assertEqual((first.hits, first.misses, first.closed), (3, 3, 3))
+        cache.open(FILES[0])
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (0, 1))
+
+    def test_cache_save_failed(self):
+        cache = DocumentCache(self.registry, size=4, sizeof=lambda f: 0)
+        docs = [cache.open(f) for f in FILES[:3]]
+        object.__setattr__(docs[1]._wrapped_object, '__class__', _SaveFailedDocument)
+        # 其他文档仍然保存并关闭, 抛出保存失败的异常
+        with self.assertRaises(FakeComError):
+            cache.close_all()
+        self.assertEqual(len(cache), 0)
+        self.assertTrue(cache.stats.is_saved(FILES[0].lower()))
+        self.assertTrue(cache.stats.is_saved(FILES[2]))
+        self.assertFalse(cache.stats.is_saved(FILES[1]))
+        self.assertEqual(list(cache.stats.failed), [normalize_path(FILES[1])])
+        self.assertEqual(cache.stats.closed, 2)
+        # 单独关闭时同样抛出异常
+        doc = cache.open(FILES[3])
+        object.__setattr__(doc._wrapped_object, '__class__', _SaveFailedDocument)
+        with self.assertRaises(FakeComError):
+            cache.close(FILES[3])
+        self.assertFalse(cache.stats.is_saved(FILES[3]))
@@ -0,0 +1,188 @@
+import datetime
+import math
+import os
+import tempfile
+from unittest import TestCase
+
+from src import excel_utils
+from src.excel_utils import WorkbookCache, group_records, read_records, read_sheets
+
+WORKBOOK = {
+    '子项1': [
+        ('File', 'Layout', 'Name', None, 'Name', 'Unused', None),
+        ('a.dwg', 'L1', '图名1', 'x', 'n2', 1.0, None),
+        ('a.dwg', None, '图名2', None, None, 2.5),
+        (None, None, None, None, None, None, None),
+        ('b.dwg', 'L3', 'NA', 3, '', datetime.datetime(2022, 1, 2)),
+        (None, None, None),
+        (None,),
+    ],
+    '子项2': [
+        ('file', 'layout', 'name'),
+        ('a.dwg', 'L4', '图名4'),
+    ],
+    '空表': [],
+}
+
+
+def fake_engine(file):
+    for name, rows in WORKBOOK.items():
+        yield name, iter(rows)
+
+
+class Test(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        excel_utils.register_engine('fake', fake_engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        for name in ('fake', 'lazy', 'not_installed'):
+            excel_utils._ENGINES.pop(name, None)
+
+    def read(self, **kwargs):
+        return {k: list(v) for k, v in read_sheets('book.xlsx', engine='fake', **kwargs)}
+
+    def test_all_columns(self):
+        sheets = self.read()
+        self.assertEqual(list(sheets), ['子项1', '子项2', '空表'])
+        rows = sheets['子项1']
+        # 重复的表头添加后缀, 空表头为 Unnamed, 末尾的空表头和空行不返回, 中间的空行保留
+        self.assertEqual(list(rows[0]), ['File', 'Layout', 'Name', 'Unnamed: 3', 'Name.1', 'Unused'])
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(math.isnan(v) for v in rows[2].values()))
+        # 与 pandas dtype=str 相同的类型转换
+        self.assertEqual(rows[0]['Unused'], '1')
+        self.assertEqual(rows[1]['Unused'], '2.5')
+        self.assertEqual(rows[3]['Unnamed: 3'], '3')
+        self.assertEqual(rows[3]['Unused'], '2022-01-02 00:00:00')
+        self.assertTrue(math.isnan(rows[3]['Name']))
+        self.assertTrue(math.isnan(rows[3]['Name.1']))
+        self.assertEqual(sheets['空表'], [])
+
+    def test_raw_values(self):
+        rows = self.read(dtype=None)['子项1']
+        self.assertEqual(rows[0]['Unused'], 1)
+        self.assertEqual(rows[3]['Unnamed: 3'], 3)
+
+    def test_projection(self):
+        rows = self.read(columns=['layout', 'name'], lower=True)['子项1']
+        self.assertEqual(list(rows[0]), ['layout', 'name'])
+        rows = self.read(columns=['name'], required=['file'], lower=True)['子项1']
+        # 检查的列同时读取
+        self.assertEqual(list(rows[0]), ['file', 'name'])
+        self.assertEqual(len(rows), 3)
+
+    def test_required(self):
+        rows = self.read(required=['File', 'Layout'])['子项1']
+        self.assertEqual([r['Layout'] for r in rows], ['L1', 'L3'])
+        rows = self.read(required=['File', 'Layout'], how='all')['子项1']
+        self.assertEqual([r['Name'] for r in rows][:2], ['图名1', '图名2'])
+        # 区分大小写时工作表缺少该列
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(self.read(required=['file'])['子项1'], [])
+
+    def test_group(self):
+        records = read_records('book.xlsx', engine='fake', required=['file', 'layout'], lower=True)
+        groups = group_records(records, 'file', sheet_key='sub_project')
+        self.assertEqual(list(groups), ['a.dwg', 'b.dwg'])
+        self.assertEqual([(r['layout'], r['sub_project']) for r in groups['a.dwg']],
+                         [('L1', '子项1'), ('L4', '子项2')])
+
+    def test_lazy(self):
+        consumed = []
+
+        def engine(file):
+            def rows():
+                yield 'file', 'layout'
+                for i in range(100):
+                    consumed.append(i)
+                    yield f'{i}.dwg', 'L'
+
+            yield 'sheet', rows()
+
+        excel_utils.register_engine('lazy', engine)
+        records = read_records('book.xlsx', engine='lazy')
+        self.assertEqual([next(records) for _ in range(3)][-1][1]['file'], '2.dwg')
+        self.assertEqual(len(consumed), 3)
+
+    def test_engine(self):
+        self.assertIn('fake', excel_utils.available_engines())
+        with self.assertRaises(ValueError):
+            excel_utils.get_engine('missing')
+        excel_utils.register_engine('not_installed', fake_engine, module='module_not_installed')
+        self.assertNotIn('not_installed', excel_utils.available_engines())
+        with self.assertRaises(ValueError):
+            excel_utils.get_engine('not_installed')
+
+
+class TestWorkbookCache(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self._tmp.name, 'book.xlsx')
+        self.write(b'v1')
+        self.cache = WorkbookCache(os.path.join(self._tmp.name, 'cache'))
+        self.parsed = []
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, data, mtime=None):
+        with open(self.file, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(self.file, (mtime, mtime))
+
+    def parse(self):
+        with open(self.file, 'rb') as f:
+            data = f.read()
+        self.parsed.append(data)
+        return {'a.dwg': [{'layout': 'L1', 'data': data, 'name': math.nan}]}
+
+    def load(self, **options):
+        return self.cache.load(self.file, {'reader': 'test', **options}, self.parse)
+
+    def test_hit(self):
+        first = self.load()
+        first['a.dwg'][0]['layout'] = 'changed'
+        second = self.load()
+        self.assertEqual(self.parsed, [b'v1'])
+        # 修改返回的结果不影响缓存
+        self.assertEqual(second['a.dwg'][0]['layout'], 'L1')
+        self.assertTrue(math.isnan(second['a.dwg'][0]['name']))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_content_changed(self):
+        self.load()
+        self.write(b'v2')
+        self.assertEqual(self.load()['a.dwg'][0]['data'], b'v2')
+        self.assertEqual(self.parsed, [b'v1', b'v2'])
+
+    def test_touched(self):
+        self.write(b'v1', mtime=1000)
+        self.load()
+        self.write(b'v1', mtime=2000)
+        digests = []
+        self.cache.digest = lambda f: digests.append(f) or excel_utils.file_digest(f)
+        self.load()
+        self.load()
+        # 内容未变化, 只计算一次 sha256 并更新记录
+        self.assertEqual(self.parsed, [b'v1'])
+        self.assertEqual(len(digests), 1)
+
+    def test_options(self):
+        self.load(columns=('file',))
+        self.load(columns=('file', 'layout'))
+        self.load(columns=('file',))
+        self.assertEqual(len(self.parsed), 2)
+
+    def test_corrupt(self):
+        self.load()
+        for f in os.listdir(self.cache.path):
+            with open(os.path.join(self.cache.path, f), 'wb') as fw:
+                fw.write(b'not a pickle')
+        with self.assertLogs(level='WARNING'):
+            self.load()
+        self.assertEqual(len(self.parsed), 2)
+        self.load()
+        self.assertEqual(len(self.parsed), 2)
@@ -0,0 +1,58 @@
+import math
+from unittest import TestCase
+
+from src.naming_utils import NameTemplate, find_collisions, sanitize
+from src.record_utils import RecordStore
+
+
+class Test(TestCase):
+    def test_parse(self):
+        t = NameTemplate('<number>_<Name>_<sub_project>.pdf')
+        self.assertEqual(t.fields, ['number', 'Name', 'sub_project'])
+        self.assertEqual(NameTemplate('plain.pdf').fields, [])
+
+    def test_render(self):
+        t = NameTemplate('<number>_<name>_<sub_project>.pdf')
+        row = {'number': 'JS-01', 'name': '平面图', 'sub_project': '1#楼', 'other': math.nan}
+        self.assertEqual(t.render(row), 'JS-01_平面图_1#楼.pdf')
+        # 列名不存在时使用小写的列名
+        self.assertEqual(NameTemplate('<Number>.pdf').render(row), 'JS-01.pdf')
+
+    def test_missing(self):
+        t = NameTemplate('<number>_<name>.pdf')
+        # 缺失值和不存在的列替换为空字符串
+        self.assertEqual(t.render({'number': math.nan}), '_.pdf')
+        self.assertEqual(t.render({'number': None, 'name': 'a'}), '_a.pdf')
+
+    def test_sanitize(self):
+        self.assertEqual(sanitize('a/b\\c:d*e?"f"<g>|h'), 'a_b_c_d_e__f__g__h')
+        self.assertEqual(sanitize(' x\t'), 'x')
+        self.assertEqual(sanitize(math.nan), '')
+        t = NameTemplate(r'<sub_project>\<name>.pdf')
+        # 只处理替换的值, 模板中的文件夹保留
+        self.assertEqual(t.render({'sub_project': 'A/B', 'name': 'n'}), r'A_B\n.pdf')
+        # 文件名末尾的点和空格去除, 保留的设备名前添加 _
+        self.assertEqual(NameTemplate('<name>. .pdf').render({'name': 'x'}), 'x.pdf')
+        self.assertEqual(NameTemplate('<name>.pdf').render({'name': 'con'}), '_con.pdf')
+
+    def test_render_all(self):
+        store = RecordStore.from_records([
+            {'number': 1, 'name': 'a'},
+            {'number': True, 'name': 'a'},
+            {'number': 1.5, 'name': math.nan},
+        ])
+        t = NameTemplate('<number>_<name>.pdf')
+        names = t.render_all(store)
+        self.assertEqual(names, ['1_a.pdf', 'True_a.pdf', '1.5_.pdf'])
+        self.assertEqual(names, [t.render(r) for r in store])
+
+    def test_collisions(self):
+        outputs = {
+            ('a.dwg', 'L1'): r'C:\pdf\X.pdf',
+            ('a.dwg', 'L2'): r'C:\pdf\x.pdf',
+            ('b.dwg', 'L1'): r'C:\pdf\y.pdf',
+            ('c.dwg', 'L1'): r'C:\pdf\sub\..\X.pdf',
+        }
+        self.assertEqual(find_collisions(outputs),
+                         {r'C:\pdf\X.pdf': [('a.dwg', 'L1'), ('a.dwg', 'L2'), ('c.dwg', 'L1')]})
+        self.assertEqual(find_collisions({}), {})
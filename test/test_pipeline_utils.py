@@ -0,0 +1,143 @@
+import threading
+import time
+from unittest import TestCase
+
+from src.pipeline_utils import PrefetchPipeline
+from test.fake_acad import FakeAcadApplication, WallClock
+
+FILES = [rf'C:\project\{i:02d}.dwg' for i in range(6)]
+JOBS = {f: [f'L{i}'] for i, f in enumerate(FILES)}
+
+
+class Recorder:
+    """记录两个阶段的调用, 检查已打开未处理的文档数量"""
+
+    def __init__(self, open_cost=0.0, process_cost=0.0, fail_open=(), fail_process=()):
+        self.open_cost = open_cost
+        self.process_cost = process_cost
+        self.fail_open = set(fail_open)
+        self.fail_process = set(fail_process)
+        self.opened = []
+        self.processed = []
+        self.discarded = []
+        self.max_ahead = 0
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def open(self, file):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.open_cost)
+        if file in self.fail_open:
+            raise IOError(f'cannot open {file}')
+        with self.lock:
+            self.opened.append(file)
+            # 已打开但主线程尚未开始处理的文档
+            self.max_ahead = max(self.max_ahead, len(self.opened) - len(self.processed) - 1)
+        return f'doc:{file}'
+
+    def process(self, file, data, doc):
+        with self.lock:
+            self.processed.append(file)
+        time.sleep(self.process_cost)
+        if file in self.fail_process:
+            raise ValueError(f'bad {file}')
+        return doc, data
+
+    def discard(self, file, doc):
+        self.discarded.append(file)
+
+
+class Test(TestCase):
+    def test_results(self):
+        rec = Recorder()
+        report = PrefetchPipeline(rec.open, rec.process).run(JOBS)
+        self.assertEqual([r.file for r in report.results], FILES)
+        self.assertTrue(all(r.ok for r in report.results))
+        self.assertEqual(report.results[0].result, (f'doc:{FILES[0]}', ['L0']))
+        self.assertEqual(report.cancelled, [])
+        # 打开在后台线程中执行
+        self.assertEqual(rec.threads, {'prefetch'})
+
+    def test_overlap(self):
+        rec = Recorder(open_cost=0.03, process_cost=0.03)
+        report = PrefetchPipeline(rec.open, rec.process).run(JOBS)
+        serial = len(FILES) * 0.06
+        self.assertLess(report.elapsed, serial * 0.8)
+        self.assertGreater(report.overlap, 0.05)
+
+    def test_backpressure(self):
+        rec = Recorder(open_cost=0.001, process_cost=0.02)
+        report = PrefetchPipeline(rec.open, rec.process, depth=2).run(JOBS)
+        self.assertTrue(all(r.ok for r in report.results))
+        self.assertLessEqual(rec.max_ahead, 2)
+        self.assertLessEqual(report.max_prefetched, 2)
+        self.assertGreater(report.blocked_seconds, 0)
+
+    def test_failures(self):
+        rec = Recorder(fail_open={FILES[1]}, fail_process={FILES[3]})
+        report = PrefetchPipeline(rec.open, rec.process).run(JOBS)
+        self.assertEqual([r.file for r in report.failed], [FILES[1], FILES[3]])
+        self.assertIn('OSError: cannot open', report.failed[0].error)
+        self.assertIn('ValueError: bad', report.failed[1].error)
+        self.assertEqual(len(report.succeeded), len(FILES) - 2)
+        self.assertIn(FILES[3], report.summary())
+
+    def test_cancel(self):
+        rec = Recorder(process_cost=0.02)
+        exited = []
+        pipeline = PrefetchPipeline(rec.open, lambda *a: (rec.process(*a), pipeline.cancel()),
+                                    depth=2, discard=rec.discard, thread_exit=lambda: exited.append(True))
+        report = pipeline.run(JOBS)
+        self.assertEqual([r.file for r in report.results], FILES[:1])
+        self.assertTrue(pipeline.cancelled)
+        # 已打开未处理的文档被丢弃, 其余文件未打开
+        self.assertEqual(rec.discarded, rec.opened[1:])
+        self.assertEqual(report.cancelled, FILES[1:])
+        self.assertLessEqual(len(rec.opened), 3)
+        self.assertEqual(exited, [True])
+
+    def test_interrupt(self):
+        rec = Recorder()
+
+        def process(file, data, doc):
+            raise KeyboardInterrupt
+
+        pipeline = PrefetchPipeline(rec.open, process, discard=rec.discard)
+        with self.assertRaises(KeyboardInterrupt):
+            pipeline.run(JOBS)
+        self.assertEqual(rec.discarded, rec.opened[1:])
+        self.assertFalse(any(t.name == 'prefetch' for t in threading.enumerate()))
+
+    def test_init_failure(self):
+        rec = Recorder()
+        exited = []
+
+        def init():
+            raise RuntimeError('no instance')
+
+        report = PrefetchPipeline(rec.open, rec.process, thread_init=init,
+                                  thread_exit=lambda: exited.append(True)).run(JOBS)
+        self.assertEqual(len(report.failed), len(FILES))
+        self.assertIn('no instance', report.failed[0].error)
+        self.assertEqual(rec.opened, [])
+        self.assertEqual(exited, [True])
+
+    def test_fake_application(self):
+        apps = [FakeAcadApplication(worker=i, clock=WallClock(), open_cost=0.01) for i in range(2)]
+        opened = []
+
+        def open_stage(file):
+            app = apps[len(opened) % len(apps)]
+            opened.append(app.worker)
+            return app.Documents.Open(file)
+
+        def process_stage(file, data, doc):
+            worker = doc.Application.worker
+            doc.Close(True)
+            return worker
+
+        report = PrefetchPipeline(open_stage, process_stage, receive=lambda d: d).run(JOBS)
+        # 相邻文件在不同实例中打开
+        self.assertEqual([r.result for r in report.results], [0, 1, 0, 1, 0, 1])
+        self.assertEqual([a.opened for a in apps], [3, 3])
+        self.assertEqual(sum(a.Documents.Count for a in apps), 0)
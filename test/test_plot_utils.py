@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from src.plot_utils import COALESCED, DONE, FAILED, HIT, MISS, TIMEOUT, PlotCache, PlotQueue
+from test.fake_acad import FakeClock
+
+
+class FakePlotter:
+    """模拟后台打印: 开始后 duration 秒写入输出文件, 写入耗时 write 秒"""
+
+    def __init__(self, clock: FakeClock, durations=None, duration=2.0, write=0.2, hang=(), reject=()):
+        self.clock = clock
+        self.durations = durations or {}
+        self.duration = duration
+        self.write = write
+        self.hang = set(hang)
+        self.reject = set(reject)
+        self.files = {'old.pdf': (10, -1.0)}
+        self.jobs = {}
+        self.max_running = 0
+
+    def start(self, doc, layout, output):
+        if output in self.reject:
+            return False
+        if output == 'error.pdf':
+            raise RuntimeError('plot device not found')
+        self.jobs[output] = self.clock.now
+        running = [f for f, t in self.jobs.items()
+                   if self.clock.now < t + self.durations.get(f, self.duration) + self.write]
+        self.max_running = max(self.max_running, len(running))
+        return True
+
+    def stat(self, output):
+        if output in self.jobs and output not in self.hang:
+            start = self.jobs[output] + self.durations.get(output, self.duration)
+            if self.clock.now >= start:
+                # 写入过程中文件大小和修改时间不断变化
+                end = start + self.write
+                size = 100 if self.clock.now >= end else 1 + int(99 * (self.clock.now - start) / self.write)
+                return size, min(self.clock.now, end)
+        return self.files.get(output)
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _queue(self, plotter, **kw):
+        return PlotQueue(plotter.start, stat=plotter.stat, clock=self.clock, sleep=self.clock.sleep,
+                         poll_interval=0.1, **kw)
+
+    def test_submit_returns_immediately(self):
+        plotter = FakePlotter(self.clock)
+        queue = self._queue(plotter, max_in_flight=2)
+        queue.submit(None, 'L1', 'a.pdf')
+        queue.submit(None, 'L2', 'b.pdf')
+        # 未达到上限, 提交不等待
+        self.assertEqual(self.clock.now, 0)
+        self.assertEqual(len(queue.in_flight), 2)
+        report = queue.drain()
+        self.assertEqual([j.status for j in report.jobs], [DONE, DONE])
+        # 文件写入完成(大小稳定)后才视为完成
+        self.assertTrue(all(j.latency >= 2.2 for j in report.jobs))
+        self.assertLess(self.clock.now, 2.6)
+
+    def test_max_in_flight(self):
+        plotter = FakePlotter(self.clock)
+        queue = self._queue(plotter, max_in_flight=1)
+        jobs = [queue.submit(None, f'L{i}', f'{i}.pdf') for i in range(3)]
+        queue.drain()
+        self.assertEqual(plotter.max_running, 1)
+        # 后提交的图纸等待前一张完成
+        self.assertGreater(jobs[1].wait, 2)
+        self.assertGreaterEqual(jobs[2].started, jobs[1].finished)
+        self.assertEqual(queue.report.latency()['count'], 3)
+
+    def test_existing_output(self):
+        # 输出文件已存在时, 等待文件被重新写入
+        plotter = FakePlotter(self.clock)
+        queue = self._queue(plotter)
+        job = queue.submit(None, 'L1', 'old.pdf')
+        queue.drain()
+        self.assertEqual(job.status, DONE)
+        self.assertGreaterEqual(job.latency, 2)
+
+    def test_timeout(self):
+        plotter = FakePlotter(self.clock, hang={'b.pdf'})
+        queue = self._queue(plotter, max_in_flight=2, timeout=5)
+        queue.submit(None, 'L1', 'a.pdf')
+        queue.submit(None, 'L2', 'b.pdf')
+        report = queue.drain()
+        self.assertEqual([j.status for j in report.jobs], [DONE, TIMEOUT])
+        self.assertIn('b.pdf', report.summary())
+        self.assertLess(self.clock.now, 5.5)
+
+    def test_failed_submit(self):
+        plotter = FakePlotter(self.clock, reject={'a.pdf'})
+        queue = self._queue(plotter)
+        a = queue.submit(None, 'L1', 'a.pdf')
+        e = queue.submit(None, 'L2', 'error.pdf')
+        self.assertEqual((a.status, e.status), (FAILED, FAILED))
+        self.assertIn('plot device not found', e.error)
+        self.assertEqual(queue.in_flight, [])
+        self.assertEqual(len(queue.drain().failed), 2)
+
+    def test_latency_report(self):
+        plotter = FakePlotter(self.clock, durations={'0.pdf': 1, '1.pdf': 3, '2.pdf': 5}, write=0)
+        queue = self._queue(plotter, max_in_flight=3)
+        for i in range(3):
+            queue.submit(None, f'L{i}', f'{i}.pdf')
+        stats = queue.drain().latency()
+        self.assertEqual(stats['count'], 3)
+        self.assertAlmostEqual(stats['max'], 5.1, delta=0.11)
+        self.assertAlmostEqual(stats['mean'], 3.1, delta=0.11)
+
+
+class TestPlotCache(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dwg = self._write('a.dwg', b'drawing v1')
+        self.cache_file = os.path.join(self.dir, 'temp', 'plot_cache.json')
+        self.info = {'layout': 'L1', 'dwg_no': 'A-01', 'name': float('nan')}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _run(self, rows, unmodified=True, **kw):
+        """一次运行: 检查每一行, 需要打印时生成输出文件, 最后记录"""
+        cache = PlotCache(self.cache_file)
+        res = []
+        for info, output in rows:
+            state = cache.check(self.dwg, info['layout'], info, output, unmodified=unmodified, **kw)
+            if state == MISS:
+                self._write(os.path.basename(output), json.dumps(info).encode())
+            res.append(state)
+        return res, cache.commit()
+
+    def test_skip_unchanged(self):
+        out = os.path.join(self.dir, 'A-01.pdf')
+        self.assertEqual(self._run([(self.info, out)])[0], [MISS])
+        states, report = self._run([(self.info, out)])
+        self.assertEqual(states, [HIT])
+        self.assertEqual(report.hits, [out])
+        self.assertIn('跳过 1', report.summary())
+
+    def test_key_changes(self):
+        out = os.path.join(self.dir, 'A-01.pdf')
+        self._run([(self.info, out)])
+        # 图签信息改变
+        self.assertEqual(self._run([(dict(self.info, name='plan'), out)])[0], [MISS])
+        # 打印样式改变
+        self.assertEqual(self._run([(dict(self.info, name='plan'), out)], style='mono.ctb')[0], [MISS])
+        self.assertEqual(self._run([(dict(self.info, name='plan'), out)], style='mono.ctb')[0], [HIT])
+        # dwg 文件内容改变
+        self._write('a.dwg', b'drawing v2')
+        self.assertEqual(self._run([(dict(self.info, name='plan'), out)], style='mono.ctb')[0], [MISS])
+
+    def test_modified_document_not_skipped(self):
+        out = os.path.join(self.dir, 'A-01.pdf')
+        self._run([(self.info, out)])
+        self.assertEqual(self._run([(self.info, out)], unmodified=False)[0], [MISS])
+
+    def test_output_changed_or_missing(self):
+        out = os.path.join(self.dir, 'A-01.pdf')
+        self._run([(self.info, out)])
+        self._write('A-01.pdf', b'edited by someone')
+        self.assertEqual(self._run([(self.info, out)])[0], [MISS])
+        os.remove(out)
+        self.assertEqual(self._run([(self.info, out)])[0], [MISS])
+        self.assertEqual(self._run([(self.info, out)])[0], [HIT])
+
+    def test_coalesce(self):
+        out = os.path.join(self.dir, 'A-01.pdf')
+        other = dict(self.info, layout='L2')
+        with self.assertLogs(level='WARNING'):
+            states, report = self._run([(self.info, out), (self.info, out.upper() if os.name == 'nt' else out),
+                                        (other, out)])
+        self.assertEqual(states, [MISS, COALESCED, COALESCED])
+        self.assertEqual(len(report.coalesced), 2)
+
+    def test_failed_plot_not_recorded(self):
+        cache = PlotCache(self.cache_file)
+        out = os.path.join(self.dir, 'missing.pdf')
+        self.assertEqual(cache.check(self.dwg, 'L1', self.info, out), MISS)
+        cache.commit()
+        self.assertFalse(os.path.exists(self.cache_file))
+        self.assertEqual(PlotCache(self.cache_file).check(self.dwg, 'L1', self.info, out), MISS)
+
+    def test_dwg_digest_memoized(self):
+        calls = []
+
+        def digest(path):
+            calls.append(path)
+            return path
+
+        cache = PlotCache(digest=digest)
+        for i in range(3):
+            cache.check(self.dwg, f'L{i}', self.info, os.path.join(self.dir, f'{i}.pdf'))
+        cache.commit()
+        # 每个 dwg 文件只计算一次, 每个输出文件计算一次
+        self.assertEqual(calls.count(self.dwg), 1)
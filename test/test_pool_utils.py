@@ -0,0 +1,141 @@
+import threading
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import TestCase
+
+from src import com_utils
+from src.pool_utils import WorkerPool, run_shard, shard
+from test.fake_acad import FakeAcadApplication, FakeComError
+
+
+def _app_factory(worker):
+    return FakeAcadApplication(worker=worker)
+
+
+def _task(app, file, layouts):
+    doc = app.Documents.Open(file)
+    doc.Close(False)
+    return app.worker, len(layouts)
+
+
+def _close(app):
+    app.Quit()
+
+
+JOBS = {
+    r'C:\project\a.dwg': ['L0', 'L1', 'L2', 'L3', 'L4'],
+    r'C:\project\b.dwg': ['L0', 'L1', 'L2', 'L3'],
+    r'C:\project\c.dwg': ['L0', 'L1', 'L2'],
+    r'C:\project\d.dwg': ['L0', 'L1'],
+    r'C:\project\e.dwg': ['L0', 'L1'],
+    r'C:\project\f.dwg': ['L0'],
+}
+
+
+class Recorder:
+    """记录每个工作进程创建的应用实例"""
+
+    def __init__(self, fail=None, disconnect=None):
+        self.apps = []
+        self.fail = fail or set()
+        self.disconnect = dict.fromkeys(disconnect or (), 1)
+        self.lock = threading.Lock()
+
+    def factory(self, worker):
+        app = FakeAcadApplication(worker=worker)
+        with self.lock:
+            self.apps.append(app)
+        return app
+
+    def task(self, app, file, layouts):
+        if file in self.fail:
+            raise ValueError(f'bad {file}')
+        if self.disconnect.get(file):
+            self.disconnect[file] -= 1
+            app.Quit()
+            raise FakeComError(com_utils.RPC_S_SERVER_UNAVAILABLE, 'The RPC server is unavailable.')
+        return _task(app, file, layouts)
+
+
+class BrokenExecutor(Executor):
+    """第一个提交的任务模拟工作进程异常退出"""
+
+    def __init__(self, workers):
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.submitted += 1
+        if self.submitted == 1:
+            future.set_exception(BrokenProcessPool('worker died'))
+        else:
+            future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class Test(TestCase):
+    def test_shard(self):
+        shards = shard(JOBS, 3)
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(sorted(f for s in shards for f in s), sorted(JOBS))
+        loads = sorted(sum(len(JOBS[f]) for f in s) for s in shards)
+        self.assertEqual(loads, [5, 6, 6])
+        self.assertEqual(shard(JOBS, 1), [list(sorted(JOBS, key=lambda f: -len(JOBS[f])))])
+        self.assertEqual(len(shard({'a': [1]}, 4)), 1)
+
+    def test_one_app_per_worker(self):
+        rec = Recorder()
+        report = WorkerPool(3, rec.factory, rec.task, close_app=_close, executor='thread').run(JOBS)
+        self.assertEqual(len(rec.apps), 3)
+        self.assertEqual(sorted(a.worker for a in rec.apps), [0, 1, 2])
+        self.assertTrue(all(a.quit for a in rec.apps))
+        self.assertEqual([r.file for r in report.results], list(JOBS))
+        self.assertTrue(all(r.ok for r in report.results))
+        # 每个文件由结果中记录的实例处理
+        self.assertTrue(all(r.result == (r.worker, len(JOBS[r.file])) for r in report.results))
+        self.assertEqual(sum(a.opened for a in rec.apps), len(JOBS))
+        self.assertEqual(report.workers, 3)
+        self.assertEqual(sum(w['files'] for w in report.by_worker().values()), len(JOBS))
+
+    def test_failure_is_reported(self):
+        rec = Recorder(fail={r'C:\project\b.dwg'})
+        report = WorkerPool(2, rec.factory, rec.task, executor='inline').run(JOBS)
+        self.assertEqual(len(report.succeeded), len(JOBS) - 1)
+        failed = report.failed[0]
+        self.assertEqual(failed.file, r'C:\project\b.dwg')
+        self.assertIn('ValueError: bad', failed.error)
+        self.assertIn('Traceback', failed.traceback)
+        self.assertIn(failed.file, report.summary())
+        # 异常不影响应用实例, 不重新创建
+        self.assertEqual(len(rec.apps), 2)
+
+    def test_disconnected_app_restarted(self):
+        rec = Recorder(disconnect={r'C:\project\c.dwg'})
+        report = WorkerPool(2, rec.factory, rec.task, executor='inline').run(JOBS)
+        self.assertTrue(all(r.ok for r in report.results))
+        retried = [r for r in report.results if r.attempts > 1]
+        self.assertEqual([r.file for r in retried], [r'C:\project\c.dwg'])
+        self.assertEqual(len(rec.apps), 3)
+        self.assertEqual(report.by_worker()[retried[0].worker]['retries'], 1)
+
+    def test_disconnected_retries_exhausted(self):
+        rec = Recorder(disconnect={r'C:\project\a.dwg'})
+        rec.disconnect[r'C:\project\a.dwg'] = 5
+        results = run_shard(0, [(r'C:\project\a.dwg', []), (r'C:\project\f.dwg', ['L0'])], rec.factory, rec.task,
+                            retries=2)
+        self.assertFalse(results[0].ok)
+        self.assertEqual(results[0].attempts, 3)
+        self.assertTrue(results[1].ok)
+
+    def test_broken_worker(self):
+        rec = Recorder()
+        report = WorkerPool(2, rec.factory, rec.task, executor=BrokenExecutor).run(JOBS)
+        self.assertEqual(len(report.results), len(JOBS))
+        broken = shard(JOBS, 2)[0]
+        self.assertEqual(sorted(r.file for r in report.failed), sorted(broken))
+        self.assertTrue(all('BrokenProcessPool' in r.error for r in report.failed))
+
+    def test_process_pool(self):
+        report = WorkerPool(2, _app_factory, _task, close_app=_close).run(JOBS)
+        self.assertTrue(all(r.ok for r in report.results))
+        self.assertEqual({r.result[0] for r in report.results}, {0, 1})
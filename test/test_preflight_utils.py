@@ -0,0 +1,92 @@
+import math
+import os
+import tempfile
+from unittest import TestCase
+
+from src.preflight_utils import ERROR, WARNING, existing_files, preflight
+
+
+class Test(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+        os.makedirs(os.path.join(self.dir, 'sub'))
+        for name in ('a.dwg', 'b.dwg', os.path.join('sub', 'c.dwg'), 'notes.txt'):
+            open(os.path.join(self.dir, name), 'w').close()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.dir, *names)
+
+    def test_existing_files(self):
+        calls = []
+
+        def listdir(d):
+            calls.append(d)
+            return os.listdir(d)
+
+        files = [self.path('a.dwg'), self.path('b.dwg'), self.path('x.dwg'), self.path('sub', 'c.dwg'),
+                 self.path('missing', 'd.dwg')]
+        self.assertEqual(existing_files(files, listdir), set(files[:2] + files[3:4]))
+        # 每个文件夹只列出一次
+        self.assertEqual(len(calls), 3)
+
+    def test_preflight(self):
+        a, b, c = self.path('a.dwg'), self.path('b.dwg'), self.path('sub', 'c.dwg')
+        jobs = {
+            a: [{'layout': 'L1', 'border_style': 'A1'},
+                {'layout': 'L2', 'border_style': 'A9'},
+                {'layout': 'L1', 'border_style': 'A1'},
+                {'layout': 'L3', 'border_style': math.nan}],
+            b: [{'layout': 'L1', 'border_style': 'A1'},
+                {'layout': 'L2', 'border_style': 'A1'}],
+            c: [{'layout': 'L1', 'border_style': 'A1'}],
+            self.path('x.dwg'): [{'layout': 'L1', 'border_style': 'A1'}],
+            self.path('notes.txt'): [{'layout': 'L1', 'border_style': 'A1'}],
+        }
+        outputs = {
+            (a, 'L1'): r'C:\pdf\a_L1.pdf',
+            (b, 'L1'): r'C:\pdf\b_L1.pdf',
+            (b, 'L2'): r'C:\pdf\same.pdf',
+            (c, 'L1'): r'C:\pdf\SAME.pdf',
+        }
+        report, res = preflight(jobs, styles=['A1', 'A2'], outputs=outputs)
+        self.assertEqual(sorted((i.check, os.path.basename(i.file), i.layout) for i in report.errors), [
+            ('collision', 'b.dwg', 'L2'),
+            ('collision', 'c.dwg', 'L1'),
+            ('file', 'notes.txt', ''),
+            ('file', 'x.dwg', ''),
+            ('style', 'a.dwg', 'L2'),
+            ('style', 'a.dwg', 'L3'),
+        ])
+        self.assertEqual([(i.level, i.layout) for i in report.warnings], [(WARNING, 'L1')])
+        # 去除错误的图纸和重复的布局, 没有图纸的文件不处理
+        self.assertEqual({os.path.basename(k): [i['layout'] for i in v] for k, v in res.items()},
+                         {'a.dwg': ['L1'], 'b.dwg': ['L1']})
+        self.assertFalse(report.ok)
+        self.assertEqual((report.files, report.rows, report.kept_files, report.kept_rows), (5, 9, 2, 2))
+        self.assertIn('6 个错误, 1 个警告', report.summary())
+        self.assertTrue(all(i.level == ERROR for i in report.errors))
+
+    def test_ok(self):
+        jobs = {self.path('a.dwg'): [{'layout': 'L1', 'border_style': 'A1'}]}
+        report, res = preflight(jobs)
+        self.assertTrue(report.ok)
+        self.assertEqual(res, jobs)
+
+    def test_variants(self):
+        a = self.path('a.dwg')
+        # 不同子项的同一布局是变体, 同一子项的同一布局是重复
+        jobs = {a: [{'layout': 'L1', 'border_style': 'A1', 'sub_project': '1#'},
+                    {'layout': 'L1', 'border_style': 'A1', 'sub_project': '2#'},
+                    {'layout': 'L1', 'border_style': 'A1', 'sub_project': '3#'},
+                    {'layout': 'L1', 'border_style': 'A1', 'sub_project': '1#'}]}
+        outputs = {(a, 'L1', '1#'): r'C:\pdf\1#.pdf',
+                   (a, 'L1', '2#'): r'C:\pdf\L1.pdf',
+                   (a, 'L1', '3#'): r'C:\pdf\l1.pdf'}
+        report, res = preflight(jobs, styles=['A1'], outputs=outputs)
+        self.assertEqual(sorted((i.check, i.layout) for i in report.issues),
+                         [('collision', 'L1'), ('collision', 'L1'), ('duplicate', 'L1')])
+        self.assertEqual([i['sub_project'] for i in res[a]], ['1#'])
@@ -0,0 +1,148 @@
+import ntpath
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from src.publish_utils import OutputWatcher, Publisher, PublishBatch, SheetJob, build_dsd, plan_batches
+
+GOLDEN = os.path.join(os.path.dirname(__file__), 'golden')
+
+JOBS = [
+    SheetJob(r'C:\Project\Arch\A-01.dwg', 'A-01', r'C:\Project\print\A-01_平面图_建筑.pdf', '建筑'),
+    SheetJob(r'C:\Project\Arch\A-01.dwg', 'A-02', r'C:\Project\print\A-02_立面图_建筑.pdf', '建筑'),
+    SheetJob(r'C:\Project\Struct\S-01.dwg', 'S-01', r'C:\Project\print\S-01_基础_结构.pdf', '结构'),
+]
+
+
+def _golden(name):
+    with open(os.path.join(GOLDEN, name), encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+class FakePublish:
+    """解析 DSD 文件并生成输出文件, 代替 -PUBLISH"""
+
+    def __init__(self, skip=(), fail=False):
+        self.calls = []
+        self.skip = set(skip)
+        self.fail = fail
+
+    def __call__(self, dsd, batch):
+        if self.fail:
+            raise RuntimeError('publish failed')
+        with open(dsd, encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+        sheets = [line[len('[DWF6Sheet:'):-1] for line in lines if line.startswith('[DWF6Sheet:')]
+        target = dict(line.split('=', 1) for line in lines if line.startswith(('Type=', 'DWF=', 'OUT=')))
+        self.calls.append((dsd, sheets))
+        if target['Type'] == '6':
+            outputs = [target['DWF']]
+        else:
+            outputs = [os.path.join(target['OUT'], f'{s}.pdf') for s in sheets if s not in self.skip]
+        for f in outputs:
+            open(f, 'wb').close()
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _jobs(self, n=3, group=lambda i: 'A'):
+        return [SheetJob(f'{self.dir}/{i // 2}.dwg', f'L{i}', os.path.join(self.dir, f'sheet_{i}.pdf'), group(i))
+                for i in range(n)]
+
+    def test_golden_single(self):
+        batches = plan_batches(JOBS)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].target, r'C:\Project\print')
+        self.assertEqual(build_dsd(batches[0]), _golden('publish_single.dsd'))
+
+    def test_golden_multi(self):
+        batches = plan_batches(JOBS, multi_sheet=True)
+        self.assertEqual([(b.target, len(b.jobs)) for b in batches],
+                         [(r'C:\Project\print\建筑.pdf', 2), (r'C:\Project\print\结构.pdf', 1)])
+        self.assertEqual(build_dsd(batches[0]), _golden('publish_multi.dsd'))
+
+    def test_duplicate_sheet_name(self):
+        job = JOBS[0]
+        with self.assertRaises(ValueError):
+            build_dsd(PublishBatch([job, SheetJob(job.file, 'A-03', job.output.upper())], r'C:\Project\print'))
+        with self.assertRaises(ValueError):
+            build_dsd(PublishBatch([job], r'C:\Project\other'))
+
+    def test_plan_batches(self):
+        jobs = JOBS + [SheetJob(JOBS[0].file, 'X', r'C:\Project\print\sub\X.pdf')]
+        batches = plan_batches(jobs, batch_size=2)
+        self.assertEqual([len(b.jobs) for b in batches], [2, 1, 1])
+        self.assertEqual(batches[2].target, r'C:\Project\print\sub')
+        self.assertEqual(batches[0].outputs, [j.output for j in JOBS[:2]])
+
+    def test_publish(self):
+        fake = FakePublish()
+        report = Publisher(fake, self.dir).publish(self._jobs(5))
+        # 一批只执行一次发布
+        self.assertEqual(len(fake.calls), 1)
+        self.assertEqual(fake.calls[0][1], [f'sheet_{i}' for i in range(5)])
+        self.assertTrue(report.ok)
+        self.assertEqual(len(report.published), 5)
+        self.assertEqual(report.sheets, 5)
+        with open(fake.calls[0][0], 'rb') as f:
+            self.assertTrue(f.read().startswith(b'\xef\xbb\xbf[DWF6Version]\r\n'))
+
+    def test_publish_multi_sheet(self):
+        fake = FakePublish()
+        report = Publisher(fake, self.dir, multi_sheet=True).publish(self._jobs(4, group=lambda i: 'AB'[i % 2]))
+        self.assertEqual(len(fake.calls), 2)
+        self.assertEqual(sorted(ntpath.basename(f) for f in report.published), ['A.pdf', 'B.pdf'])
+
+    def test_missing_and_errors(self):
+        report = Publisher(FakePublish(skip={'sheet_1'}), self.dir).publish(self._jobs())
+        self.assertFalse(report.ok)
+        self.assertEqual(report.missing, [os.path.join(self.dir, 'sheet_1.pdf')])
+        self.assertIn('缺少', report.summary())
+
+        report = Publisher(FakePublish(fail=True), self.dir, batch_size=2).publish(self._jobs())
+        self.assertEqual(len(report.errors), 2)
+        self.assertIn('RuntimeError: publish failed', report.summary())
+        self.assertEqual(report.published, [])
+
+    def test_output_watcher(self):
+        files = {'a.pdf': os.stat_result((0,) * 6 + (0, 1, 1, 0))}
+        clock = [0.0]
+        steps = []
+
+        def stat(f):
+            if f not in files:
+                raise FileNotFoundError(f)
+            return files[f]
+
+        def sleep(t):
+            clock[0] += t
+            steps.pop(0)()
+
+        # 旧文件已存在, 发布开始前应用空闲
+        watcher = OutputWatcher(['a.pdf', 'b.pdf'], stat=stat, clock=lambda: clock[0], sleep=sleep)
+        steps[:] = [lambda: None,
+                    lambda: files.update({'b.pdf': os.stat_result((0,) * 6 + (10, 2, 2, 0))}),
+                    lambda: files.update({'a.pdf': os.stat_result((0,) * 6 + (20, 3, 3, 0))}),
+                    lambda: files.update({'b.pdf': os.stat_result((0,) * 6 + (30, 3, 3, 0))}),
+                    lambda: None]
+        self.assertEqual(watcher.pending(), ['a.pdf', 'b.pdf'])
+        # 文件大小不再变化后才完成
+        self.assertTrue(watcher.wait(lambda: True, timeout=10, poll_interval=1))
+        self.assertEqual(clock[0], 5)
+        self.assertEqual(watcher.pending(), [])
+
+        # 输出文件未更新时超时
+        watcher = OutputWatcher(['a.pdf'], stat=stat, clock=lambda: clock[0], sleep=sleep)
+        steps[:] = [lambda: None] * 3
+        self.assertFalse(watcher.wait(lambda: True, timeout=3, poll_interval=1))
+        self.assertEqual(watcher.pending(), ['a.pdf'])
+        # 应用忙时不完成
+        files['a.pdf'] = os.stat_result((0,) * 6 + (40, 4, 4, 0))
+        steps[:] = [lambda: None] * 3
+        self.assertFalse(watcher.wait(lambda: False, timeout=3, poll_interval=1))
@@ -0,0 +1,84 @@
+import math
+import pickle
+from unittest import TestCase
+
+from src.record_utils import RecordStore, RecordView
+
+RECORDS = [
+    ('子项1', {'file': 'a.dwg', 'layout': 'L1', 'border_style': 'A1', 'name': '图名1'}),
+    ('子项1', {'file': 'b.dwg', 'layout': 'L2', 'border_style': 'A1', 'name': math.nan}),
+    ('子项2', {'file': 'a.dwg', 'layout': 'L3', 'number': 'JS-3'}),
+]
+
+
+def make_store():
+    store = RecordStore()
+    for sheet, record in RECORDS:
+        store.append(record, sub_project=sheet)
+    return store
+
+
+class Test(TestCase):
+    def test_view(self):
+        store = make_store()
+        self.assertEqual(len(store), 3)
+        row = store[0]
+        self.assertIsInstance(row, RecordView)
+        self.assertEqual(row['layout'], 'L1')
+        self.assertEqual(dict(row), {**RECORDS[0][1], 'sub_project': '子项1'})
+        # 每行只有所在工作表的列
+        self.assertEqual(list(store[2]), ['file', 'layout', 'number', 'sub_project'])
+        self.assertNotIn('border_style', store[2])
+        self.assertIsNone(store[2].get('border_style'))
+        with self.assertRaises(KeyError):
+            store[2]['name']
+        self.assertTrue(math.isnan(store[1]['name']))
+        self.assertEqual(store[-1]['layout'], 'L3')
+        with self.assertRaises(IndexError):
+            store[3]
+
+    def test_interned(self):
+        store = make_store()
+        # 重复的值只保存一次
+        self.assertEqual(store.categories('border_style'), ['A1'])
+        self.assertEqual(store.categories('file'), ['a.dwg', 'b.dwg'])
+        self.assertIs(store[0]['sub_project'], store[1]['sub_project'])
+        self.assertEqual(store.column('file'), ['a.dwg', 'b.dwg', 'a.dwg'])
+        self.assertEqual(store.columns, ['file', 'layout', 'border_style', 'name', 'sub_project', 'number'])
+
+    def test_group_by(self):
+        store = make_store()
+        groups = store.group_by('file')
+        self.assertEqual({k: list(v) for k, v in groups.items()}, {'a.dwg': [0, 2], 'b.dwg': [1]})
+        groups = store.group_by('sub_project', 'file')
+        self.assertEqual(list(groups), [('子项1', 'a.dwg'), ('子项1', 'b.dwg'), ('子项2', 'a.dwg')])
+        # 缺少该列的行分到缺失值
+        groups = store.group_by('number')
+        self.assertEqual([list(v) for v in groups.values()], [[0, 1], [2]])
+        self.assertEqual(list(store.group_by('layout', indices=[2, 0])), ['L3', 'L1'])
+        self.assertEqual([r['layout'] for r in store.rows(store.group_by('file')['a.dwg'])], ['L1', 'L3'])
+
+    def test_set_value(self):
+        store = make_store()
+        store[2]['block_name'] = 'signature'
+        store[2]['layout'] = 'L4'
+        self.assertEqual(store[2]['block_name'], 'signature')
+        self.assertEqual(store[2]['layout'], 'L4')
+        self.assertNotIn('block_name', store[0])
+        self.assertEqual(store.column('layout'), ['L1', 'L2', 'L4'])
+
+    def test_pickle(self):
+        store = make_store()
+        loaded = pickle.loads(pickle.dumps(store))
+        self.assertEqual([dict(r) for r in loaded], [dict(r) for r in store])
+        loaded.append({'file': 'c.dwg', 'border_style': 'A1'})
+        self.assertEqual(loaded.categories('border_style'), ['A1'])
+        # 单独 pickle 一行时转换为字典
+        row = pickle.loads(pickle.dumps(store[0]))
+        self.assertEqual(type(row), dict)
+        self.assertEqual(row['file'], 'a.dwg')
+
+    def test_from_records(self):
+        store = RecordStore.from_records([r for _, r in RECORDS], kind='sig', upper=lambda r: r['file'].upper())
+        self.assertEqual(store.column('upper'), ['A.DWG', 'B.DWG', 'A.DWG'])
+        self.assertEqual(store.categories('kind'), ['sig'])
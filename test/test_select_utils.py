@@ -0,0 +1,90 @@
+from unittest import TestCase
+
+from src.com_utils import ComContext, ComWrapper, PropertyCache
+from src.select_utils import (DXF_LAYOUT, DXF_NAME, DXF_TYPE, SelectionQuery, block_ref_filter,
+                              escape_pattern)
+from test.fake_acad import CallCounter, FakeComError, FakeDispatch, sample_document
+
+
+def _scan(ly, name):
+    """与 acad_utils._scan_block_ref 相同, 遍历布局中的所有图形"""
+    return [obj for obj in ly.Block if obj.ObjectName == 'AcDbBlockReference' and obj.Name == name]
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.counter = CallCounter()
+        self.raw_doc = sample_document(self.counter, layouts=3, entities=50)
+        self.context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError))
+        self.doc = ComWrapper(self.raw_doc, self.context)
+        self.query = SelectionQuery()
+
+    def test_escape_pattern(self):
+        self.assertEqual(escape_pattern('signature'), 'signature')
+        self.assertEqual(escape_pattern('A#1*'), 'A`#1`*')
+        self.assertEqual(escape_pattern('a,b'), 'a`,b')
+
+    def test_block_ref_filter(self):
+        self.assertEqual(block_ref_filter(), [(DXF_TYPE, 'INSERT')])
+        self.assertEqual(block_ref_filter('sig', 'L0'), [(DXF_TYPE, 'INSERT'), (DXF_NAME, 'sig'), (DXF_LAYOUT, 'L0')])
+
+    def test_same_result_as_scan(self):
+        for ly in self.doc.Layouts:
+            expected = [o.Handle for o in _scan(ly, 'signature')]
+            self.assertEqual(len(expected), 1)
+            actual = [o.Handle for o in self.query.block_refs(self.doc, 'signature', ly.Name)]
+            self.assertEqual(actual, expected)
+
+    def test_whole_document(self):
+        self.raw_doc.ModelSpace.add(self.raw_doc.block_ref('signature'))
+        self.assertEqual(len(self.query.block_refs(self.doc, 'signature')), 4)
+        self.assertEqual(len(self.query.block_refs(self.doc, 'signature', 'Model')), 1)
+        self.assertEqual(len(self.query.block_refs(self.doc)), 4)
+
+    def test_name_is_not_pattern(self):
+        block = self.raw_doc.Layouts.Item('L0').Block
+        block.add(self.raw_doc.block_ref('A51'))
+        block.add(self.raw_doc.block_ref('A#1'))
+        self.assertEqual([o.Name for o in self.query.block_refs(self.doc, 'A#1')], ['A#1'])
+        self.assertEqual(self.query.block_refs(self.doc, 'A5'), [])
+
+    def test_name_case_sensitive(self):
+        # 与遍历布局的结果一致, 图块名称区分大小写
+        self.assertEqual(self.query.block_refs(self.doc, 'SIGNATURE'), [])
+        self.assertEqual([o.Handle for o in self.query.block_refs(self.doc, 'SIGNATURE', 'L0')],
+                         [o.Handle for o in _scan(self.doc.Layouts.Item('L0'), 'SIGNATURE')])
+        self.assertEqual(len(self.query.block_refs(self.doc, 'signature')), 3)
+
+    def test_reuse_selection_set(self):
+        self.query.block_refs(self.doc, 'signature')
+        self.query.block_refs(self.doc, 'signature')
+        self.assertEqual(self.counter.counts['Add'], 1)
+        self.assertEqual(self.counter.counts['Clear'], 1)
+        self.assertEqual(len(self.raw_doc.SelectionSets._mapping), 1)
+        self.assertEqual(len(self.query.block_refs(self.doc, 'signature', 'L1')), 1)
+
+    def test_com_calls_per_layout(self):
+        self.query.block_refs(self.doc, 'signature', 'L0')  # 创建选择集
+        ly = self.doc.Layouts.Item('L1')
+        self.counter.reset()
+        _scan(ly, 'signature')
+        scan_calls = self.counter.total
+        self.counter.reset()
+        self.query.block_refs(self.doc, 'signature', 'L1')
+        query_calls = self.counter.total
+        # 遍历: Block + 51 次 __getitem__ + 51 次 ObjectName + 1 次 Name
+        self.assertEqual(scan_calls, 104)
+        # 查询: SelectionSets + Item + Clear + Select + 1 次 __getitem__ + 1 次 Name
+        self.assertEqual(query_calls, 6)
+
+    def test_select_invalidates_cache(self):
+        context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError),
+                             cache=PropertyCache())
+        app = ComWrapper(FakeDispatch(self.counter, ActiveDocument=self.raw_doc), context)
+        doc = app.ActiveDocument
+        self.query.block_refs(doc, 'signature')
+        epoch = context.cache.epoch(doc._doc)
+        refs = self.query.block_refs(doc, 'signature')
+        # Clear 和 Select 修改选择集, 各使缓存失效一次
+        self.assertEqual(context.cache.epoch(doc._doc), epoch + 2)
+        self.assertTrue(all(r._doc == doc._doc for r in refs))
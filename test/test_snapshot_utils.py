@@ -0,0 +1,90 @@
+from unittest import TestCase
+
+from src.com_utils import ComContext, ComWrapper
+from src.select_utils import SelectionQuery
+from src.snapshot_utils import DocumentSnapshot, LayoutSnapshot, SnapshotRow
+from test.fake_acad import CallCounter, FakeComError, FakeDispatch, sample_document
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.counter = CallCounter()
+        self.raw_doc = sample_document(self.counter, layouts=2, entities=20)
+        context = ComContext(dispatch_types=(FakeDispatch,), errors=(AttributeError, FakeComError))
+        self.doc = ComWrapper(self.raw_doc, context)
+        self.ly = self.doc.Layouts.Item('L1')
+
+    def test_capture(self):
+        snapshot = LayoutSnapshot.capture(self.ly)
+        self.assertEqual(len(snapshot), 21)
+        self.assertEqual(snapshot.layout_name, 'L1')
+        self.assertEqual(len(snapshot.find(layer='layer0')), 4)
+        self.assertEqual(len(snapshot.find('AcDbLine')), 20)
+        self.assertEqual(snapshot.find(layer='missing'), [])
+
+        refs = snapshot.block_refs('signature')
+        self.assertEqual(len(refs), 1)
+        sig = refs[0]
+        self.assertIsInstance(sig, SnapshotRow)
+        self.assertEqual(sig.name, 'signature')
+        self.assertEqual(sig.insertion_point, (1000, 0, 0))
+        self.assertEqual(sig.attributes, {'DWG_NO': '1', 'NAME': '', 'DATE': ''})
+        self.assertEqual(snapshot.row(sig.handle).index, sig.index)
+        self.assertEqual(snapshot[-1].handle, sig.handle)
+
+    def test_single_pass(self):
+        self.counter.reset()
+        snapshot = LayoutSnapshot.capture(self.ly)
+        # Document + Name + Block + 21 次 __getitem__ + 每个图形 Handle, ObjectName, Layer
+        # + 图块 Name, InsertionPoint, GetAttributes + 3 个属性 TagString, TextString
+        self.assertEqual(self.counter.total, 3 + 21 + 21 * 3 + 3 + 3 * 2)
+        self.counter.reset()
+        for _ in range(3):
+            self.assertEqual(len(snapshot.block_refs('signature')), 1)
+            self.assertEqual(len(snapshot.find(layer='layer1')), 4)
+            [r.insertion_point for r in snapshot]
+        self.assertEqual(self.counter.total, 0)
+
+    def test_capture_selected(self):
+        entities = SelectionQuery().block_refs(self.doc, 'signature', 'L1')
+        snapshot = LayoutSnapshot.capture(self.ly, entities)
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(snapshot[0].attributes['DWG_NO'], '1')
+
+    def test_resolve_for_write(self):
+        snapshot = LayoutSnapshot.capture(self.ly)
+        sig = snapshot.block_refs('signature')[0]
+        self.counter.reset()
+        obj = sig.resolve()
+        self.assertEqual(self.counter.counts, {'HandleToObject': 1})
+        obj.Layer = 'border'
+        snapshot.set_attribute(sig, 'NAME', 'plan')
+        self.assertEqual(sig.attributes['NAME'], 'plan')
+        self.assertEqual(self.raw_doc.HandleToObject(sig.handle)._props['Layer'], 'border')
+
+    def test_interned_columns(self):
+        snapshot = LayoutSnapshot.capture(self.ly)
+        # 21 个句柄 + 2 种类型 + 6 个图层(包括图签所在的 0 图层) + 图块名称(signature 与空字符串) + 3 个属性名称 + 属性值 '1'
+        self.assertEqual(len(snapshot._strings), 21 + 2 + 6 + 2 + 3 + 1)
+        self.assertEqual(snapshot.nbytes, 21 * 4 * 4 + 21 * 3 * 8 + 22 * 4 + 3 * 4 * 2)
+
+    def test_document_snapshot(self):
+        query = SelectionQuery()
+        calls = []
+
+        def block_refs(layout, name):
+            calls.append((layout, name))
+            return query.block_refs(self.doc, name, layout)
+
+        snapshot = DocumentSnapshot(self.doc, block_refs, lambda: [ly.Name for ly in self.doc.Layouts])
+        for _ in range(3):
+            refs = snapshot.block_refs('L1', 'signature')
+            self.assertEqual([r.attributes['DWG_NO'] for r in refs], ['1'])
+        # 同一布局同一图块只查询一次
+        self.assertEqual(calls, [('L1', 'signature')])
+        self.assertEqual(len(snapshot.block_refs('L0', 'signature')), 1)
+        with self.assertRaises(KeyError):
+            snapshot.block_refs('missing', 'signature')
+        snapshot.invalidate('L1')
+        snapshot.block_refs('L1', 'signature')
+        self.assertEqual(calls, [('L1', 'signature'), ('L0', 'signature'), ('L1', 'signature')])
@@ -0,0 +1,75 @@
+import itertools
+import math
+from unittest import TestCase
+
+from src.variant_utils import distance, group_variants, order_variants, path_writes, plan_variants
+
+
+class Test(TestCase):
+    def test_distance(self):
+        self.assertEqual(distance({'NAME': 'a', 'no': 1}, {'name': 'a', 'NO': '1'}), 0)
+        # 缺少的属性和缺失值视为空
+        self.assertEqual(distance({'name': 'a', 'date': math.nan}, {'NAME': 'b'}), 1)
+        self.assertEqual(distance({}, {'name': 'a', 'date': ''}), 1)
+
+    def test_order(self):
+        values = [
+            {'sub': 'A', 'area': '1', 'h': 'x'},
+            {'sub': 'C', 'area': '3', 'h': 'y'},
+            {'sub': 'B', 'area': '1', 'h': 'x'},
+            {'sub': 'D', 'area': '3', 'h': 'y'},
+        ]
+        order = order_variants(values)
+        self.assertEqual(sorted(order), [0, 1, 2, 3])
+        best = min(path_writes(values, p) for p in itertools.permutations(range(4)))
+        self.assertEqual(path_writes(values, order), best)
+        self.assertLess(path_writes(values, order), path_writes(values, range(4)))
+
+    def test_order_start(self):
+        values = [{'sub': 'A'}, {'sub': 'B'}, {'sub': 'C'}]
+        # 从与起始值相同的变体开始
+        self.assertEqual(order_variants(values, {'sub': 'C'})[0], 2)
+        # 写入次数相同时保持原顺序
+        self.assertEqual(order_variants(values), [0, 1, 2])
+        self.assertEqual(order_variants([]), [])
+        self.assertEqual(order_variants([{'a': 1}]), [0])
+
+    def test_order_optimal(self):
+        # 与穷举的结果比较
+        rows = [{'a': a, 'b': b, 'c': c} for a, b, c in itertools.product('xy', 'xy', 'xyz')]
+        values = [rows[i] for i in (11, 0, 7, 2, 9, 4)]
+        order = order_variants(values)
+        best = min(path_writes(values, p) for p in itertools.permutations(range(len(values))))
+        self.assertEqual(path_writes(values, order), best)
+
+    def test_group(self):
+        info_list = [{'layout': 'L1', 'sub_project': 'A'}, {'layout': 'L2', 'sub_project': 'A'},
+                     {'layout': 'L1', 'sub_project': 'B'}, {'layout': None}]
+        groups = group_variants(info_list)
+        self.assertEqual(list(groups), ['L1', 'L2', None])
+        self.assertEqual([i['sub_project'] for i in groups['L1']], ['A', 'B'])
+
+    def test_plan(self):
+        values = [{'sub': 'A', 'area': '1', 'name': 'n'},
+                  {'sub': 'B', 'area': '2', 'name': 'n'},
+                  {'sub': 'A', 'area': '2', 'name': 'n'}]
+        order, report = plan_variants('a.dwg', 'L1', values, ['1#', '2#', '3#'], tags=4)
+        self.assertEqual(report.variants, [['1#', '2#', '3#'][i] for i in order])
+        self.assertEqual(report.full_writes, 12)
+        # 从空图签开始: 3 + 2 + 1
+        self.assertEqual(report.excel_writes, 6)
+        self.assertEqual(report.planned_writes, 5)
+        self.assertEqual(report.writes, 0)
+        self.assertIn('排序后 5', report.summary())
+
+    def test_plan_start(self):
+        values = [{'sub': 'A', 'area': '1'}, {'sub': 'B', 'area': '2'}, {'sub': 'C', 'area': '2'}]
+        start = {'SUB': 'C', 'AREA': '2', 'NAME': 'n'}
+        order, report = plan_variants('a.dwg', 'L1', values, ['1#', '2#', '3#'], start=start)
+        # 从与图签当前值相同的变体开始, 未映射的属性清空: 1 + 1 + 2
+        self.assertEqual(order, [2, 1, 0])
+        self.assertEqual(report.planned_writes, 4)
+        self.assertEqual(report.planned_writes, path_writes(values, order, start))
+        # excel 顺序: 3 + 2 + 1
+        self.assertEqual(report.excel_writes, 6)
+        self.assertEqual(report.full_writes, 9)